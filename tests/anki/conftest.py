@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+
+from tools.anki.cnsf_parse import iter_note_paths
+from tools.anki.mock_anki_connect import MockAnkiConnect
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+TEMPLATE_NOTE = REPO_ROOT / "domains/b737/anki/notes/limits/b737_limits_weight_800.md"
+
+requires_mmd = pytest.mark.skipif(
+    not (shutil.which("multimarkdown") or shutil.which("mmd")), reason="MultiMarkdown not on PATH"
+)
+
+
+def write_notes(root: Path, count: int, start: int = 0) -> List[Path]:
+    """
+    Write `count` CNSF notes (copies of TEMPLATE_NOTE with note_ids n000,
+    n001, ...) under root/<bucket>/; path order equals note_id order. Every
+    third note has no `Verification Notes` field.
+    """
+    template = TEMPLATE_NOTE.read_text(encoding="utf-8")
+    paths = []
+    for i in range(start, start + count):
+        nid = f"n{i:03d}"
+        text = template.replace("note_id: b737_limits_weight_800", f"note_id: {nid}").replace("737-800", f"note {nid}")
+        if i % 3 == 0:
+            text = text.replace("  Verification Notes: ''\n", "")
+        p = root / f"b{i // 4:02d}" / f"{nid}.md"
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text, encoding="utf-8")
+        paths.append(p)
+    return paths
+
+
+@pytest.fixture(scope="session")
+def repo_notes() -> List[Path]:
+    """Every CNSF note checked into domains/*/anki/notes."""
+    paths = sorted(iter_note_paths([str(p) for p in REPO_ROOT.glob("domains/*/anki/notes")]))
+    assert paths, "no CNSF notes under domains/*/anki/notes"
+    return paths
+
+
+@pytest.fixture
+def anki() -> Iterator[MockAnkiConnect]:
+    """A local AnkiConnect stand-in (tools/anki/mock_anki_connect.py) with an empty collection."""
+    with MockAnkiConnect() as mock:
+        yield mock
+
+
+FAKE_MMD = r"""
+import os, re, sys
+if sys.argv[1:] == ["--version"]:
+    print("MultiMarkdown 6.6.0 (fake)")
+    sys.exit(0)
+with open(os.environ["FAKE_MMD_LOG"], "a", encoding="utf-8") as log:
+    log.write("run\n")
+blocks = [b.strip("\n") for b in re.split(r"\n[ \t]*\n", sys.stdin.read()) if b.strip()]
+html = [b if b.startswith("<") else "<p>" + b.replace("\n", "<br />\n") + "</p>" for b in blocks]
+sys.stdout.write("\n\n".join(html) + "\n")
+"""
+
+
+@pytest.fixture
+def fake_mmd(tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    A stand-in `multimarkdown` on PATH (blank-line separated blocks -> <p>,
+    raw HTML blocks passed through, like MultiMarkdown); returns the log file
+    with one line per render run.
+    """
+    bin_dir = tmp_path_factory.mktemp("fake-mmd")
+    exe = bin_dir / "multimarkdown"
+    exe.write_text(f"#!{sys.executable}{FAKE_MMD}", encoding="utf-8")
+    exe.chmod(0o755)
+    log = bin_dir / "runs.log"
+    log.touch()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setenv("FAKE_MMD_LOG", str(log))
+    return log
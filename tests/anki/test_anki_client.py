@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import http.client
+import sys
+import threading
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from tools.anki.anki_client import AnkiConnectClient, get_client
+from tools.anki.mock_anki_connect import MockAnkiConnect
+from tools.anki.sync import tsv_to_anki
+
+
+def _tracked(client: AnkiConnectClient) -> List[http.client.HTTPConnection]:
+    opened: List[http.client.HTTPConnection] = []
+    new_conn = client._new_conn
+
+    def tracking() -> http.client.HTTPConnection:
+        conn = new_conn()
+        opened.append(conn)
+        return conn
+
+    client._new_conn = tracking  # type: ignore[method-assign]
+    return opened
+
+
+def test_grow_pool_while_in_use_leaks_no_connections(anki: MockAnkiConnect) -> None:
+    client = AnkiConnectClient(anki.url, pool_size=1)
+    opened = _tracked(client)
+    start = threading.Barrier(5)
+
+    def work() -> None:
+        start.wait()
+        for _ in range(50):
+            client.version()
+
+    def grow() -> None:
+        start.wait()
+        for size in range(2, 200):
+            client.grow_pool(size)
+
+    threads = [threading.Thread(target=work) for _ in range(4)] + [threading.Thread(target=grow)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    client.close()
+    assert opened and all(c.sock is None for c in opened)
+
+
+def test_get_client_keeps_the_configured_timeout_and_retries(anki: MockAnkiConnect) -> None:
+    client = get_client(anki.url, timeout=3.0, retries=0)
+    assert get_client(anki.url) is client
+    assert (client.timeout, client.retries) == (3.0, 0)
+
+    opened = _tracked(client)
+    client.version()
+    assert len(client._pool) == 1
+    get_client(anki.url, timeout=4.0)
+    assert (client.timeout, client.retries) == (4.0, 0)
+    assert client._pool == [] and opened[0].sock is None  # idle connections with the old timeout are closed
+
+
+def test_sync_cli_passes_timeout_and_retries(tmp_path: Path, anki: MockAnkiConnect, monkeypatch: pytest.MonkeyPatch) -> None:
+    tsv = tmp_path / "x.tsv"
+    tsv.write_text(
+        "note_id\tnoteId\tmodel\tdeck\ttags\tfront_html\tback_html\n"
+        "a\t\tB737_Structured\tB737::Limits\tdomain:b737\t<p>a</p>\t<p>A</p>\n",
+        encoding="utf-8",
+    )
+    argv = ["tsv_to_anki.py", "--tsv", str(tsv), "--anki-url", anki.url, "--timeout", "7.5", "--retries", "5"]
+    monkeypatch.setattr(sys, "argv", argv)
+    assert tsv_to_anki.main() == 0
+    client = get_client(anki.url)
+    assert (client.timeout, client.retries) == (7.5, 5)
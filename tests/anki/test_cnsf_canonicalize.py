@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from tools.anki import cnsf_canonicalize, yaml_backend
+from tools.anki.cnsf_canonicalize import CanonCache, _text_digest, process_files
+
+from .conftest import TEMPLATE_NOTE
+
+
+@pytest.fixture
+def notes(tmp_path: Path) -> tuple[Path, Path]:
+    """(canonical note, same note with its top-level keys out of order)."""
+    good = tmp_path / "good.md"
+    good.write_text(TEMPLATE_NOTE.read_text(encoding="utf-8"), encoding="utf-8")
+    bad = tmp_path / "bad.md"
+    bad.write_text(good.read_text(encoding="utf-8").replace("schema: cnsf/v0\ndomain: b737\n", "domain: b737\nschema: cnsf/v0\n"), encoding="utf-8")
+    return good, bad
+
+
+def _check(paths: list[Path], cache_path: Path) -> dict[str, tuple[str, bool]]:
+    cache = CanonCache(cache_path)
+    results = process_files(paths, write=False, cache=cache)
+    cache.save()
+    return {r.path.name: (r.status, r.cached) for r in results}
+
+
+def test_known_hashes_skip_canonicalization(tmp_path: Path, notes) -> None:
+    cache_path = tmp_path / "canon.json"
+    assert _check(list(notes), cache_path) == {"good.md": ("ok", False), "bad.md": ("order_drift", False)}
+    assert _check(list(notes), cache_path) == {"good.md": ("ok", True), "bad.md": ("order_drift", False)}
+
+
+def _poison(cache_path: Path, path: Path) -> None:
+    """Record a non-canonical file as known-canonical under the current fingerprint."""
+    cache = CanonCache(cache_path)
+    cache.add([_text_digest(path.read_text(encoding="utf-8"))])
+    cache.save()
+
+
+def test_rules_version_change_invalidates_the_cache(tmp_path: Path, notes, monkeypatch: pytest.MonkeyPatch) -> None:
+    _, bad = notes
+    cache_path = tmp_path / "canon.json"
+    _poison(cache_path, bad)
+    assert _check([bad], cache_path) == {"bad.md": ("ok", True)}
+    monkeypatch.setattr(cnsf_canonicalize, "CANON_RULES_VERSION", cnsf_canonicalize.CANON_RULES_VERSION + 1)
+    assert _check([bad], cache_path) == {"bad.md": ("order_drift", False)}
+
+
+@pytest.mark.skipif(not yaml_backend.HAVE_LIBYAML, reason="PyYAML built without libyaml")
+def test_yaml_backend_change_invalidates_the_cache(tmp_path: Path, notes, monkeypatch: pytest.MonkeyPatch) -> None:
+    _, bad = notes
+    cache_path = tmp_path / "canon.json"
+    monkeypatch.delenv("CNSF_YAML_PURE", raising=False)
+    _poison(cache_path, bad)
+    assert _check([bad], cache_path) == {"bad.md": ("ok", True)}
+    monkeypatch.setenv("CNSF_YAML_PURE", "1")
+    assert _check([bad], cache_path) == {"bad.md": ("order_drift", False)}
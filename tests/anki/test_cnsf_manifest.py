@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from tools.anki import cnsf_manifest
+from tools.anki.cnsf_manifest import RACY_NS, NoteManifest, _stat_stamp
+
+from .conftest import TEMPLATE_NOTE
+
+OLD_NS = 1_600_000_000 * 10**9  # 2020, far outside the racy window
+
+
+@pytest.fixture
+def hashed(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """Texts the manifest hashed."""
+    seen: List[str] = []
+    sha256 = cnsf_manifest._sha256
+
+    def counting(text: str) -> str:
+        seen.append(text)
+        return sha256(text)
+
+    monkeypatch.setattr(cnsf_manifest, "_sha256", counting)
+    return seen
+
+
+def _note(tmp_path: Path, mtime_ns: int | None = OLD_NS) -> Path:
+    p = tmp_path / "note.md"
+    p.write_text(TEMPLATE_NOTE.read_text(encoding="utf-8"), encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(p, ns=(mtime_ns, mtime_ns))
+    return p
+
+
+def _reload(m: NoteManifest) -> NoteManifest:
+    m.save()
+    return NoteManifest(m.path)
+
+
+def test_stat_match_skips_hashing(tmp_path: Path, hashed: List[str]) -> None:
+    p = _note(tmp_path)
+    m = NoteManifest(tmp_path / "m.json")
+    first = m.load(p)
+    m = _reload(m)
+    hashed.clear()
+    again = m.load(p)
+    assert (m.hits, m.misses, hashed) == (1, 0, [])
+    assert (again.meta, again.front_md, again.back_md) == (first.meta, first.front_md, first.back_md)
+
+
+def test_stat_stamp_racy_edge(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    st = _note(tmp_path).stat()
+    monkeypatch.setattr(cnsf_manifest.time, "time_ns", lambda: st.st_mtime_ns + RACY_NS - 1)
+    assert _stat_stamp(st) is None
+    monkeypatch.setattr(cnsf_manifest.time, "time_ns", lambda: st.st_mtime_ns + RACY_NS)
+    assert _stat_stamp(st) == [st.st_size, st.st_mtime_ns]
+
+
+def test_recent_file_is_always_hashed(tmp_path: Path, hashed: List[str]) -> None:
+    p = _note(tmp_path, mtime_ns=None)  # just written: within RACY_NS
+    m = NoteManifest(tmp_path / "m.json")
+    m.load(p)
+    m = _reload(m)
+    hashed.clear()
+    m.load(p)
+    assert (m.hits, len(hashed)) == (1, 1)
+
+
+def test_same_size_edit_within_the_same_tick_is_seen(tmp_path: Path) -> None:
+    p = _note(tmp_path, mtime_ns=None)
+    m = NoteManifest(tmp_path / "m.json")
+    m.load(p)
+    m = _reload(m)
+    st = p.stat()
+    text = p.read_text(encoding="utf-8")
+    p.write_text(text.replace("MZFW     | 138.3", "MZFW     | 999.9"), encoding="utf-8")
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert p.stat().st_size == st.st_size
+    assert "999.9" in m.load(p).back_md
+    assert m.misses == 1
+
+
+def test_touched_file_refreshes_its_stat(tmp_path: Path, hashed: List[str]) -> None:
+    p = _note(tmp_path)
+    m = NoteManifest(tmp_path / "m.json")
+    m.load(p)
+    m = _reload(m)
+    later = OLD_NS + 10**9
+    os.utime(p, ns=(later, later))
+    hashed.clear()
+    m.load(p)
+    assert (m.hits, len(hashed)) == (1, 1)  # content unchanged: hash hit
+    m = _reload(m)
+    hashed.clear()
+    m.load(p)
+    assert (m.hits, hashed) == (1, [])  # the refreshed stat was saved
+
+
+def test_parser_version_change_discards_the_manifest(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    p = _note(tmp_path)
+    m = NoteManifest(tmp_path / "m.json")
+    m.load(p)
+    m.save()
+    monkeypatch.setattr(cnsf_manifest, "PARSER_VERSION", "something else")
+    m = NoteManifest(m.path)
+    m.load(p)
+    assert (m.hits, m.misses) == (0, 1)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+from typing import Callable, List
+
+import pytest
+
+from tools.anki.export import cnsf_to_import_tsv
+from tools.anki.export.cnsf_to_import_tsv import SOURCES_FORMAT, _file_sha256, shard_path, sources_path
+from tools.anki.md_to_html_mmd import renderer_identity
+
+from .conftest import write_notes
+
+
+@pytest.fixture
+def export(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Callable[..., int]:
+    """Run the exporter's CLI in-process (builtin renderer, manifest under tmp_path)."""
+
+    def run(notes: Path, out: Path, *flags: str) -> int:
+        argv = ["cnsf_to_import_tsv.py", "--in", str(notes), "--out", str(out), "--engine", "builtin"]
+        argv += ["--manifest", str(tmp_path / "manifest.json"), *flags]
+        monkeypatch.setattr(sys, "argv", argv)
+        return cnsf_to_import_tsv.main()
+
+    return run
+
+
+def _lines(path: Path) -> List[str]:
+    return path.read_text(encoding="utf-8").splitlines()
+
+
+def test_stream_matches_normal_export(tmp_path: Path, export) -> None:
+    notes = tmp_path / "notes"
+    write_notes(notes, 10)
+    assert export(notes, tmp_path / "normal.tsv") == 0
+    assert (tmp_path / "manifest.json").exists()
+    (tmp_path / "manifest.json").unlink()
+
+    # write_notes() keeps path order == note_id order, so both exports order rows alike.
+    assert export(notes, tmp_path / "stream.tsv", "--stream") == 0
+    assert _lines(tmp_path / "stream.tsv") == _lines(tmp_path / "normal.tsv")
+    assert len(_lines(tmp_path / "normal.tsv")) == 11
+    assert not (tmp_path / "manifest.json").exists()  # --stream implies --no-manifest
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["normal", "stream"])
+def test_shard_size_splits_rows(tmp_path: Path, export, stream: bool) -> None:
+    notes = tmp_path / "notes"
+    write_notes(notes, 7)
+    assert export(notes, tmp_path / "all.tsv") == 0
+    header, *rows = _lines(tmp_path / "all.tsv")
+
+    out = tmp_path / "sharded.tsv"
+    assert export(notes, out, "--shard-size", "3", *(["--stream"] if stream else [])) == 0
+    shards = [_lines(shard_path(out, n)) for n in (1, 2, 3)]
+    assert not shard_path(out, 4).exists() and not out.exists()
+    assert [len(s) - 1 for s in shards] == [3, 3, 1]
+    assert all(s[0] == header for s in shards)
+    assert [r for s in shards for r in s[1:]] == rows
+
+    # A smaller re-export drops the shards it no longer needs.
+    assert export(notes, out, "--shard-size", "5", "--overwrite", *(["--stream"] if stream else [])) == 0
+    assert shard_path(out, 2).exists() and not shard_path(out, 3).exists()
+
+
+def _tamper(out: Path, **sources: object) -> None:
+    """Edit a rendered cell by hand, then re-stamp <out>.sources.json (plus `sources` overrides)."""
+    out.write_text(out.read_text(encoding="utf-8").replace("138.3", "STALE"), encoding="utf-8")
+    data = json.loads(sources_path(out).read_text(encoding="utf-8"))
+    data.update(tsv_sha256=_file_sha256(out), **sources)
+    sources_path(out).write_text(json.dumps(data), encoding="utf-8")
+
+
+@pytest.mark.parametrize(
+    "sources,reused",
+    [
+        ({}, 4),
+        ({"renderer": "multimarkdown 6.6.0"}, 0),
+        ({"format": SOURCES_FORMAT + 1}, 0),
+    ],
+    ids=["same renderer", "other renderer", "other format"],
+)
+def test_incremental_reuses_only_matching_sources(tmp_path: Path, export, capsys, sources: dict, reused: int) -> None:
+    notes = tmp_path / "notes"
+    write_notes(notes, 4)
+    out = tmp_path / "out.tsv"
+    assert export(notes, out, "--incremental") == 0
+    assert json.loads(sources_path(out).read_text(encoding="utf-8"))["renderer"] == renderer_identity("builtin")
+    capsys.readouterr()
+
+    _tamper(out, **sources)
+    assert export(notes, out, "--incremental") == 0
+    assert f"Incremental: reused={reused} rendered={4 - reused}" in capsys.readouterr().out
+    assert ("STALE" in out.read_text(encoding="utf-8")) == bool(reused)
+
+
+def test_incremental_rerenders_after_a_hand_edit(tmp_path: Path, export, capsys) -> None:
+    notes = tmp_path / "notes"
+    paths = write_notes(notes, 4)
+    out = tmp_path / "out.tsv"
+    assert export(notes, out, "--incremental") == 0
+    out.write_text(out.read_text(encoding="utf-8").replace("138.3", "STALE"), encoding="utf-8")
+    capsys.readouterr()
+
+    assert export(notes, out, "--incremental") == 0
+    assert "Incremental: reused=0 rendered=4" in capsys.readouterr().out  # TSV no longer matches tsv_sha256
+    assert "STALE" not in out.read_text(encoding="utf-8")
+    paths[1].write_text(paths[1].read_text(encoding="utf-8") + "\n", encoding="utf-8")
+    assert export(notes, out, "--incremental") == 0
+    assert "Incremental: reused=3 rendered=1" in capsys.readouterr().out
+
+
+def _runs(log: Path) -> int:
+    return len(log.read_text(encoding="utf-8").splitlines())
+
+
+def test_batched_multimarkdown_export_matches_per_fragment(tmp_path: Path, export, fake_mmd: Path) -> None:
+    notes = tmp_path / "notes"
+    write_notes(notes, 6)
+    mmd = ["--engine", "multimarkdown", "--no-render-cache"]
+    assert export(notes, tmp_path / "single.tsv", *mmd) == 0
+    assert _runs(fake_mmd) == 12  # the default --batch-size 1: one run per fragment
+
+    fake_mmd.write_text("", encoding="utf-8")
+    assert export(notes, tmp_path / "batched.tsv", *mmd, "--batch-size", "4") == 0
+    assert _runs(fake_mmd) == 2  # chunks of 4 + 2 notes
+    single = (tmp_path / "single.tsv").read_text(encoding="utf-8")
+    assert (tmp_path / "batched.tsv").read_text(encoding="utf-8") == single
+    assert "<!-- renderer: MultiMarkdown 6.6.0 (fake) -->" in single
+
+    assert export(notes, tmp_path / "verified.tsv", *mmd, "--batch-size", "4", "--verify-batch") == 0
+    assert (tmp_path / "verified.tsv").read_text(encoding="utf-8") == single
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import pytest
+
+from tools.anki.cnsf_parse import load_cnsf_note
+from tools.anki.md_builtin import render_markdown
+from tools.anki.md_to_html_mmd import _find_mmd, _run_mmd
+
+from .conftest import requires_mmd
+
+# (markdown, expected HTML in MultiMarkdown 6 formatting)
+FIXTURES = {
+    "tight list": (
+        "- a\n- b",
+        "<ul>\n<li>a</li>\n<li>b</li>\n</ul>\n",
+    ),
+    "loose list (blank between items)": (
+        "- a\n\n- b",
+        "<ul>\n<li><p>a</p></li>\n<li><p>b</p></li>\n</ul>\n",
+    ),
+    "loose list (blank inside an item)": (
+        "- a\n\n  para\n- b",
+        "<ul>\n<li><p>a</p>\n\n<p>para</p></li>\n<li><p>b</p></li>\n</ul>\n",
+    ),
+    "ordered list": (
+        "1. one\n2. two",
+        "<ol>\n<li>one</li>\n<li>two</li>\n</ol>\n",
+    ),
+    "nested tight list": (
+        "- a\n  - b\n  - c\n- d",
+        "<ul>\n<li>a\n\n<ul>\n<li>b</li>\n<li>c</li>\n</ul></li>\n<li>d</li>\n</ul>\n",
+    ),
+    "loose nested list keeps the outer list tight": (
+        "- a\n  - b\n\n  - c\n- d",
+        "<ul>\n<li>a\n\n<ul>\n<li><p>b</p></li>\n<li><p>c</p></li>\n</ul></li>\n<li>d</li>\n</ul>\n",
+    ),
+    "paragraph after a nested list": (
+        "1. x\n   - y\n\n   more\n2. z",
+        "<ol>\n<li><p>x</p>\n\n<ul>\n<li>y</li>\n</ul>\n\n<p>more</p></li>\n<li><p>z</p></li>\n</ol>\n",
+    ),
+    "lazy continuation line": (
+        "- a\ncontinued\n- b",
+        "<ul>\n<li>a\ncontinued</li>\n<li>b</li>\n</ul>\n",
+    ),
+    "table with alignment": (
+        "| a | b | c |\n|:--|--:|:-:|\n| 1 | 2 | 3 |",
+        "<table>\n<colgroup>\n"
+        '<col style="text-align:left;"/>\n<col style="text-align:right;"/>\n<col style="text-align:center;"/>\n'
+        "</colgroup>\n\n<thead>\n<tr>\n"
+        '\t<th style="text-align:left;">a</th>\n'
+        '\t<th style="text-align:right;">b</th>\n'
+        '\t<th style="text-align:center;">c</th>\n'
+        "</tr>\n</thead>\n\n<tbody>\n<tr>\n"
+        '\t<td style="text-align:left;">1</td>\n'
+        '\t<td style="text-align:right;">2</td>\n'
+        '\t<td style="text-align:center;">3</td>\n'
+        "</tr>\n</tbody>\n</table>\n",
+    ),
+    "table without alignment, fill-in blanks": (
+        "| Limit | Value |\n|---|---|\n| MZFW | ___ |",
+        "<table>\n<colgroup>\n<col />\n<col />\n</colgroup>\n\n<thead>\n<tr>\n"
+        "\t<th>Limit</th>\n\t<th>Value</th>\n</tr>\n</thead>\n\n<tbody>\n<tr>\n"
+        "\t<td>MZFW</td>\n\t<td>___</td>\n</tr>\n</tbody>\n</table>\n",
+    ),
+    "paragraph, emphasis and list": (
+        "**Bold** and *em*:\n\n- x",
+        "<p><strong>Bold</strong> and <em>em</em>:</p>\n\n<ul>\n<li>x</li>\n</ul>\n",
+    ),
+}
+
+
+@pytest.mark.parametrize("md,expected", FIXTURES.values(), ids=FIXTURES.keys())
+def test_fixture(md: str, expected: str) -> None:
+    assert render_markdown(md) == expected
+
+
+@requires_mmd
+@pytest.mark.parametrize("md", [md for md, _ in FIXTURES.values()], ids=FIXTURES.keys())
+def test_fixture_parity(md: str) -> None:
+    assert render_markdown(md) == _run_mmd(_find_mmd(), md)
+
+
+@requires_mmd
+def test_parity_on_repo_notes(repo_notes) -> None:
+    mmd_cmd = _find_mmd()
+    for p in repo_notes:
+        note = load_cnsf_note(str(p))
+        for md in (note.front_md, note.back_md):
+            assert render_markdown(md) == _run_mmd(mmd_cmd, md), p
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import pytest
+
+from tools.anki.cnsf_parse import load_cnsf_note
+from tools.anki.md_to_html_mmd import (
+    _batch_safe,
+    render_cnsf_note_to_html,
+    render_cnsf_notes_to_html,
+    render_fragments,
+)
+
+from .conftest import requires_mmd
+
+# Document-wide MultiMarkdown syntax that could leak between concatenated fragments.
+DOCUMENT_WIDE = [
+    "Text with a footnote.[^1]\n\n[^1]: The footnote.",
+    "A [reference link][ref].\n\n[ref]: https://example.com",
+    "*[HUD]: Head-up display\n\nThe HUD is on.",
+    "See [#cite].",
+    "Title: metadata block\n\nBody.",
+    "```\nunclosed fence",
+]
+
+
+@pytest.mark.parametrize("md", DOCUMENT_WIDE)
+def test_document_wide_syntax_is_never_batched(md: str) -> None:
+    assert not _batch_safe(md)
+
+
+def test_plain_fragments_are_batched() -> None:
+    assert _batch_safe("- a\n- b\n\n| x | y |\n|---|---|\n| 1 | 2 |")
+
+
+@requires_mmd
+def test_batched_notes_match_single_renders(repo_notes) -> None:
+    notes = [load_cnsf_note(str(p)) for p in repo_notes]
+    batched = render_cnsf_notes_to_html(notes)
+    single = [render_cnsf_note_to_html(n) for n in notes]
+    assert batched == single
+
+
+@requires_mmd
+def test_batched_fragments_match_single_renders_with_document_wide_syntax() -> None:
+    mds = ["Before [ref] and [^1].", *DOCUMENT_WIDE, "After [ref] and HUD.", "- a\n\n  para\n- b"]
+    batched = render_fragments(mds, max_batch=len(mds))
+    single = [render_fragments([md])[0] for md in mds]
+    assert batched == single
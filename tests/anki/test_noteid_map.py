@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+from tools.anki import noteid_map
+from tools.anki.noteid_map import NoteIdMap, read_noteid_map
+
+
+def test_read_does_not_create_a_sqlite_map(tmp_path: Path) -> None:
+    path = tmp_path / "missing" / "map.sqlite"
+    assert read_noteid_map(path) == {}
+    assert not path.parent.exists()
+    path = tmp_path / "map.sqlite"
+    path.touch()
+    assert read_noteid_map(path) == {}
+    assert path.stat().st_size == 0
+
+
+def test_read_opens_a_sqlite_map_read_only(tmp_path: Path) -> None:
+    path = tmp_path / "map.sqlite"
+    with NoteIdMap(path) as m:
+        m.add_many([("a", 1700000000001), ("b", "1700000000002")])
+    before = path.read_bytes()
+    assert read_noteid_map(path) == {"a": "1700000000001", "b": "1700000000002"}
+    assert path.read_bytes() == before
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["map.sqlite"]
+
+
+def test_non_numeric_noteids_are_reported_not_raised(tmp_path: Path) -> None:
+    path = tmp_path / "map.sqlite"
+    with NoteIdMap(path) as m:
+        assert m.add("a", "1700000000001")
+        assert not m.add("b", "n/a")
+        assert m.invalid == [("b", "n/a")]
+        assert "non-numeric noteIds=1" in m.problems()
+    assert read_noteid_map(path) == {"a": "1700000000001"}
+
+
+def test_convert_skips_non_numeric_noteids(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys) -> None:
+    src = tmp_path / "map.tsv"
+    src.write_text("note_id\tnoteId\na\t1700000000001\nb\tTODO\nc\t1700000000003\n", encoding="utf-8")
+    dst = tmp_path / "map.sqlite"
+    monkeypatch.setattr(sys, "argv", ["noteid_map.py", str(src), "--to", str(dst)])
+    assert noteid_map.main() == 0
+    out = capsys.readouterr().out
+    assert "entries=2" in out and "non_numeric_noteids=1" in out
+    assert "non-numeric noteId (ignored): b: 'TODO'" in out
+    assert "OK: wrote entries=2" in out
+    assert read_noteid_map(dst) == {"a": "1700000000001", "c": "1700000000003"}
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import pytest
+
+from tools.anki.tag_utils import TagSpec, tag_delta, tag_namespaces
+
+
+@pytest.mark.parametrize(
+    "tags,expected",
+    [
+        (["domain:b737", "status:draft", "domain:a320"], ("domain:", "status:")),
+        (["b737::limits::wind"], ("b737::limits::",)),
+        (["b737::limits::wind", "b737::limits::weight", "b737::systems"], ("b737::limits::", "b737::")),
+        (["topic:b737::limits"], ("topic:b737::",)),
+        (["Domain:B737", "domain:a320", "B737::Limits::Wind"], ("domain:", "b737::limits::")),
+        (["leech", "b737::", "::x", ":x", "x:"], ()),
+    ],
+)
+def test_tag_namespaces(tags: list[str], expected: tuple[str, ...]) -> None:
+    assert tag_namespaces(tags) == expected
+
+
+def _spec(desired: list[str]) -> TagSpec:
+    # Same policy as tsv_to_anki.managed_tag_spec.
+    return TagSpec(managed_prefixes=TagSpec().managed_prefixes + tag_namespaces(desired))
+
+
+def test_hierarchical_delta_keeps_sibling_manual_tags() -> None:
+    desired = ["b737::limits::wind"]
+    existing = ["b737::limits::weight", "b737::personal", "leech"]
+    assert tag_delta(existing, desired, _spec(desired)) == (["b737::limits::wind"], ["b737::limits::weight"])
+
+
+def test_mixed_case_delta() -> None:
+    desired = ["Domain:B737", "B737::Limits::Wind"]
+    existing = ["domain:a320", "domain:b737", "b737::limits::wind", "b737::limits::old", "Marked"]
+    assert tag_delta(existing, desired, _spec(desired)) == ([], ["domain:a320", "b737::limits::old"])
+
+
+def test_repo_namespace_dropped_from_a_note_is_removed() -> None:
+    desired = ["domain:b737"]
+    existing = ["domain:b737", "status:unverified", "Status:Verified", "leech"]
+    assert tag_delta(existing, desired, _spec(desired)) == ([], ["status:unverified", "Status:Verified"])
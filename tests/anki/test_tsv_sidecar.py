@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from tools.anki import merge_base_and_after, tsv_sidecar
+from tools.anki.update_notes_from_tsv import read_import_html_tsv
+
+HEADER = ["note_id", "Front"]
+
+
+@pytest.fixture
+def opened(monkeypatch: pytest.MonkeyPatch) -> List[sqlite3.Connection]:
+    conns: List[sqlite3.Connection] = []
+    connect = sqlite3.connect
+
+    def tracking_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conns.append(conn)
+        return conn
+
+    monkeypatch.setattr(tsv_sidecar.sqlite3, "connect", tracking_connect)
+    return conns
+
+
+def _is_closed(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.execute("SELECT 1")
+    except sqlite3.ProgrammingError:
+        return True
+    return False
+
+
+def _write(tmp_path: Path) -> Path:
+    tsv = tmp_path / "x.tsv"
+    tsv.write_text("note_id\tFront\na\tA\n", encoding="utf-8")
+    tsv_sidecar.write_sidecar(tsv, HEADER, [{"note_id": "a", "Front": "A"}])
+    return tsv
+
+
+def test_roundtrip(tmp_path: Path) -> None:
+    tsv = _write(tmp_path)
+    assert tsv_sidecar.load_tuples(tsv) == (HEADER, [("a", "A")])
+
+
+def test_stale_sidecar_is_closed(tmp_path: Path, opened: List[sqlite3.Connection]) -> None:
+    tsv = _write(tmp_path)
+    tsv.write_text("note_id\tFront\na\tchanged\n", encoding="utf-8")
+    opened.clear()
+    assert tsv_sidecar.load_tuples(tsv) is None
+    assert opened and all(_is_closed(c) for c in opened)
+
+
+def test_broken_meta_is_closed(tmp_path: Path, opened: List[sqlite3.Connection]) -> None:
+    tsv = _write(tmp_path)
+    with sqlite3.connect(str(tsv_sidecar.sidecar_path(tsv))) as conn:
+        conn.execute("UPDATE meta SET value = 'not json' WHERE key = 'format'")
+    conn.close()
+    opened.clear()
+    assert tsv_sidecar.load_tuples(tsv) is None
+    assert opened and all(_is_closed(c) for c in opened)
+
+
+def test_merged_tsv_reads_the_same_with_and_without_sidecar(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    base = tmp_path / "base.tsv"
+    base.write_text('note_id\tnoteId\tprompt\na\t1700000000001\t"Quoted" prompt\nb\t\tplain\n', encoding="utf-8")
+    after = tmp_path / "after.tsv"
+    after.write_text('note_id\tafter_html\na\t"<b>x</b>" and "y"\nb\t<p>b</p>\\n<p>c</p>\n', encoding="utf-8")
+    out = tmp_path / "import_html.tsv"
+    argv = ["merge_base_and_after.py", "--base", str(base), "--after", str(after), "--out", str(out), "--sqlite"]
+    monkeypatch.setattr(sys, "argv", argv)
+    merge_base_and_after.main()
+
+    from_sidecar = read_import_html_tsv(out)
+    tsv_sidecar.sidecar_path(out).unlink()
+    assert read_import_html_tsv(out) == from_sidecar
+    assert [r["answer_html"] for r in from_sidecar] == ['"<b>x</b>" and "y"', "<p>b</p>\\n<p>c</p>"]
+    assert from_sidecar[0]["prompt"] == '"Quoted" prompt'
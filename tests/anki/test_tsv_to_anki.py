@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import csv
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import pytest
+
+from tools.anki.export.cnsf_to_import_tsv import TSV_BASE_HEADER
+from tools.anki.mock_anki_connect import MockAnkiConnect
+from tools.anki.noteid_map import read_noteid_map
+from tools.anki.sync import tsv_to_anki
+
+MODEL = "B737_Structured"
+DECK = "B737::Limits"
+
+
+def row(note_id: str, front: str = "", tags: str = "domain:b737 status:unverified", noteId: str = "") -> Dict[str, str]:
+    return {
+        "note_id": note_id,
+        "noteId": noteId,
+        "model": MODEL,
+        "deck": DECK,
+        "tags": tags,
+        "front_html": front or f"<p>{note_id} front</p>",
+        "back_html": f"<p>{note_id} back</p>",
+    }
+
+
+def write_tsv(path: Path, rows: List[Dict[str, str]]) -> Path:
+    with path.open("w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=TSV_BASE_HEADER, delimiter="\t", lineterminator="\n")
+        w.writeheader()
+        w.writerows(rows)
+    return path
+
+
+def by_note_id(anki: MockAnkiConnect) -> Dict[str, Dict]:
+    return {n["fields"]["NoteID"]: n for n in anki.collection.notes.values()}
+
+
+@pytest.fixture
+def sync(anki: MockAnkiConnect, monkeypatch: pytest.MonkeyPatch) -> Callable[..., int]:
+    """Run tsv_to_anki's CLI in-process against the mock; returns the exit code."""
+
+    def run(tsv: Path, *flags: str, url: str = "") -> int:
+        monkeypatch.setattr(sys, "argv", ["tsv_to_anki.py", "--tsv", str(tsv), "--anki-url", url or anki.url, *flags])
+        return tsv_to_anki.main()
+
+    return run
+
+
+@pytest.mark.parametrize("mode", [[], ["--batch"], ["--diff"], ["--concurrency", "2"]], ids=["serial", "batch", "diff", "concurrency"])
+def test_dropped_repo_namespace_is_removed(tmp_path: Path, anki: MockAnkiConnect, sync, mode: List[str]) -> None:
+    tsv = tmp_path / "x.tsv"
+    assert sync(write_tsv(tsv, [row("a"), row("b")])) == 0
+    for n in anki.collection.notes.values():
+        n["tags"].append("leech")
+    # Nothing in the TSV uses status: any more.
+    assert sync(write_tsv(tsv, [row("a", tags="domain:b737"), row("b", tags="domain:b737")]), *mode) == 0
+    assert {k: n["tags"] for k, n in by_note_id(anki).items()} == {"a": ["domain:b737", "leech"], "b": ["domain:b737", "leech"]}
+
+
+def _map_lines(path: Path) -> List[str]:
+    return path.read_text(encoding="utf-8").splitlines()
+
+
+def _edited(rows: List[Dict[str, str]], *edit: str) -> List[Dict[str, str]]:
+    return [{**r, "front_html": f"<p>{r['note_id']} edited</p>"} if r["note_id"] in edit else r for r in rows]
+
+
+@pytest.fixture
+def seeded(tmp_path: Path, anki: MockAnkiConnect, sync) -> Path:
+    """x.tsv with notes n0..n4 (no noteId column values), already created in the mock."""
+    tsv = write_tsv(tmp_path / "x.tsv", [row(f"n{i}") for i in range(5)])
+    assert sync(tsv) == 0
+    assert sorted(by_note_id(anki)) == [f"n{i}" for i in range(5)]
+    anki.actions.clear()
+    anki.requests = 0
+    return tsv
+
+
+def test_batch_sends_multi_chunks(seeded: Path, anki: MockAnkiConnect, sync) -> None:
+    rows = _edited([row(f"n{i}") for i in range(5)], "n1", "n3")
+    rows[2]["tags"] = "domain:b737 status:verified"
+    assert sync(write_tsv(seeded, rows), "--batch", "--chunk-size", "3") == 0
+    notes = by_note_id(anki)
+    assert notes["n1"]["fields"]["Front"] == "<p>n1 edited</p>"
+    assert notes["n2"]["tags"] == ["domain:b737", "status:verified"]
+    # version, modelFieldNames, findNotes + notesInfo (resolve), then per chunk of 3 rows one
+    # updateNoteFields/getNoteTags multi; the tag delta of n2 is one more multi.
+    assert anki.actions["multi"] == 3
+    assert anki.requests == 7
+    assert anki.actions["updateNoteFields"] == 5 and anki.actions["getNoteTags"] == 5
+
+
+def test_diff_only_sends_changes(seeded: Path, anki: MockAnkiConnect, sync, capsys) -> None:
+    rows = _edited([row(f"n{i}") for i in range(5)], "n4")
+    rows[0]["tags"] = "domain:b737 status:verified"
+    before = {k: dict(n["fields"]) for k, n in by_note_id(anki).items()}
+    assert sync(write_tsv(seeded, rows), "--diff") == 0
+    out = capsys.readouterr().out
+    assert "Done. noop=3 fields_changed=1 tags_changed=1 created=0 failed=0" in out
+    assert "[fields: Front]" in out and "[tags: +status:verified -status:unverified]" in out
+    assert anki.actions["updateNoteFields"] == 1 and anki.actions["getNoteTags"] == 0
+    after = by_note_id(anki)
+    assert after["n4"]["fields"] == {**before["n4"], "Front": "<p>n4 edited</p>"}
+    assert all(after[k]["fields"] == before[k] for k in ("n0", "n1", "n2", "n3"))
+
+
+def test_concurrency_keeps_row_order_per_note(tmp_path: Path, anki: MockAnkiConnect, sync) -> None:
+    anki.jitter = 0.005
+    rows = []
+    for i in range(8):
+        rows += [row(f"n{i}", front="<p>first</p>", tags="domain:b737 status:unverified")]
+        rows += [row(f"n{i}", front="<p>second</p>", tags="domain:b737 status:verified")]
+    assert sync(write_tsv(tmp_path / "x.tsv", rows), "--concurrency", "4", "--progress-interval", "0") == 0
+    notes = by_note_id(anki)
+    assert len(anki.collection.notes) == 8
+    assert all(n["fields"]["Front"] == "<p>second</p>" for n in notes.values())
+    assert all(n["tags"] == ["domain:b737", "status:verified"] for n in notes.values())
+
+
+def test_concurrency_reports_failures_and_skips_later_rows(seeded: Path, anki: MockAnkiConnect, sync, capsys) -> None:
+    rows = [row(f"n{i}") for i in range(5)]
+    rows[1]["noteId"] = "999"  # no such note
+    rows.append(row("n1", front="<p>later</p>"))
+    assert sync(write_tsv(seeded, rows), "--concurrency", "3", "--progress-interval", "0", "--no-journal") == 1
+    captured = capsys.readouterr()
+    assert "FAIL: n1 (999): AnkiConnect error for updateNoteFields: Note was not found: 999" in captured.err
+    assert "skipped: an earlier row for this note_id failed" in captured.err
+    assert "Done. updated=4 created=0 failed=2" in captured.out
+    assert by_note_id(anki)["n1"]["fields"]["Front"] == "<p>n1 front</p>"
+
+
+def test_creates_are_planned_in_bulk(tmp_path: Path, anki: MockAnkiConnect, sync, capsys) -> None:
+    rows = [row(f"n{i}") for i in range(6)] + [row("n2", front="<p>again</p>")]
+    assert sync(write_tsv(tmp_path / "x.tsv", rows), "--no-resolve", "--create-chunk-size", "4") == 0
+    assert anki.actions["canAddNotes"] == 1 and anki.actions["addNotes"] == 2 and anki.actions["addNote"] == 0
+    assert len(anki.collection.notes) == 6
+    assert by_note_id(anki)["n2"]["fields"]["Front"] == "<p>again</p>"  # the repeat row updates the new note
+    assert "Done. updated=1 created=6" in capsys.readouterr().out
+
+
+def test_duplicate_create_adopts_the_existing_note(seeded: Path, anki: MockAnkiConnect, sync, capsys) -> None:
+    rows = _edited([row(f"n{i}") for i in range(5)], "n0") + [row("n5")]
+    # --no-resolve: rows reach the create planner without noteId; canAddNotes refuses the duplicates.
+    assert sync(write_tsv(seeded, rows), "--no-resolve", "--batch") == 0
+    out = capsys.readouterr().out
+    assert out.count("adopted+updated existing noteId") == 5
+    assert "Done. updated=5 created=1 failed=0" in out
+    assert len(anki.collection.notes) == 6
+    assert by_note_id(anki)["n0"]["fields"]["Front"] == "<p>n0 edited</p>"
+
+
+def test_missing_noteids_are_resolved_in_bulk(seeded: Path, anki: MockAnkiConnect, sync, capsys) -> None:
+    map_out = seeded.with_name("map.tsv")
+    assert sync(seeded, "--resolve-only", "--map-out", str(map_out)) == 0
+    assert "OK: resolved noteId via NoteID search for notes=5" in capsys.readouterr().out
+    assert anki.actions["findNotes"] == 1 and anki.actions["notesInfo"] == 1
+    assert anki.actions["updateNoteFields"] == 0 and anki.actions["addNotes"] == 0
+    ids = {k: str(n["noteId"]) for k, n in by_note_id(anki).items()}
+    assert _map_lines(map_out) == ["note_id\tnoteId"] + [f"n{i}\t{ids[f'n{i}']}" for i in range(5)]
+
+
+def test_resume_skips_committed_rows(seeded: Path, anki: MockAnkiConnect, sync, capsys) -> None:
+    rows = _edited([row(f"n{i}") for i in range(5)], *(f"n{i}" for i in range(5)))
+    rows[2]["noteId"] = "999"  # the serial run stops here
+    with pytest.raises(RuntimeError, match="Note was not found"):
+        sync(write_tsv(seeded, rows))
+    journal = seeded.with_name("x.tsv.sync-journal.jsonl")
+    assert journal.exists()
+    assert anki.actions["updateNoteFields"] == 3
+
+    rows[2]["noteId"] = ""
+    capsys.readouterr()
+    anki.actions.clear()
+    assert sync(write_tsv(seeded, rows), "--resume") == 0
+    assert "OK: resume skipped rows=2" in capsys.readouterr().out
+    assert anki.actions["updateNoteFields"] == 3
+    assert all(n["fields"]["Front"].endswith("edited</p>") for n in by_note_id(anki).values())
+    assert not journal.exists()
+
+
+def test_changed_only_is_tracked_per_url(seeded: Path, anki: MockAnkiConnect, sync, capsys) -> None:
+    rows = _edited([row(f"n{i}") for i in range(5)], "n3")
+    write_tsv(seeded, rows)
+    assert sync(seeded, "--changed-only") == 0
+    assert "OK: changed-only skipped rows=4" in capsys.readouterr().out
+    assert anki.actions["updateNoteFields"] == 1
+
+    with MockAnkiConnect() as other:
+        assert sync(seeded, "--changed-only", url=other.url) == 0
+        assert "OK: changed-only skipped rows=0" in capsys.readouterr().out
+        assert sorted(by_note_id(other)) == [f"n{i}" for i in range(5)]
+
+    # The first URL's ledger state survived the sync against the second one.
+    anki.actions.clear()
+    assert sync(seeded, "--changed-only") == 0
+    assert "Done. nothing changed since the last sync" in capsys.readouterr().out
+    assert anki.requests and not anki.actions
+
+
+@pytest.mark.parametrize("name", ["map.tsv", "map.sqlite"])
+def test_map_out_records_created_notes(tmp_path: Path, anki: MockAnkiConnect, sync, name: str) -> None:
+    tsv = write_tsv(tmp_path / "x.tsv", [row(f"n{i}") for i in range(3)])
+    map_path = tmp_path / name
+    assert sync(tsv, "--map-out", str(map_path), "--dry-run") == 0
+    assert sync(tsv, "--map-out", str(map_path), "--check") == 1
+    assert not map_path.exists()
+
+    assert sync(tsv, "--map-out", str(map_path)) == 0
+    ids = {k: str(n["noteId"]) for k, n in by_note_id(anki).items()}
+    assert read_noteid_map(map_path) == ids
+
+    # With the map applied there is nothing to create or look up.
+    anki.actions.clear()
+    assert sync(tsv, "--map-in", str(map_path), "--check") == 0
+    assert sync(tsv, "--map-in", str(map_path), "--batch") == 0
+    assert anki.actions["findNotes"] == 0 and anki.actions["canAddNotes"] == 0
+    assert len(anki.collection.notes) == 3
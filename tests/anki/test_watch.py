@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+from tools.anki.export import cnsf_to_import_tsv
+from tools.anki.watch import Watcher
+
+from .conftest import write_notes
+
+
+@pytest.fixture
+def exported(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """Full export of a notes dir (builtin renderer); returns the TSV text."""
+
+    def run(notes: Path, map_path: Path | None = None) -> str:
+        out = tmp_path / "export.tsv"
+        argv = ["cnsf_to_import_tsv.py", "--in", str(notes), "--out", str(out), "--engine", "builtin"]
+        argv += ["--overwrite", "--no-manifest"] + (["--map", str(map_path)] if map_path else [])
+        monkeypatch.setattr(sys, "argv", argv)
+        assert cnsf_to_import_tsv.main() == 0
+        return out.read_text(encoding="utf-8")
+
+    return run
+
+
+def test_poll_rebuilds_like_a_full_export(tmp_path: Path, exported) -> None:
+    notes = tmp_path / "notes"
+    paths = write_notes(notes, 6)
+    out = tmp_path / "out.tsv"
+    map_path = tmp_path / "map.tsv"
+    w = Watcher([str(notes)], out, map_path=map_path, engine="builtin")
+    assert w.build() == 0
+    assert w.write()
+    assert out.read_text(encoding="utf-8") == exported(notes)
+    assert out.with_name("out.tsv.sources.json").exists()
+
+    paths[1].write_text(paths[1].read_text(encoding="utf-8").replace("138.3", "140.0 (edited)"), encoding="utf-8")
+    paths[2].unlink()
+    added = write_notes(notes, 1, start=9)[0]
+    map_path.write_text("note_id\tnoteId\nn003\t1700000000123\n", encoding="utf-8")
+    changes = {(kind, p) for kind, p, _ in w.poll()}
+    assert changes == {("modified", paths[1]), ("deleted", paths[2]), ("added", added), ("map", map_path)}
+    assert w.write()
+    text = out.read_text(encoding="utf-8")
+    assert text == exported(notes, map_path)
+    assert "140.0 (edited)" in text and "n003\t1700000000123\t" in text and "\nn002\t" not in text
+
+    assert w.poll() == []
+
+
+def test_failing_note_leaves_the_tsv_alone(tmp_path: Path, exported) -> None:
+    notes = tmp_path / "notes"
+    paths = write_notes(notes, 3)
+    out = tmp_path / "out.tsv"
+    w = Watcher([str(notes)], out, engine="builtin")
+    assert w.build() == 0 and w.write()
+    before = out.read_text(encoding="utf-8")
+
+    good = paths[0].read_text(encoding="utf-8")
+    paths[0].write_text(good.replace("# back_md", "# not_a_section"), encoding="utf-8")
+    assert [kind for kind, _, _ in w.poll()] == ["modified"]
+    assert not w.write()
+    assert out.read_text(encoding="utf-8") == before
+
+    paths[0].write_text(good + "\n", encoding="utf-8")
+    w.poll()
+    assert w.write()
+    assert out.read_text(encoding="utf-8") == exported(notes)
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from tools.anki import yaml_backend
+from tools.anki.cnsf_canonicalize import canon_fingerprint, canonicalize_meta, dump_yaml, split_frontmatter
+
+requires_libyaml = pytest.mark.skipif(not yaml_backend.HAVE_LIBYAML, reason="PyYAML built without libyaml")
+
+
+def _canonical_yaml(text: str, path: Path, pure: bool) -> str:
+    fm = split_frontmatter(text, path)
+    meta = yaml_backend.safe_load(fm.yaml_text, pure=pure) or {}
+    return dump_yaml(canonicalize_meta(meta, path), pure=pure)
+
+
+@requires_libyaml
+def test_backends_dump_repo_notes_identically(repo_notes) -> None:
+    for p in repo_notes:
+        text = p.read_text(encoding="utf-8")
+        assert _canonical_yaml(text, p, pure=True) == _canonical_yaml(text, p, pure=False), p
+
+
+@requires_libyaml
+@pytest.mark.parametrize(
+    "value",
+    [
+        "Ch 18 §18.2.3 Weight Limits — Certificated Limits table, " * 4,  # folded past width=88
+        "Température: −40 °C … +55 °C ✈",
+        "line one\nline two\n",
+        "quotes ' and \" and: colon # hash",
+        "",
+    ],
+)
+def test_backends_dump_edge_values_identically(value: str) -> None:
+    meta = {"note_id": "x", "fields": {"Source Location": value}}
+    assert dump_yaml(meta, pure=True) == dump_yaml(meta, pure=False)
+
+
+@requires_libyaml
+def test_fingerprint_depends_on_backend(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("CNSF_YAML_PURE", raising=False)
+    with_c = canon_fingerprint()
+    monkeypatch.setenv("CNSF_YAML_PURE", "1")
+    assert canon_fingerprint() != with_c
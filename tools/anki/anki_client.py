@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+AnkiConnect client shared by the sync tools.
+
+- Persistent HTTP/1.1 connections (http.client), pooled so several threads
+  can share one client; a connection is reused until the server closes it.
+- Configurable timeout, retry with exponential backoff on transport errors
+  (the sync CLIs expose them as --timeout/--retries).
+  Actions that may write are only retried when the request provably never
+  reached the server (connection refused, failure while sending); read-only
+  actions are also retried after timeouts and dropped responses. A pooled
+  connection is checked before reuse and dropped if the server closed it.
+- AnkiConnect API errors raise AnkiConnectError (a RuntimeError, so callers
+  matching on the message, e.g. "duplicate", keep working).
+
+Usage:
+    client = get_client("http://127.0.0.1:8765")
+    client.version()
+    client.notes_info([1700000000000])
+"""
+
+from __future__ import annotations
+
+import http.client
+import json
+import select
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+ANKI_CONNECT_URL_DEFAULT = "http://127.0.0.1:8765"
+API_VERSION = 6
+DEFAULT_TIMEOUT = 15.0
+DEFAULT_RETRIES = 2
+
+# Actions that never modify the collection (safe to retry after a timeout).
+READ_ONLY_ACTIONS = frozenset(
+    {
+        "version",
+        "deckNames",
+        "modelNames",
+        "modelFieldNames",
+        "findNotes",
+        "notesInfo",
+        "getNoteTags",
+        "canAddNotes",
+    }
+)
+
+
+class AnkiConnectError(RuntimeError):
+    """AnkiConnect answered with an error for an action."""
+
+
+def action(name: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build one action entry for a `multi` request."""
+    return {"action": name, "version": API_VERSION, "params": params or {}}
+
+
+def _is_read_only(name: str, params: Optional[Dict[str, Any]]) -> bool:
+    if name == "multi":
+        return all(a.get("action") in READ_ONLY_ACTIONS for a in (params or {}).get("actions", []))
+    return name in READ_ONLY_ACTIONS
+
+
+def _is_open(conn: http.client.HTTPConnection) -> bool:
+    """
+    False if an idle keep-alive connection is unusable: the server closed it
+    (EOF is readable) or sent something unasked. Checked before reuse, so a
+    write is not sent on a connection that is known to be gone.
+    """
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+
+class AnkiConnectClient:
+    def __init__(
+        self,
+        url: str = ANKI_CONNECT_URL_DEFAULT,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = 0.25,
+        pool_size: int = 8,
+    ) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported AnkiConnect URL: {url}")
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname or "127.0.0.1"
+        self._port = parts.port
+        self._path = parts.path or "/"
+        # Idle connections, most recently used last; guarded by _lock, like _pool_size.
+        self._pool: List[http.client.HTTPConnection] = []
+        self._pool_size = pool_size
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    # -- connection pool -------------------------------------------------
+
+    def _new_conn(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        with self._lock:
+            self.connections += 1
+        return cls(self._host, self._port, timeout=self.timeout)
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """Return (connection, reused); pooled connections the server has closed are dropped."""
+        while True:
+            with self._lock:
+                if not self._pool:
+                    break
+                conn = self._pool.pop()
+            if _is_open(conn):
+                return conn, True
+            conn.close()
+        return self._new_conn(), False
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            # A connection opened before configure() changed the timeout is not kept.
+            if len(self._pool) < self._pool_size and conn.timeout == self.timeout:
+                self._pool.append(conn)
+                return
+        conn.close()
+
+    def grow_pool(self, size: int) -> None:
+        """Keep up to `size` idle connections (e.g. one per concurrent worker)."""
+        with self._lock:
+            self._pool_size = max(self._pool_size, size)
+
+    def configure(self, timeout: Optional[float] = None, retries: Optional[int] = None) -> None:
+        """Change the timeout and/or retry count; idle connections with the old timeout are closed."""
+        if retries is not None:
+            self.retries = retries
+        if timeout is not None and timeout != self.timeout:
+            self.timeout = timeout
+            self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._pool = self._pool, []
+        for conn in idle:
+            conn.close()
+
+    def __enter__(self) -> "AnkiConnectClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # -- transport -------------------------------------------------------
+
+    def _post_once(self, body: bytes) -> Any:
+        """
+        One POST. On transport errors the exception gets `.unsent = True` if
+        the server cannot have processed the request (the failure happened
+        while connecting or sending), and `.stale = True` if it happened on
+        a reused keep-alive connection.
+        """
+        conn, reused = self._acquire()
+        try:
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                    # Small JSON requests: don't let Nagle + delayed ACK stall keep-alive round-trips.
+                    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                conn.request("POST", self._path, body=body, headers={"Content-Type": "application/json"})
+            except OSError as e:
+                e.unsent = True  # type: ignore[attr-defined]
+                e.stale = reused  # type: ignore[attr-defined]
+                raise
+            try:
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                # The request was sent and may have been run: never `unsent`,
+                # so only read-only actions are resent (without backoff).
+                e.stale = reused  # type: ignore[union-attr]
+                raise
+            data = resp.read()
+            if resp.status != 200:
+                raise AnkiConnectError(f"AnkiConnect HTTP {resp.status}: {data[:200]!r}")
+        except BaseException:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return json.loads(data.decode("utf-8"))
+
+    def _post(self, body: bytes, read_only: bool) -> Any:
+        attempt = 0
+        while True:
+            with self._lock:
+                self.requests += 1
+            try:
+                return self._post_once(body)
+            except AnkiConnectError:
+                raise
+            except (OSError, http.client.HTTPException) as e:
+                retryable = getattr(e, "unsent", False) or read_only
+                if not retryable or attempt >= self.retries:
+                    raise
+                if not getattr(e, "stale", False):
+                    time.sleep(self.backoff * (2**attempt))
+                attempt += 1
+
+    def request(self, name: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Run one action and return its result (raises AnkiConnectError on API errors)."""
+        payload = {"action": name, "version": API_VERSION, "params": params or {}}
+        data = self._post(json.dumps(payload).encode("utf-8"), _is_read_only(name, params))
+        if not isinstance(data, dict) or "error" not in data or "result" not in data:
+            raise AnkiConnectError(f"Unexpected AnkiConnect response for {name}: {data!r}")
+        if data["error"] is not None:
+            raise AnkiConnectError(f"AnkiConnect error for {name}: {data['error']}")
+        return data["result"]
+
+    # -- typed actions ---------------------------------------------------
+
+    def multi(self, actions: Sequence[Dict[str, Any]]) -> List[Tuple[Any, Optional[str]]]:
+        """
+        Send several actions in one round-trip. Returns one (result, error)
+        pair per action, in request order; per-action errors are returned,
+        not raised.
+        """
+        if not actions:
+            return []
+        raw = self.request("multi", {"actions": list(actions)}) or []
+        if len(raw) != len(actions):
+            raise AnkiConnectError(f"AnkiConnect multi returned {len(raw)} results for {len(actions)} actions")
+        out: List[Tuple[Any, Optional[str]]] = []
+        for item in raw:
+            # With "version": 6 on each action, every item is {"result": ..., "error": ...}.
+            if isinstance(item, dict) and "error" in item and "result" in item:
+                out.append((item.get("result"), item.get("error")))
+            else:
+                out.append((item, None))
+        return out
+
+    def version(self) -> int:
+        return int(self.request("version"))
+
+    def model_field_names(self, model_name: str) -> List[str]:
+        return list(self.request("modelFieldNames", {"modelName": model_name}) or [])
+
+    def find_notes(self, query: str) -> List[int]:
+        return [int(n) for n in self.request("findNotes", {"query": query}) or []]
+
+    def notes_info(self, note_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        return list(self.request("notesInfo", {"notes": [int(n) for n in note_ids]}) or [])
+
+    def update_note_fields(self, note_id: int, fields: Dict[str, str]) -> None:
+        self.request("updateNoteFields", {"note": {"id": int(note_id), "fields": fields}})
+
+    def get_note_tags(self, note_id: int) -> List[str]:
+        return list(self.request("getNoteTags", {"note": int(note_id)}) or [])
+
+    def add_tags(self, note_ids: Sequence[int], tags: str) -> None:
+        self.request("addTags", {"notes": [int(n) for n in note_ids], "tags": tags})
+
+    def remove_tags(self, note_ids: Sequence[int], tags: str) -> None:
+        self.request("removeTags", {"notes": [int(n) for n in note_ids], "tags": tags})
+
+    def add_note(self, note: Dict[str, Any]) -> int:
+        return int(self.request("addNote", {"note": note}))
+
+    def add_notes(self, notes: Sequence[Dict[str, Any]]) -> List[Optional[int]]:
+        return [None if n is None else int(n) for n in self.request("addNotes", {"notes": list(notes)}) or []]
+
+    def can_add_notes(self, notes: Sequence[Dict[str, Any]]) -> List[bool]:
+        return [bool(x) for x in self.request("canAddNotes", {"notes": list(notes)}) or []]
+
+
+_CLIENTS: Dict[str, AnkiConnectClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(
+    url: str = ANKI_CONNECT_URL_DEFAULT,
+    timeout: Optional[float] = None,
+    retries: Optional[int] = None,
+    pool_size: int = 8,
+) -> AnkiConnectClient:
+    """
+    Process-wide client per url, so connections are shared by all callers.
+    A timeout/retries passed here (a CLI's --timeout/--retries) stays in effect
+    for later callers that leave them out.
+    """
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(url)
+        if client is None:
+            client = _CLIENTS[url] = AnkiConnectClient(url, pool_size=pool_size)
+    client.configure(timeout, retries)
+    client.grow_pool(pool_size)
+    return client
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the CNSF pipeline on synthetic corpora.
+
+Each subcommand builds a throwaway corpus in a temp dir, times the old and
+new code paths side by side, and prints one line per variant.
+
+Examples:
+  python -m tools.anki.bench parse-once --notes 5000
+  python -m tools.anki.bench yaml --notes domains/b737/anki/notes
+  python -m tools.anki.bench l3-load --rows 50000
+  python -m tools.anki.bench anki-client --requests 2000
+  python -m tools.anki.bench noteid-map --entries 20000
+  python -m tools.anki.bench sync --rows 2000 --latency-ms 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+_NOTE_TEMPLATE = """---
+schema: cnsf/v0
+domain: bench
+note_type: limits_weight_model
+note_id: {note_id}
+anki:
+  model: B737_Structured
+  deck: B737::Limits
+tags:
+- domain:b737
+- topic:limits
+- status:unverified
+fields:
+  Source Document: B737 AOM Rev 9.0
+  Source Location: Ch 18 §18.2.3 Weight Limits
+  Verification Notes: ''
+---
+
+# front_md
+
+**B737 LIMITS — WEIGHTS ({i})**
+
+| Limit    | Value |
+|---       |---    |
+| MZFW     | ___   |
+| MTOW     | ___   |
+
+# back_md
+
+| Limit    | Value |
+|---       |---:   |
+| MZFW     | {i}.3 |
+| MTOW     | 174.2 |
+
+Memory anchor: note {i}.
+"""
+
+
+def make_corpus(root: Path, n: int) -> list[Path]:
+    """Write n synthetic CNSF notes under root/notes and return their paths."""
+    d = root / "notes"
+    d.mkdir(parents=True, exist_ok=True)
+    paths: list[Path] = []
+    for i in range(n):
+        note_id = f"bench_note_{i:06d}"
+        p = d / f"{note_id}.md"
+        p.write_text(_NOTE_TEMPLATE.format(note_id=note_id, i=i), encoding="utf-8")
+        paths.append(p)
+    return paths
+
+
+def _timed(label: str, fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"  {label:<40} {best * 1000:10.1f} ms")
+    return best
+
+
+def bench_parse_once(n: int, repeat: int) -> None:
+    from tools.anki.export.cnsf_to_import_tsv import load_envelope
+    from tools.anki.md_to_html_mmd import render_cnsf_note_to_html
+
+    with tempfile.TemporaryDirectory() as td:
+        paths = make_corpus(Path(td), n)
+        print(f"parse-once: {n} notes (builtin renderer)")
+
+        def _reparse() -> None:
+            # Pre-change export: envelope parse, then render re-reads the file.
+            for p in paths:
+                load_envelope(p, None)
+                render_cnsf_note_to_html(str(p), engine="builtin")
+
+        def _parse_once() -> None:
+            for p in paths:
+                env = load_envelope(p, None)
+                render_cnsf_note_to_html(env.note, engine="builtin")
+
+        old = _timed("read+parse twice per note", _reparse, repeat)
+        new = _timed("read+parse once per note", _parse_once, repeat)
+        print(f"  saving: {(old - new) * 1000:.1f} ms ({(1 - new / old) * 100:.0f}%)")
+
+
+def bench_yaml(roots: list[str], synthetic: int, repeat: int) -> int:
+    """
+    Canonicalize every note with the libyaml and pure-Python backends, time
+    both and fail (exit 1) if their canonical output differs in any byte.
+    """
+    from tools.anki import yaml_backend
+    from tools.anki.cnsf_canonicalize import canonicalize_meta, dump_yaml, split_frontmatter
+    from tools.anki.cnsf_parse import iter_note_paths
+
+    if not yaml_backend.HAVE_LIBYAML:
+        print("SKIP: PyYAML was built without libyaml; only the pure-Python backend is available.")
+        return 0
+
+    with tempfile.TemporaryDirectory() as td:
+        paths = list(iter_note_paths(roots)) if roots else []
+        if synthetic:
+            paths += make_corpus(Path(td), synthetic)
+        texts = [(p, p.read_text(encoding="utf-8")) for p in paths]
+        print(f"yaml: {len(texts)} notes")
+
+        def _canon(pure: bool) -> list[str]:
+            out = []
+            for p, text in texts:
+                fm = split_frontmatter(text, p)
+                meta = yaml_backend.safe_load(fm.yaml_text, pure=pure) or {}
+                out.append(dump_yaml(canonicalize_meta(meta, p), pure=pure))
+            return out
+
+        results: dict[bool, list[str]] = {}
+        for pure in (True, False):
+            label = f"load+canonicalize+dump ({yaml_backend.backend_name(pure)})"
+            _timed(label, lambda: results.__setitem__(pure, _canon(pure)), repeat)
+
+    bad = [p for (p, _), a, b in zip(texts, results[True], results[False]) if a != b]
+    for p in bad:
+        print(f"  DIFF: {p}")
+    print(f"  byte-identical: {len(texts) - len(bad)}/{len(texts)}")
+    return 1 if bad else 0
+
+
+def _l3_row(i: int, noteId: str = "", extra_tag: str = "") -> dict:
+    """One synthetic L3 import-TSV row (TSV_BASE_HEADER + Source Document, Verification Notes)."""
+    return {
+        "note_id": f"bench_note_{i:06d}",
+        "noteId": noteId,
+        "model": "B737_Structured",
+        "deck": "B737::Limits",
+        "tags": "domain:b737 topic:limits status:unverified" + (f" {extra_tag}" if extra_tag else ""),
+        "front_html": f'<p><strong>B737 LIMITS ({i})</strong></p>\\n<table>\\n<tr><td>"MZFW"</td></tr>\\n</table>',
+        "back_html": f"<p>Memory anchor: note {i}.</p>\\n" * 4,
+        "Source Document": "B737 AOM Rev 9.0",
+        "Verification Notes": "",
+    }
+
+
+def bench_l3_load(rows: int, repeat: int) -> int:
+    """parse_tsv() from the TSV vs from the SQLite sidecar; fail if they differ."""
+    import os
+
+    from tools.anki import tsv_sidecar
+    from tools.anki.export.cnsf_to_import_tsv import TSV_BASE_HEADER, TsvSink
+    from tools.anki.sync.tsv_to_anki import parse_tsv
+
+    with tempfile.TemporaryDirectory() as td:
+        tsv = Path(td) / "bench.tsv"
+        header = TSV_BASE_HEADER + ["Source Document", "Verification Notes"]
+        sink = TsvSink(tsv, header, sqlite=True)
+        for i in range(rows):
+            sink.write(_l3_row(i, noteId=str(1700000000000 + i)))
+        sink.commit()
+        print(f"l3-load: {rows} rows ({os.path.getsize(tsv) / 1e6:.1f} MB TSV)")
+
+        results = {}
+
+        def _csv() -> None:
+            sc = tsv_sidecar.sidecar_path(tsv)
+            sc.rename(sc.with_suffix(".off"))
+            try:
+                results["csv"] = parse_tsv(tsv)
+            finally:
+                sc.with_suffix(".off").rename(sc)
+
+        def _sqlite() -> None:
+            results["sqlite"] = parse_tsv(tsv)
+
+        def _lookup() -> None:
+            tsv_sidecar.lookup(tsv, f"bench_note_{rows // 2:06d}")
+
+        _timed("parse_tsv (csv.DictReader)", _csv, repeat)
+        _timed("parse_tsv (SQLite sidecar)", _sqlite, repeat)
+        _timed("lookup one note_id (SQLite sidecar)", _lookup, repeat)
+
+    same = results["csv"] == results["sqlite"]
+    print(f"  identical rows: {same}")
+    return 0 if same else 1
+
+
+def bench_anki_client(requests: int, repeat: int) -> None:
+    """Per-request overhead: urllib (new connection per call) vs pooled keep-alive client."""
+    import json
+    import urllib.request
+
+    from tools.anki.anki_client import AnkiConnectClient
+    from tools.anki.mock_anki_connect import MockAnkiConnect
+
+    mock = MockAnkiConnect()
+    url = mock.start()
+    payload = json.dumps({"action": "version", "version": 6, "params": {}}).encode("utf-8")
+    print(f"anki-client: {requests} `version` requests against a local stand-in server")
+
+    def _urllib() -> None:
+        # The pre-client anki_request(): one urlopen (new TCP connection) per call.
+        for _ in range(requests):
+            req = urllib.request.Request(url, data=payload, headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(req, timeout=15) as resp:
+                json.loads(resp.read().decode("utf-8"))
+
+    client = AnkiConnectClient(url)
+
+    def _pooled() -> None:
+        for _ in range(requests):
+            client.version()
+
+    try:
+        old = _timed("urllib.urlopen per request", _urllib, repeat)
+        new = _timed("AnkiConnectClient (keep-alive)", _pooled, repeat)
+    finally:
+        client.close()
+        mock.stop()
+    print(f"  per request: {old / requests * 1e6:.0f} us -> {new / requests * 1e6:.0f} us (connections opened: {client.connections})")
+
+
+def bench_noteid_map(entries: int, pairs: int, repeat: int) -> None:
+    import os
+    from itertools import count
+
+    from tools.anki.noteid_map import NoteIdMap
+
+    with tempfile.TemporaryDirectory() as td:
+        tsv = Path(td) / "map.tsv"
+        db = Path(td) / "map.sqlite"
+        with NoteIdMap(tsv) as m:
+            m.add_many((f"bench_note_{i:07d}", 1700000000000 + i) for i in range(entries))
+        with NoteIdMap(db) as m:
+            m.add_many(NoteIdMap(tsv).items())
+        print(f"noteid-map: {entries} entries ({os.path.getsize(tsv) / 1e6:.1f} MB TSV), {pairs} new pairs per write test")
+
+        serial = count()
+
+        def _new_pairs() -> list:
+            n = next(serial)
+            return [(f"new_{n}_{i}", 1800000000000 + i) for i in range(pairs)]
+
+        def _append_per_pair() -> None:
+            # Previous append_mapping(): open + append once per created note.
+            for nid, aid in _new_pairs():
+                with tsv.open("a", encoding="utf-8", newline="") as f:
+                    f.write(f"{nid}\t{aid}\n")
+
+        def _flush_per_pair(path: Path) -> Callable[[], None]:
+            def run() -> None:
+                with NoteIdMap(path) as m:
+                    for nid, aid in _new_pairs():
+                        m.add(nid, aid)
+                        m.flush()
+
+            return run
+
+        def _flush_once(path: Path) -> Callable[[], None]:
+            def run() -> None:
+                with NoteIdMap(path) as m:
+                    m.add_many(_new_pairs())
+
+            return run
+
+        _timed("load: TSV", lambda: NoteIdMap(tsv).as_dict(), repeat)
+        _timed("load: SQLite", lambda: NoteIdMap(db).close(), repeat)
+        _timed("TSV: plain append per pair (old)", _append_per_pair, repeat)
+        _timed("TSV: atomic flush per pair", _flush_per_pair(tsv), repeat)
+        _timed("TSV: buffered, one atomic flush", _flush_once(tsv), repeat)
+        _timed("SQLite: commit per pair", _flush_per_pair(db), repeat)
+        _timed("SQLite: buffered, one transaction", _flush_once(db), repeat)
+
+
+def bench_sync(rows: int, latency_ms: float, concurrency: int) -> int:
+    """End-to-end sync throughput against the local AnkiConnect stand-in (one timed run per mode)."""
+    import csv
+    import subprocess
+    import sys
+
+    from tools.anki.export.cnsf_to_import_tsv import TSV_BASE_HEADER, TsvSink
+    from tools.anki.mock_anki_connect import MockAnkiConnect
+
+    mock = MockAnkiConnect(latency=latency_ms / 1000)
+    url = mock.start()
+    print(f"sync: {rows} rows against a local AnkiConnect stand-in ({latency_ms:g} ms per request)")
+
+    with tempfile.TemporaryDirectory() as td:
+        tmp = Path(td)
+        header = TSV_BASE_HEADER + ["Source Document", "Verification Notes"]
+
+        def _tsv(name: str, extra_tag: str, edited: int = 0) -> Path:
+            (tmp / name).unlink(missing_ok=True)  # TsvSink refuses to overwrite
+            sink = TsvSink(tmp / name, header)
+            for i in range(rows):
+                row = _l3_row(i, extra_tag=extra_tag)
+                if i < edited:
+                    row["back_html"] += "<p>Edited.</p>"
+                sink.write(row)
+            sink.commit()
+            return tmp / name
+
+        map_path = tmp / "map.tsv"
+        steps = [
+            ("tsv_to_anki: create (canAddNotes/addNotes)", _tsv("v1.tsv", ""), ["--map-out", str(map_path)]),
+            ("tsv_to_anki: update, serial", _tsv("v2.tsv", "v2"), ["--map-in", str(map_path)]),
+            ("tsv_to_anki: update, --batch", _tsv("v3.tsv", "v3"), ["--map-in", str(map_path), "--batch"]),
+            (
+                f"tsv_to_anki: update, --concurrency {concurrency}",
+                _tsv("v4.tsv", "v4"),
+                ["--map-in", str(map_path), "--concurrency", str(concurrency), "--progress-interval", "0"],
+            ),
+            ("tsv_to_anki: --diff, nothing changed", tmp / "v4.tsv", ["--map-in", str(map_path), "--diff"]),
+        ]
+
+        def _run(label: str, cmd: list) -> bool:
+            before = mock.requests
+            t0 = time.perf_counter()
+            proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            dt = time.perf_counter() - t0
+            print(f"  {label:<48} {dt * 1000:9.1f} ms  {rows / dt:8.0f} rows/s  {mock.requests - before:6d} requests")
+            if proc.returncode != 0:
+                print(f"    FAILED (exit {proc.returncode}): {proc.stderr.strip()[-500:]}")
+            return proc.returncode == 0
+
+        ok = True
+        for label, tsv, extra in steps:
+            cmd = [sys.executable, "-m", "tools.anki.sync.tsv_to_anki", "--tsv", str(tsv), "--anki-url", url, "--no-journal"]
+            ok &= _run(label, cmd + extra)
+
+        # The usual edit: a dozen notes changed since the last sync of this TSV (ledger next to it).
+        edited = min(12, rows)
+        cmd = [sys.executable, "-m", "tools.anki.sync.tsv_to_anki", "--tsv", str(_tsv("v4.tsv", "v4", edited))]
+        cmd += ["--anki-url", url, "--no-journal", "--map-in", str(map_path), "--changed-only"]
+        ok &= _run(f"tsv_to_anki: --changed-only, {edited} notes edited", cmd)
+
+        # Deck-wide retag: tag deltas go out grouped by tag string, not per note.
+        retag = tmp / "v5.tsv"
+        text = (tmp / "v4.tsv").read_text(encoding="utf-8")
+        retag.write_text(text.replace("status:unverified", "status:verified"), encoding="utf-8")
+        cmd = [sys.executable, "-m", "tools.anki.sync.tsv_to_anki", "--tsv", str(retag), "--anki-url", url]
+        cmd += ["--no-journal", "--map-in", str(map_path), "--diff"]
+        ok &= _run("tsv_to_anki: --diff, deck-wide status retag", cmd)
+
+        # update_notes_from_tsv.py (answer field only) on the same notes.
+        with map_path.open(encoding="utf-8", newline="") as f:
+            mapping = [(r["note_id"], r["noteId"]) for r in csv.DictReader(f, delimiter="\t")]
+        upd = tmp / "import_html.tsv"
+        with upd.open("w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f, delimiter="\t", lineterminator="\n")
+            w.writerow(["note_id", "noteId", "prompt", "answer_html"])
+            for note_id, anki_id in mapping:
+                w.writerow([note_id, anki_id, "", f"<p>updated {note_id}</p>"])
+        script = Path(__file__).resolve().parent / "update_notes_from_tsv.py"
+        ok &= _run("update_notes_from_tsv.py", [sys.executable, str(script), "--in", str(upd), "--anki-url", url])
+
+    mock.stop()
+    return 0 if ok else 1
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="CNSF pipeline micro-benchmarks (synthetic corpora).")
+    ap.add_argument("--repeat", type=int, default=3, help="Best-of-N timing (default: 3)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_parse = sub.add_parser("parse-once", help="Export: parse each note once vs twice")
+    p_parse.add_argument("--notes", type=int, default=2000)
+
+    p_yaml = sub.add_parser("yaml", help="YAML: libyaml vs pure-Python backend (timing + byte-identity)")
+    p_yaml.add_argument("--notes", nargs="*", default=[], help="Real note files/dirs to include")
+    p_yaml.add_argument("--synthetic", type=int, default=2000, help="Synthetic notes to add (default: 2000)")
+
+    p_l3 = sub.add_parser("l3-load", help="L3 load: TSV vs SQLite sidecar (timing + identity)")
+    p_l3.add_argument("--rows", type=int, default=50000)
+
+    p_client = sub.add_parser("anki-client", help="AnkiConnect: urllib per call vs pooled keep-alive client")
+    p_client.add_argument("--requests", type=int, default=2000)
+
+    p_map = sub.add_parser("noteid-map", help="note_id->noteId map: load + append, TSV vs SQLite, per pair vs batched")
+    p_map.add_argument("--entries", type=int, default=20000)
+    p_map.add_argument("--pairs", type=int, default=200)
+
+    p_sync = sub.add_parser("sync", help="Sync tools end-to-end against the local AnkiConnect stand-in")
+    p_sync.add_argument("--rows", type=int, default=2000)
+    p_sync.add_argument("--latency-ms", type=float, default=1.0, help="Stand-in delay per request (default: 1)")
+    p_sync.add_argument("--concurrency", type=int, default=8)
+
+    args = ap.parse_args()
+
+    if args.cmd == "parse-once":
+        bench_parse_once(args.notes, args.repeat)
+    elif args.cmd == "yaml":
+        return bench_yaml(args.notes, args.synthetic, args.repeat)
+    elif args.cmd == "anki-client":
+        bench_anki_client(args.requests, args.repeat)
+    elif args.cmd == "l3-load":
+        return bench_l3_load(args.rows, args.repeat)
+    elif args.cmd == "noteid-map":
+        bench_noteid_map(args.entries, args.pairs, args.repeat)
+    elif args.cmd == "sync":
+        return bench_sync(args.rows, args.latency_ms, args.concurrency)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,14 +2,17 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import json
 import re
 import sys
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
-
-import yaml
+from typing import Any, Iterable
 
+from tools.anki import yaml_backend
+from tools.anki.cnsf_manifest import DEFAULT_MANIFEST_PATH, NoteManifest
+from tools.anki.render_cache import atomic_write
 
 CANON_TOP_KEYS = [
     "schema",
@@ -23,6 +26,23 @@ CANON_TOP_KEYS = [
 
 CANON_ANKI_KEYS = ["model", "deck"]
 
+DUMP_SETTINGS: dict[str, Any] = {
+    "sort_keys": False,
+    "allow_unicode": True,
+    "default_flow_style": False,
+    "width": 88,
+}
+
+# Bump when _normalize_meta()/canonicalize_meta() rules change; together with
+# the key orders and DUMP_SETTINGS this invalidates the canonical-hash cache.
+CANON_RULES_VERSION = 1
+
+DEFAULT_CANON_CACHE_PATH = Path(".cache") / "cnsf_canonical.json"
+
+# Keep at most this many known-canonical hashes; beyond it, keep only the
+# hashes seen in the current run.
+_CANON_CACHE_MAX = 100_000
+
 
 @dataclass(frozen=True)
 class SplitFM:
@@ -172,58 +192,220 @@ def canonicalize_meta(meta: dict[str, Any], path: Path) -> dict[str, Any]:
     return out
 
 
-def dump_yaml(meta: dict[str, Any]) -> str:
+def dump_yaml(meta: dict[str, Any], pure: bool = False) -> str:
     """
     Deterministic-ish YAML dump (order preserved, no sort_keys).
+    Uses libyaml when available (pure=True forces the Python emitter).
     """
-    return yaml.safe_dump(
-        meta,
-        sort_keys=False,
-        allow_unicode=True,
-        default_flow_style=False,
-        width=88,
-    ).strip("\n")
+    return yaml_backend.safe_dump(meta, pure=pure, **DUMP_SETTINGS).strip("\n")
+
 
+def canon_fingerprint() -> str:
+    """Identifies the canonical form; any change invalidates CanonCache."""
+    spec = {
+        "rules": CANON_RULES_VERSION,
+        "top": CANON_TOP_KEYS,
+        "anki": CANON_ANKI_KEYS,
+        "dump": DUMP_SETTINGS,
+        "pyyaml": getattr(yaml_backend.yaml, "__version__", ""),
+        # libyaml and the pure-Python emitter are not guaranteed byte-identical.
+        "backend": yaml_backend.backend_name(),
+        "with_libyaml": bool(getattr(yaml_backend.yaml, "__with_libyaml__", False)),
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CanonCache:
+    """
+    Set of content hashes already known to be canonical, so --check can skip
+    files whose bytes did not change. Stored as JSON next to the manifest.
+    """
 
-def canonicalized_file_text(path: Path) -> tuple[str, dict[str, Any]]:
-    text = path.read_text(encoding="utf-8")
+    def __init__(self, path: str | Path = DEFAULT_CANON_CACHE_PATH) -> None:
+        self.path = Path(path)
+        self.fingerprint = canon_fingerprint()
+        self.known: set[str] = self._read()
+        self.seen: set[str] = set()
+        self.skipped = 0
+
+    def _read(self) -> set[str]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return set()
+        if not isinstance(data, dict) or data.get("fingerprint") != self.fingerprint:
+            return set()
+        return set(data.get("hashes") or [])
+
+    def add(self, digests: Iterable[str]) -> None:
+        for d in digests:
+            self.known.add(d)
+            self.seen.add(d)
+
+    def save(self) -> None:
+        if not self.seen:
+            return
+        merged = self._read() | self.known
+        if len(merged) > _CANON_CACHE_MAX:
+            merged = set(self.seen)
+        payload = json.dumps({"fingerprint": self.fingerprint, "hashes": sorted(merged)})
+        atomic_write(self.path, payload)
+
+
+def _load_meta(path: Path, text: str, fm: SplitFM, manifest: NoteManifest | None) -> Any:
+    if manifest is not None:
+        try:
+            return manifest.load(path, text=text).meta
+        except ValueError:
+            # Not a fully valid CNSF note (e.g. missing sections); parse YAML directly.
+            pass
+    return yaml_backend.safe_load(fm.yaml_text) or {}
+
+
+def canonicalize_text(text: str, path: Path, manifest: NoteManifest | None = None) -> tuple[str, dict[str, Any]]:
     fm = split_frontmatter(text, path)
-    meta = yaml.safe_load(fm.yaml_text) or {}
+    meta = _load_meta(path, text, fm, manifest)
     meta_c = canonicalize_meta(meta, path)
     y = dump_yaml(meta_c)
     new_text = f"---\n{y}\n---\n\n{fm.body_text}"
     return new_text, meta_c
 
 
-def cmd_check(paths: list[Path]) -> int:
+def canonicalized_file_text(path: Path, manifest: NoteManifest | None = None) -> tuple[str, dict[str, Any]]:
+    return canonicalize_text(path.read_text(encoding="utf-8"), path, manifest)
+
+
+@dataclass(frozen=True)
+class FileResult:
+    path: Path
+    status: str  # "ok" | "fixed" | "order_drift" | "drift" | "error"
+    message: str = ""
+    # sha256 of the (resulting) canonical text, for CanonCache
+    digest: str = ""
+    cached: bool = False
+
+
+def process_file(
+    path: Path,
+    write: bool,
+    manifest: NoteManifest | None = None,
+    known: frozenset[str] | set[str] = frozenset(),
+) -> FileResult:
+    """Check (or rewrite) one file, reading it exactly once."""
+    try:
+        old_text = path.read_text(encoding="utf-8")
+        digest = _text_digest(old_text)
+        if digest in known:
+            return FileResult(path, "ok", digest=digest, cached=True)
+        new_text, _ = canonicalize_text(old_text, path, manifest)
+        if new_text == old_text:
+            return FileResult(path, "ok", digest=digest)
+        if write:
+            path.write_text(new_text, encoding="utf-8")
+            return FileResult(path, "fixed", digest=_text_digest(new_text))
+        # specifically detect “order drift” at top-level
+        fm = split_frontmatter(old_text, path)
+        old_order = _top_level_key_order(fm.yaml_text)
+        if old_order != [k for k in CANON_TOP_KEYS if k in old_order]:
+            return FileResult(path, "order_drift")
+        return FileResult(path, "drift")
+    except (ValueError, OSError, UnicodeDecodeError, yaml_backend.YAMLError) as e:
+        return FileResult(path, "error", str(e))
+
+
+def _process_chunk(
+    paths: list[Path],
+    write: bool,
+    manifest_path: str | None,
+    known: frozenset[str],
+) -> list[FileResult]:
+    # Runs in a worker process: each worker keeps its own manifest and merges
+    # it back on save (NoteManifest.save is safe for concurrent writers).
+    manifest = NoteManifest(manifest_path) if manifest_path else None
+    out = [process_file(p, write, manifest, known) for p in paths]
+    if manifest:
+        manifest.save()
+    return out
+
+
+def process_files(
+    paths: list[Path],
+    write: bool,
+    manifest: NoteManifest | None = None,
+    jobs: int = 1,
+    cache: CanonCache | None = None,
+) -> list[FileResult]:
+    """Results are always returned in the order of `paths`."""
+    results = _process_files(paths, write, manifest, jobs, frozenset(cache.known) if cache else frozenset())
+    if cache is not None:
+        cache.skipped += sum(1 for r in results if r.cached)
+        cache.add(r.digest for r in results if r.status in ("ok", "fixed"))
+    return results
+
+
+def _process_files(
+    paths: list[Path],
+    write: bool,
+    manifest: NoteManifest | None,
+    jobs: int,
+    known: frozenset[str],
+) -> list[FileResult]:
+    if jobs <= 1 or len(paths) < 2:
+        return [process_file(p, write, manifest, known) for p in paths]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    size = max(1, -(-len(paths) // (jobs * 4)))
+    chunks = [paths[i : i + size] for i in range(0, len(paths), size)]
+    manifest_path = str(manifest.path) if manifest else None
+    results: list[FileResult] = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        n = len(chunks)
+        for chunk_results in pool.map(_process_chunk, chunks, [write] * n, [manifest_path] * n, [known] * n):
+            results.extend(chunk_results)
+    return results
+
+
+def cmd_check(
+    paths: list[Path],
+    manifest: NoteManifest | None = None,
+    jobs: int = 1,
+    cache: CanonCache | None = None,
+) -> int:
     bad = 0
-    for p in paths:
-        new_text, _ = canonicalized_file_text(p)
-        old_text = p.read_text(encoding="utf-8")
-        if new_text != old_text:
-            # specifically detect “order drift” at top-level
-            fm = split_frontmatter(old_text, p)
-            old_order = _top_level_key_order(fm.yaml_text)
-            if old_order != [k for k in CANON_TOP_KEYS if k in old_order]:
-                print(f"FAIL (YAML order drift): {p}")
-            else:
-                print(f"FAIL (canonicalization drift): {p}")
-            bad += 1
+    for r in process_files(paths, write=False, manifest=manifest, jobs=jobs, cache=cache):
+        if r.status == "ok":
+            continue
+        if r.status == "order_drift":
+            print(f"FAIL (YAML order drift): {r.path}")
+        elif r.status == "drift":
+            print(f"FAIL (canonicalization drift): {r.path}")
+        else:
+            print(f"FAIL (error): {r.message}")
+        bad += 1
     return 1 if bad else 0
 
 
-def cmd_write(paths: list[Path]) -> int:
-    changed = 0
-    for p in paths:
-        new_text, _ = canonicalized_file_text(p)
-        old_text = p.read_text(encoding="utf-8")
-        if new_text != old_text:
-            p.write_text(new_text, encoding="utf-8")
-            print(f"FIXED: {p}")
-            changed += 1
+def cmd_write(
+    paths: list[Path],
+    manifest: NoteManifest | None = None,
+    jobs: int = 1,
+    cache: CanonCache | None = None,
+) -> int:
+    errors = 0
+    for r in process_files(paths, write=True, manifest=manifest, jobs=jobs, cache=cache):
+        if r.status == "fixed":
+            print(f"FIXED: {r.path}")
+        elif r.status == "error":
+            print(f"FAIL (error): {r.message}")
+            errors += 1
         else:
-            print(f"OK: {p}")
-    return 0
+            print(f"OK: {r.path}")
+    return 1 if errors else 0
 
 
 def main() -> None:
@@ -231,6 +413,11 @@ def main() -> None:
     ap.add_argument("paths", nargs="+", help="One or more CNSF .md note files")
     ap.add_argument("--check", action="store_true", help="Fail if any file would change")
     ap.add_argument("--write", action="store_true", help="Rewrite files in-place")
+    ap.add_argument("--manifest", default=str(DEFAULT_MANIFEST_PATH), help="Parsed-note manifest (default: %(default)s)")
+    ap.add_argument("--no-manifest", action="store_true", help="Always parse YAML (ignore the manifest)")
+    ap.add_argument("--jobs", type=int, default=1, help="Process files on N worker processes (default: 1)")
+    ap.add_argument("--cache", default=str(DEFAULT_CANON_CACHE_PATH), help="Known-canonical hash cache (default: %(default)s)")
+    ap.add_argument("--no-cache", action="store_true", help="Re-canonicalize every file (ignore the hash cache)")
     args = ap.parse_args()
 
     if args.check == args.write:
@@ -241,7 +428,16 @@ def main() -> None:
         if not p.exists():
             raise SystemExit(f"Not found: {p}")
 
-    rc = cmd_check(paths) if args.check else cmd_write(paths)
+    manifest = None if args.no_manifest else NoteManifest(args.manifest)
+    cache = None if args.no_cache else CanonCache(args.cache)
+    if args.check:
+        rc = cmd_check(paths, manifest, jobs=args.jobs, cache=cache)
+    else:
+        rc = cmd_write(paths, manifest, jobs=args.jobs, cache=cache)
+    if manifest:
+        manifest.save()
+    if cache:
+        cache.save()
     raise SystemExit(rc)
 
 
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Persistent parsed-note manifest on top of tools/anki/cnsf_parse.py.
+
+For every successfully parsed note we store:
+- path (resolved), file stat (size, mtime_ns), size and sha256 of the text
+- parsed meta (as JSON) and the front/back section offsets
+
+A later load stats the file: if (size, mtime_ns) are unchanged, the stored
+parse is used without hashing. Otherwise the text is hashed, and if size
+and hash still match (e.g. the file was only touched) the stored parse is
+used and its stat refreshed. Either way the CNSFNote is rebuilt from the
+stored meta + offsets instead of running YAML. Files modified within the
+last RACY_NS of being recorded get no stat (a same-size edit in the same
+mtime tick would look unchanged), so they are always hashed. Any change to
+cnsf_parse.PARSER_VERSION discards the whole manifest.
+
+Concurrency:
+- the manifest is replaced atomically (temp file + os.replace), so
+  concurrent readers always see a complete file;
+- save() re-reads the file and merges before writing, so concurrent
+  writers only ever lose cache entries, never correctness.
+
+Default location: .cache/cnsf_manifest.json (relative to the working dir).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from tools.anki.cnsf_parse import PARSER_VERSION, CNSFNote, _section_text, parse_cnsf_text
+from tools.anki.render_cache import atomic_write
+
+DEFAULT_MANIFEST_PATH = Path(".cache") / "cnsf_manifest.json"
+
+# A file whose mtime is this close to "now" may still change within the same mtime tick.
+RACY_NS = 2_000_000_000
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _json_roundtrips(meta: dict[str, Any]) -> str | None:
+    """Return meta as JSON if it survives a JSON round-trip unchanged (e.g. no YAML dates)."""
+    try:
+        s = json.dumps(meta, ensure_ascii=False, sort_keys=False)
+    except (TypeError, ValueError):
+        return None
+    return s if json.loads(s) == meta else None
+
+
+def _stat_stamp(st: os.stat_result) -> list[int] | None:
+    """[size, mtime_ns] for the fast path, or None if the file was modified too recently to trust it."""
+    if time.time_ns() - st.st_mtime_ns < RACY_NS:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class NoteManifest:
+    def __init__(self, path: str | Path = DEFAULT_MANIFEST_PATH) -> None:
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, Any]] = self._read()
+        self._dirty: dict[str, dict[str, Any] | None] = {}
+
+    def _read(self) -> dict[str, dict[str, Any]]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("parser_version") != PARSER_VERSION:
+            return {}
+        entries = data.get("entries")
+        return entries if isinstance(entries, dict) else {}
+
+    def load(self, path: str | Path, text: str | None = None) -> CNSFNote:
+        """Parse `path` (or reuse the cached parse). Pass `text` if already read."""
+        p = Path(path)
+        key = str(p.resolve())
+        # Stat before reading, so the recorded stat is never newer than the text. (If the
+        # caller read `text` earlier, a change since then is recent, so stamp is None.)
+        stamp = _stat_stamp(p.stat())
+        digest = ""
+        if text is None:
+            text = p.read_text(encoding="utf-8")
+
+        with self._lock:
+            ent = self._entries.get(key)
+        hit = ent is not None and stamp is not None and ent.get("stat") == stamp
+        if ent and not hit:
+            digest = _sha256(text)
+            hit = ent.get("size") == len(text.encode("utf-8")) and ent.get("sha256") == digest
+            if hit and ent.get("stat") != stamp:
+                ent = dict(ent, stat=stamp)
+                with self._lock:
+                    self._entries[key] = ent
+                    self._dirty[key] = ent
+        if ent and hit:
+            # meta is decoded fresh on every load, so callers may mutate it.
+            meta = json.loads(ent["meta"])
+            front, back = tuple(ent["front"]), tuple(ent["back"])
+            with self._lock:
+                self.hits += 1
+            return CNSFNote(
+                path=p,
+                meta=meta,
+                front_md=_section_text(text, front),  # type: ignore[arg-type]
+                back_md=_section_text(text, back),  # type: ignore[arg-type]
+            )
+
+        note, front, back = parse_cnsf_text(text, p)
+        meta_json = _json_roundtrips(note.meta)
+        new_ent = None
+        if meta_json is not None:
+            new_ent = {
+                "stat": stamp,
+                "size": len(text.encode("utf-8")),
+                "sha256": digest or _sha256(text),
+                "meta": meta_json,
+                "front": list(front),
+                "back": list(back),
+            }
+        with self._lock:
+            self.misses += 1
+            if new_ent is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = new_ent
+            self._dirty[key] = new_ent
+        return note
+
+    def save(self) -> None:
+        """Merge our changes into the on-disk manifest and replace it atomically."""
+        with self._lock:
+            if not self._dirty:
+                return
+            merged = self._read()
+            for k, v in self._dirty.items():
+                if v is None:
+                    merged.pop(k, None)
+                else:
+                    merged[k] = v
+            # Drop entries for files that no longer exist.
+            merged = {k: v for k, v in merged.items() if os.path.exists(k)}
+            payload = json.dumps({"parser_version": PARSER_VERSION, "entries": merged}, ensure_ascii=False)
+
+            atomic_write(self.path, payload)
+            self._entries = merged
+            self._dirty = {}
+
+    def stats(self) -> str:
+        return f"hits={self.hits} misses={self.misses}"
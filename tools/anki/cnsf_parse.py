@@ -9,14 +9,20 @@ Returns:
 - meta: dict
 - front_md: str
 - back_md: str
+
+iter_cnsf_notes() streams a whole corpus (files, dirs or globs), keeps
+going past broken files and reports them through an on_error callback
+(e.g. ErrorCollector).
 """
 
 from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Generator, Iterable, Iterator
 
+import glob
+import os
 import re
 
 try:
@@ -26,6 +32,12 @@ except Exception as e:  # pragma: no cover
         "Missing dependency: PyYAML. Install with: pip install pyyaml"
     ) from e
 
+from tools.anki import yaml_backend
+
+
+# Bump whenever parsing/validation changes; invalidates the parsed-note
+# manifest (tools/anki/cnsf_manifest.py).
+PARSER_VERSION = "cnsf_parse/1"
 
 _FRONT_RE = re.compile(r"(?mi)^\s*#\s*front_md\s*$")
 _BACK_RE = re.compile(r"(?mi)^\s*#\s*back_md\s*$")
@@ -40,6 +52,12 @@ class CNSFNote:
 
 
 def _split_frontmatter(text: str, path: Path) -> tuple[dict[str, Any], str]:
+    meta, body_start = _parse_frontmatter(text, path)
+    return meta, text[body_start:]
+
+
+def _parse_frontmatter(text: str, path: Path) -> tuple[dict[str, Any], int]:
+    """Returns (meta, offset of the body in text)."""
     if not text.lstrip().startswith("---"):
         raise ValueError(f"{path}: missing YAML front matter (expected starting '---').")
 
@@ -48,14 +66,15 @@ def _split_frontmatter(text: str, path: Path) -> tuple[dict[str, Any], str]:
     if not m:
         raise ValueError(f"{path}: malformed YAML front matter block.")
 
-    yml, rest = m.group(1), m.group(2)
-    meta = yaml.safe_load(yml) or {}
+    yml = m.group(1)
+    meta = yaml_backend.safe_load(yml) or {}
     if not isinstance(meta, dict):
         raise ValueError(f"{path}: YAML front matter must be a mapping/object.")
-    return meta, rest
+    return meta, m.start(2)
 
 
-def _split_sections(body: str, path: Path) -> tuple[str, str]:
+def _section_spans(body: str, path: Path) -> tuple[tuple[int, int], tuple[int, int]]:
+    """Returns ((front_start, front_end), (back_start, back_end)) offsets into body."""
     m_front = _FRONT_RE.search(body)
     m_back = _BACK_RE.search(body)
 
@@ -64,26 +83,41 @@ def _split_sections(body: str, path: Path) -> tuple[str, str]:
     if m_back.start() < m_front.start():
         raise ValueError(f"{path}: '# back_md' must come after '# front_md'.")
 
-    front_start = m_front.end()
-    back_start = m_back.end()
-
-    front_md = body[front_start:m_back.start()].strip("\n")
-    back_md = body[back_start:].strip("\n")
+    front = (m_front.end(), m_back.start())
+    back = (m_back.end(), len(body))
 
-    if not front_md.strip():
+    if not body[front[0] : front[1]].strip():
         raise ValueError(f"{path}: front_md section is empty.")
-    if not back_md.strip():
+    if not body[back[0] : back[1]].strip():
         raise ValueError(f"{path}: back_md section is empty.")
 
-    return front_md.strip() + "\n", back_md.strip() + "\n"
+    return front, back
 
 
-def load_cnsf_note(path: str | Path) -> CNSFNote:
-    p = Path(path)
-    text = p.read_text(encoding="utf-8")
-    meta, body = _split_frontmatter(text, p)
-    front_md, back_md = _split_sections(body, p)
+def _section_text(text: str, span: tuple[int, int]) -> str:
+    return text[span[0] : span[1]].strip("\n").strip() + "\n"
+
 
+def _split_sections(body: str, path: Path) -> tuple[str, str]:
+    front, back = _section_spans(body, path)
+    return _section_text(body, front), _section_text(body, back)
+
+
+def parse_cnsf_text(text: str, path: Path) -> tuple[CNSFNote, tuple[int, int], tuple[int, int]]:
+    """
+    Parse and validate note text. Also returns the front/back section spans
+    as absolute offsets into `text` (used by the parsed-note manifest).
+    """
+    meta, body_start = _parse_frontmatter(text, path)
+    front, back = _section_spans(text[body_start:], path)
+    front = (body_start + front[0], body_start + front[1])
+    back = (body_start + back[0], body_start + back[1])
+    _validate_meta(meta, path)
+    note = CNSFNote(path=path, meta=meta, front_md=_section_text(text, front), back_md=_section_text(text, back))
+    return note, front, back
+
+
+def _validate_meta(meta: dict[str, Any], p: Path) -> None:
     # Minimum required keys (schema-level)
     schema = (meta.get("schema") or "").strip()
     if schema != "cnsf/v0":
@@ -95,16 +129,135 @@ def load_cnsf_note(path: str | Path) -> CNSFNote:
     if "-" in note_id:
         raise ValueError(f"{p}: note_id must use underscores only (no hyphens): {note_id!r}")
 
-    return CNSFNote(path=p, meta=meta, front_md=front_md, back_md=back_md)
+
+
+def load_cnsf_note(path: str | Path, manifest: Any = None, text: str | None = None) -> CNSFNote:
+    """
+    Parse a CNSF note. With a NoteManifest (tools/anki/cnsf_manifest.py),
+    unchanged files are served from the manifest instead of YAML.
+    Pass `text` if the file has already been read.
+    """
+    p = Path(path)
+    if manifest is not None:
+        return manifest.load(p, text=text)
+    if text is None:
+        text = p.read_text(encoding="utf-8")
+    note, _, _ = parse_cnsf_text(text, p)
+    return note
+
+
+@dataclass(frozen=True)
+class NoteError:
+    path: Path
+    message: str
+
+
+class ErrorCollector:
+    """on_error callback for iter_cnsf_notes() that records every failure."""
+
+    def __init__(self) -> None:
+        self.errors: list[NoteError] = []
+
+    def __call__(self, path: Path, exc: Exception) -> None:
+        self.errors.append(NoteError(path=path, message=str(exc)))
+
+
+def _walk_md(root: Path) -> Iterator[Path]:
+    # Same order as sorted(root.glob("**/*.md")), without materializing the list.
+    try:
+        entries = sorted(os.scandir(root), key=lambda e: e.name)
+    except NotADirectoryError:
+        return
+    for e in entries:
+        if e.is_dir():
+            yield from _walk_md(Path(e.path))
+        elif e.name.endswith(".md") and e.is_file():
+            yield Path(e.path)
+
+
+def iter_note_paths(roots: Iterable[str | Path]) -> Iterator[Path]:
+    """
+    Lazily expand directories (recursive *.md), glob patterns and files,
+    de-duplicated by resolved path, in the same order as the export's
+    expand_inputs().
+    """
+    seen: set[str] = set()
+    for root in roots:
+        p = Path(root)
+        if p.is_dir():
+            it: Iterable[Path] = _walk_md(p)
+        else:
+            matches = glob.glob(str(root), recursive=True)
+            if matches:
+                it = sorted(Path(x) for x in matches)
+            elif p.suffix == ".md" and p.exists():
+                it = [p]
+            else:
+                it = []
+        for x in it:
+            rp = str(x.resolve())
+            if rp not in seen:
+                seen.add(rp)
+                yield x
+
+
+def iter_cnsf_notes(
+    roots: Iterable[str | Path],
+    on_error: Callable[[Path, Exception], None] | None = None,
+    manifest: Any = None,
+) -> Generator[CNSFNote, None, list[NoteError]]:
+    """
+    Yield parsed notes one at a time.
+
+    With on_error=None the first bad file raises (like load_cnsf_note).
+    Otherwise on_error(path, exc) is called for each bad file and iteration
+    continues. The generator's return value (for `yield from`) is the list
+    of errors collected along the way.
+    """
+    errors: list[NoteError] = []
+    for p in iter_note_paths(roots):
+        try:
+            note = load_cnsf_note(p, manifest=manifest)
+        except (ValueError, OSError, UnicodeDecodeError, yaml.YAMLError) as e:
+            if on_error is None:
+                raise
+            errors.append(NoteError(path=p, message=str(e)))
+            on_error(p, e)
+            continue
+        yield note
+    return errors
 
 
 def main() -> None:
     import argparse
-    ap = argparse.ArgumentParser(description="Parse a CNSF note and print basic info.")
-    ap.add_argument("path", help="Path to CNSF note markdown file")
+    ap = argparse.ArgumentParser(
+        description="Parse a CNSF note and print basic info; with several paths or a directory, validate them all."
+    )
+    ap.add_argument("paths", nargs="+", help="CNSF note markdown file(s), directories or globs")
+    ap.add_argument("--manifest", default="", help="Optional parsed-note manifest to read/update")
     args = ap.parse_args()
 
-    note = load_cnsf_note(args.path)
+    manifest = None
+    if args.manifest:
+        from tools.anki.cnsf_manifest import NoteManifest
+
+        manifest = NoteManifest(args.manifest)
+
+    if len(args.paths) > 1 or Path(args.paths[0]).is_dir():
+        collect = ErrorCollector()
+        count = 0
+        for _ in iter_cnsf_notes(args.paths, on_error=collect, manifest=manifest):
+            count += 1
+        if manifest:
+            manifest.save()
+        for err in collect.errors:
+            print(f"FAIL: {err.message}")
+        print(f"Parsed: {count} ok, {len(collect.errors)} failed")
+        raise SystemExit(1 if collect.errors else 0)
+
+    note = load_cnsf_note(args.paths[0], manifest=manifest)
+    if manifest:
+        manifest.save()
     print(f"OK: {note.path}")
     print(f"note_id: {note.meta.get('note_id')}")
     print(f"anki.model: {((note.meta.get('anki') or {}).get('model') if isinstance(note.meta.get('anki'), dict) else None)}")
@@ -7,14 +7,24 @@ from __future__ import annotations
 
 import argparse
 import csv
-import glob
+import hashlib
+import json
+import os
 import sys
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Tuple
 
-from tools.anki.cnsf_parse import load_cnsf_note
-from tools.anki.md_to_html_mmd import render_cnsf_note_to_html
+from tools.anki.cnsf_manifest import DEFAULT_MANIFEST_PATH, NoteManifest
+from tools.anki.cnsf_parse import CNSFNote, iter_note_paths, load_cnsf_note
+from tools.anki.md_to_html_mmd import ENGINES, render_cnsf_note_to_html, render_cnsf_notes_to_html, renderer_identity
+from tools.anki.noteid_map import read_noteid_map
+from tools.anki.render_cache import DEFAULT_MAX_BYTES, RenderCache, atomic_write, default_cache_dir, staging_path
+from tools.anki import tsv_sidecar
 
 
 def eprint(*args: Any) -> None:
@@ -49,19 +59,31 @@ def _require(val: str | None, label: str, path: Path) -> str:
 @dataclass
 class CnsfEnvelope:
     path: Path
+    domain: str
     note_id: str
     noteId: str
     model: str
     deck: str
     tags: List[str]
     fields: Dict[str, str]
-
-
-def load_envelope(path: Path, noteid_map: Dict[str, str] | None) -> CnsfEnvelope:
-    note = load_cnsf_note(str(path))
+    # Parsed L1 note, kept so rendering doesn't re-read/re-parse the file.
+    note: CNSFNote
+    # sha256 of the L1 file text (for --incremental).
+    source_sha256: str = ""
+
+
+def load_envelope(
+    path: Path,
+    noteid_map: Dict[str, str] | None,
+    manifest: NoteManifest | None = None,
+) -> CnsfEnvelope:
+    text = path.read_text(encoding="utf-8")
+    note = load_cnsf_note(str(path), manifest=manifest, text=text)
     meta = note.meta
 
     note_id = _require(meta.get("note_id"), "note_id", path)
+    # Optional: only selects the render cache (see default_cache_dir).
+    domain = str(meta.get("domain") or "").strip()
 
     anki = meta.get("anki") or {}
     model = _require(anki.get("model"), "anki.model", path)
@@ -78,87 +100,450 @@ def load_envelope(path: Path, noteid_map: Dict[str, str] | None) -> CnsfEnvelope
 
     return CnsfEnvelope(
         path=path,
+        domain=domain,
         note_id=note_id,
         noteId=noteId,
         model=model,
         deck=deck,
         tags=tags,
         fields=fields_str,
+        note=note,
+        source_sha256=hashlib.sha256(text.encode("utf-8")).hexdigest(),
     )
 
 
-def read_noteid_map(map_path: Path) -> Dict[str, str]:
-    m: Dict[str, str] = {}
-    if not map_path.exists():
-        return m
-    with map_path.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f, delimiter="\t")
-        for row in reader:
-            nid = (row.get("note_id") or "").strip()
-            aid = (row.get("noteId") or "").strip()
-            if nid and aid:
-                m[nid] = aid
-    return m
-
-
 def expand_inputs(inputs: List[str]) -> List[Path]:
-    out: List[Path] = []
-    for inp in inputs:
-        p = Path(inp)
-        if p.is_dir():
-            out.extend(sorted(p.glob("**/*.md")))
-        else:
-            matches = glob.glob(inp, recursive=True)
-            if matches:
-                out.extend(sorted(Path(x) for x in matches))
-            elif p.suffix == ".md" and p.exists():
-                out.append(p)
+    return list(iter_note_paths(inputs))
+
+
+class DomainRenderCaches:
+    """One RenderCache per domain (domains/<domain>/anki/generated/.cache by default)."""
+
+    def __init__(self, root: Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._caches: Dict[str, RenderCache] = {}
+
+    def for_domain(self, domain: str) -> RenderCache:
+        if domain not in self._caches:
+            base = self.root / domain if self.root else default_cache_dir(domain)
+            self._caches[domain] = RenderCache(base, max_bytes=self.max_bytes)
+        return self._caches[domain]
+
+    def stats(self) -> str:
+        hits = sum(c.hits for c in self._caches.values())
+        misses = sum(c.misses for c in self._caches.values())
+        evictions = sum(c.evictions for c in self._caches.values())
+        return f"hits={hits} misses={misses} evictions={evictions}"
+
+
+def _render_env(env: CnsfEnvelope, caches: DomainRenderCaches | None, engine: str = "multimarkdown") -> Dict[str, str]:
+    cache = caches.for_domain(env.domain) if caches else None
+    return render_cnsf_note_to_html(env.note, cache=cache, engine=engine)
+
+
+def _render_chunk(
+    envs: List[CnsfEnvelope],
+    caches: DomainRenderCaches | None,
+    verify: bool,
+    engine: str = "multimarkdown",
+) -> List[Tuple[Dict[str, str] | None, str]]:
+    """
+    Render a chunk of notes with one MultiMarkdown run per domain. If the batch
+    fails, fall back to per-note rendering so errors are attributed per note.
+    """
+    out: List[Tuple[Dict[str, str] | None, str]] = [(None, "")] * len(envs)
+    by_domain: Dict[str, List[int]] = {}
+    for i, env in enumerate(envs):
+        by_domain.setdefault(env.domain, []).append(i)
+    for domain, idxs in by_domain.items():
+        cache = caches.for_domain(domain) if caches else None
+        try:
+            rendered = render_cnsf_notes_to_html(
+                [envs[i].note for i in idxs], cache=cache, verify=verify, engine=engine
+            )
+        except Exception:
+            if verify or len(idxs) == 1:
+                raise
+            for i in idxs:
+                try:
+                    out[i] = (_render_env(envs[i], caches, engine), "")
+                except Exception as e:
+                    out[i] = (None, str(e))
+            continue
+        for i, r in zip(idxs, rendered):
+            out[i] = (r, "")
+    return out
+
+
+# Version of <out>.sources.json; the SQLite sidecar has its own, tsv_sidecar.SIDECAR_FORMAT.
+SOURCES_FORMAT = 1
+
+# note_id -> (source sha256, front_html cell, back_html cell) from a previous export
+ReusableRows = Dict[str, Tuple[str, str, str]]
+
+
+def sources_path(out_path: Path) -> Path:
+    return out_path.with_name(f"{out_path.name}.sources.json")
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_reusable_rows(out_path: Path, renderer: str) -> ReusableRows:
+    """
+    Read the previous TSV and its <out>.sources.json (per-note source hashes)
+    for --incremental. Returns {} if either is missing, the TSV was changed
+    since the sources file was written, or a different renderer or sources
+    format produced it.
+    """
+    try:
+        data = json.loads(sources_path(out_path).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("format") != SOURCES_FORMAT or data.get("renderer") != renderer:
+        return {}
+    if not out_path.exists() or data.get("tsv_sha256") != _file_sha256(out_path):
+        return {}
+    hashes = data.get("notes") or {}
+
+    out: ReusableRows = {}
     seen = set()
-    uniq = []
-    for p in out:
-        rp = str(p.resolve())
-        if rp not in seen:
-            uniq.append(p)
-            seen.add(rp)
-    return uniq
-
-
-def write_tsv(out_path: Path, notes: List[CnsfEnvelope], extra_field_names: List[str], overwrite: bool) -> None:
-    if out_path.exists() and not overwrite:
-        raise FileExistsError(f"Refusing to overwrite existing file: {out_path}")
-
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-
-    header = ["note_id", "noteId", "model", "deck", "tags", "front_html", "back_html"] + extra_field_names
-
-    with out_path.open("w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=header, delimiter="\t", quoting=csv.QUOTE_MINIMAL)
-        w.writeheader()
-
-        def _tsv_safe(v: str) -> str:
-            # Keep each TSV record to ONE physical line.
-            # HTML can contain newlines/tabs; escape them.
-            v = v.replace("\r\n", "\n").replace("\r", "\n")
-            v = v.replace("\t", "\\t").replace("\n", "\\n")
-            return v
-
-        for env in notes:
-            rendered = render_cnsf_note_to_html(str(env.path))
-            front_html = _tsv_safe(rendered["front_html"])
-            back_html  = _tsv_safe(rendered["back_html"])
-
-            row = {
-                "note_id": env.note_id,
-                "noteId": env.noteId,
-                "model": env.model,
-                "deck": env.deck,
-                "tags": " ".join(env.tags),
-                "front_html": front_html,
-                "back_html": back_html,
-            }
-            for k in extra_field_names:
-                row[k] = _tsv_safe(env.fields.get(k, "") or "")
-            w.writerow(row)
+    with out_path.open("r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            nid = row.get("note_id") or ""
+            if nid in seen:
+                # Duplicate note_id: can't tell the rows apart, re-render.
+                out.pop(nid, None)
+                continue
+            seen.add(nid)
+            if nid in hashes:
+                out[nid] = (str(hashes[nid]), row.get("front_html") or "", row.get("back_html") or "")
+    return out
+
+
+def write_sources(out_path: Path, renderer: str, notes: List[CnsfEnvelope]) -> None:
+    counts: Dict[str, int] = {}
+    for env in notes:
+        counts[env.note_id] = counts.get(env.note_id, 0) + 1
+    payload = {
+        "format": SOURCES_FORMAT,
+        "renderer": renderer,
+        "tsv_sha256": _file_sha256(out_path),
+        "notes": {env.note_id: env.source_sha256 for env in notes if counts[env.note_id] == 1},
+    }
+    atomic_write(sources_path(out_path), json.dumps(payload, sort_keys=True) + "\n")
+
+
+def reusable_html(env: CnsfEnvelope, reuse: ReusableRows | None) -> Dict[str, str] | None:
+    """
+    Previously rendered (already TSV-escaped) HTML for `env` if its L1 text is
+    unchanged. tsv_safe() is a no-op on escaped cells, so build_row() accepts it.
+    """
+    r = reuse.get(env.note_id) if reuse else None
+    if r is None or not env.source_sha256 or r[0] != env.source_sha256:
+        return None
+    return {"front_html": r[1], "back_html": r[2]}
+
+
+def _chunks(notes: Iterable[CnsfEnvelope], size: int) -> Iterator[List[CnsfEnvelope]]:
+    it = iter(notes)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_rendered(
+    notes: Iterable[CnsfEnvelope],
+    caches: DomainRenderCaches | None = None,
+    jobs: int = 1,
+    batch_size: int = 1,
+    verify_batch: bool = False,
+    engine: str = "multimarkdown",
+    reuse: ReusableRows | None = None,
+) -> Iterator[Tuple[CnsfEnvelope, Dict[str, str] | None, str]]:
+    """
+    Yield (env, rendered, error) in the same order as `notes`.
+
+    Notes are rendered in chunks of `batch_size` (one MultiMarkdown run per
+    chunk). With jobs > 1, chunks run on a thread pool (the work is
+    MultiMarkdown subprocesses, so threads are enough). At most jobs*4 chunks
+    are in flight, and a failure is reported for its note without cancelling
+    the others. `notes` is consumed lazily, so it may be a generator.
+
+    Notes found unchanged in `reuse` (see load_reusable_rows) are not rendered.
+    """
+    size = max(1, batch_size)
+
+    def _render(chunk: List[CnsfEnvelope]) -> List[Tuple[Dict[str, str] | None, str]]:
+        if not chunk:
+            return []
+        if len(chunk) == 1 and not verify_batch:
+            try:
+                return [(_render_env(chunk[0], caches, engine), "")]
+            except Exception as e:
+                return [(None, str(e))]
+        try:
+            return _render_chunk(chunk, caches, verify_batch, engine)
+        except Exception as e:
+            return [(None, str(e))] * len(chunk)
+
+    def _task(chunk: List[CnsfEnvelope]) -> List[Tuple[Dict[str, str] | None, str]]:
+        if not reuse:
+            return _render(chunk)
+        prebuilt = [reusable_html(env, reuse) for env in chunk]
+        rendered = iter(_render([env for env, pre in zip(chunk, prebuilt) if pre is None]))
+        return [(pre, "") if pre is not None else next(rendered) for pre in prebuilt]
+
+    if jobs <= 1:
+        for chunk in _chunks(notes, size):
+            for env, (rendered, err) in zip(chunk, _task(chunk)):
+                yield env, rendered, err
+        return
+
+    window = jobs * 4
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending: Deque[Tuple[List[CnsfEnvelope], Future[List[Tuple[Dict[str, str] | None, str]]]]] = deque()
+        it = _chunks(notes, size)
+        for chunk in it:
+            pending.append((chunk, pool.submit(_task, chunk)))
+            if len(pending) >= window:
+                break
+        while pending:
+            chunk, fut = pending.popleft()
+            for env, (rendered, err) in zip(chunk, fut.result()):
+                yield env, rendered, err
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(_task, nxt)))
+
+
+TSV_BASE_HEADER = ["note_id", "noteId", "model", "deck", "tags", "front_html", "back_html"]
+
+
+def tsv_safe(v: str) -> str:
+    # Keep each TSV record to ONE physical line.
+    # HTML can contain newlines/tabs; escape them.
+    v = v.replace("\r\n", "\n").replace("\r", "\n")
+    v = v.replace("\t", "\\t").replace("\n", "\\n")
+    return v
+
+
+def tsv_writer(f: Any, header: List[str]) -> "csv.DictWriter[str]":
+    return csv.DictWriter(f, fieldnames=header, delimiter="\t", quoting=csv.QUOTE_MINIMAL)
+
+
+def build_row(env: CnsfEnvelope, rendered: Dict[str, str], extra_field_names: List[str]) -> Dict[str, str]:
+    row = {
+        "note_id": env.note_id,
+        "noteId": env.noteId,
+        "model": env.model,
+        "deck": env.deck,
+        "tags": " ".join(env.tags),
+        "front_html": tsv_safe(rendered["front_html"]),
+        "back_html": tsv_safe(rendered["back_html"]),
+    }
+    for k in extra_field_names:
+        row[k] = tsv_safe(env.fields.get(k, "") or "")
+    return row
+
+
+def shard_path(out_path: Path, n: int) -> Path:
+    """Path of shard n (1-based): out.tsv -> out__shard0001.tsv."""
+    return out_path.with_name(f"{out_path.stem}__shard{n:04d}{out_path.suffix}")
+
+
+def output_paths(out_path: Path, rows: int, shard_size: int = 0) -> List[Path]:
+    if not shard_size:
+        return [out_path]
+    return [shard_path(out_path, n) for n in range(1, max(1, -(-rows // shard_size)) + 1)]
+
+
+class TsvSink:
+    """
+    Row writer for one TSV, or for numbered shards of `shard_size` rows each
+    (see shard_path; every shard repeats the header). Files are staged as temp
+    files and only replace their targets on commit(), so a failed export
+    leaves the existing output untouched. With sqlite=True each file also
+    gets a SQLite sidecar (tools/anki/tsv_sidecar.py).
+    """
+
+    def __init__(
+        self,
+        out_path: Path,
+        header: List[str],
+        shard_size: int = 0,
+        overwrite: bool = False,
+        sqlite: bool = False,
+    ) -> None:
+        first = shard_path(out_path, 1) if shard_size else out_path
+        if first.exists() and not overwrite:
+            raise FileExistsError(f"Refusing to overwrite existing file: {first}")
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        self.out_path = out_path
+        self.header = header
+        self.shard_size = shard_size
+        self.sqlite = sqlite
+        self.rows = 0
+        self._staged: List[Tuple[Path, Path]] = []
+        self._sidecars: List[tsv_sidecar.SidecarWriter] = []
+        self._f: Any = None
+        self._w: Any = None
+        self._in_file = 0
+
+    def _open(self) -> None:
+        self._close()
+        target = shard_path(self.out_path, len(self._staged) + 1) if self.shard_size else self.out_path
+        tmp = staging_path(target)
+        self._f = tmp.open("w", encoding="utf-8", newline="")
+        self._staged.append((tmp, target))
+        self._w = tsv_writer(self._f, self.header)
+        self._w.writeheader()
+        if self.sqlite:
+            self._sidecars.append(tsv_sidecar.SidecarWriter(target, self.header))
+        self._in_file = 0
+
+    def _close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def write(self, row: Dict[str, str]) -> None:
+        if self._f is None or (self.shard_size and self._in_file >= self.shard_size):
+            self._open()
+        self._w.writerow(row)
+        if self.sqlite:
+            self._sidecars[-1].add(row)
+        self._in_file += 1
+        self.rows += 1
+
+    def commit(self) -> List[Path]:
+        if not self._staged:
+            self._open()  # header-only output
+        self._close()
+        for tmp, target in self._staged:
+            os.replace(tmp, target)
+        for sc in self._sidecars:
+            sc.commit()
+        if self.shard_size:
+            # Drop leftover shards from a previous, larger export.
+            n = len(self._staged) + 1
+            while shard_path(self.out_path, n).exists():
+                shard_path(self.out_path, n).unlink()
+                stale = tsv_sidecar.sidecar_path(shard_path(self.out_path, n))
+                if stale.exists():
+                    stale.unlink()
+                n += 1
+        return [target for _, target in self._staged]
+
+    def abort(self) -> None:
+        self._close()
+        for sc in self._sidecars:
+            sc.abort()
+        for tmp, _ in self._staged:
+            try:
+                tmp.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def write_tsv(
+    out_path: Path,
+    notes: List[CnsfEnvelope],
+    extra_field_names: List[str],
+    overwrite: bool,
+    caches: DomainRenderCaches | None = None,
+    jobs: int = 1,
+    batch_size: int = 1,
+    verify_batch: bool = False,
+    engine: str = "multimarkdown",
+    reuse: ReusableRows | None = None,
+    shard_size: int = 0,
+    sqlite: bool = False,
+) -> List[Tuple[CnsfEnvelope, str]]:
+    """
+    Render and write all notes. Returns per-note render failures; if there are
+    any, the output file is left untouched (rows are staged in a temp file).
+
+    Notes found unchanged in `reuse` (see load_reusable_rows) are not rendered.
+    """
+    sink = TsvSink(out_path, TSV_BASE_HEADER + extra_field_names, shard_size, overwrite, sqlite)
+    failures: List[Tuple[CnsfEnvelope, str]] = []
+    try:
+        for env, rendered, err in iter_rendered(notes, caches, jobs, batch_size, verify_batch, engine, reuse):
+            if rendered is None:
+                failures.append((env, err))
+                continue
+            sink.write(build_row(env, rendered, extra_field_names))
+    except BaseException:
+        sink.abort()
+        raise
+
+    if failures:
+        sink.abort()
+    else:
+        sink.commit()
+    return failures
+
+
+def stream_tsv(
+    out_path: Path,
+    notes: Iterable[CnsfEnvelope],
+    overwrite: bool,
+    caches: DomainRenderCaches | None = None,
+    jobs: int = 1,
+    batch_size: int = 1,
+    verify_batch: bool = False,
+    engine: str = "multimarkdown",
+    shard_size: int = 0,
+    sqlite: bool = False,
+) -> Tuple[int, List[Tuple[CnsfEnvelope, str]]]:
+    """
+    Bounded-memory form of write_tsv() for a (lazy) iterable of notes.
+
+    Rows are written in input order (iter_note_paths order, i.e. sorted
+    paths) rather than sorted by note_id, so nothing has to be collected up
+    front. Rendered rows are spooled to a temp file as they are produced;
+    once the extra-field header is known the spool is copied into the TSV
+    (or shards). Memory is bounded by the render window (jobs*4 chunks).
+
+    Returns (rows, failures); on failures nothing is written.
+    """
+    failures: List[Tuple[CnsfEnvelope, str]] = []
+    extra: set[str] = set()
+    rows = 0
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+        for env, rendered, err in iter_rendered(notes, caches, jobs, batch_size, verify_batch, engine):
+            if rendered is None:
+                failures.append((env, err))
+                continue
+            extra.update(env.fields)
+            spool.write(json.dumps([build_row(env, rendered, []), env.fields], ensure_ascii=False) + "\n")
+            rows += 1
+        if failures:
+            return rows, failures
+
+        extra_field_names = sorted(extra)
+        sink = TsvSink(out_path, TSV_BASE_HEADER + extra_field_names, shard_size, overwrite, sqlite)
+        try:
+            spool.seek(0)
+            for line in spool:
+                row, fields = json.loads(line)
+                for k in extra_field_names:
+                    row[k] = tsv_safe(fields.get(k, "") or "")
+                sink.write(row)
+        except BaseException:
+            sink.abort()
+            raise
+        sink.commit()
+    return rows, failures
 
 
 def main() -> int:
@@ -168,29 +553,133 @@ def main() -> int:
     ap.add_argument("--map", default="")
     ap.add_argument("--overwrite", action="store_true")
     ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--no-render-cache", action="store_true", help="Always run MultiMarkdown (skip the L2 render cache)")
+    ap.add_argument("--render-cache-dir", default="", help="Override cache root (default: domains/<domain>/anki/generated/.cache)")
+    ap.add_argument("--render-cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024))
+    ap.add_argument("--jobs", type=int, default=1, help="Render notes on N worker threads (default: 1)")
+    ap.add_argument("--batch-size", type=int, default=1, help="Notes per MultiMarkdown run (default: 1 = one run per fragment; batching with >1 is opt-in, see --verify-batch)")
+    ap.add_argument("--verify-batch", action="store_true", help="Cross-check batched renders against per-fragment renders")
+    ap.add_argument("--engine", choices=ENGINES, default="multimarkdown", help="Renderer (default: multimarkdown; builtin = in-process)")
+    ap.add_argument("--manifest", default=str(DEFAULT_MANIFEST_PATH), help="Parsed-note manifest (default: %(default)s)")
+    ap.add_argument("--no-manifest", action="store_true", help="Always parse notes with YAML (ignore the manifest)")
+    ap.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse rows of unchanged notes from the previous --out (tracked in <out>.sources.json); implies --overwrite",
+    )
+    ap.add_argument(
+        "--stream",
+        action="store_true",
+        help="Bounded-memory export: rows in input path order (not sorted by note_id), written as they are rendered; implies --no-manifest",
+    )
+    ap.add_argument("--shard-size", type=int, default=0, help="Split output into <out>__shardNNNN.tsv files of N rows each")
+    ap.add_argument("--sqlite", action="store_true", help="Also write a SQLite sidecar (<out>.sqlite) that the sync tools load instead of the TSV")
     args = ap.parse_args()
 
-    paths = expand_inputs(args.inputs)
-    if not paths:
-        eprint("No input files found.")
-        return 2
+    if args.incremental and (args.stream or args.shard_size):
+        ap.error("--incremental cannot be combined with --stream or --shard-size")
 
     noteid_map = read_noteid_map(Path(args.map)) if args.map else None
 
-    envs = []
-    for p in paths:
-        envs.append(load_envelope(p, noteid_map))
-
-    if args.limit:
-        envs = envs[: args.limit]
-
-    envs.sort(key=lambda x: x.note_id)
-    extra_field_names = _stable_extra_field_names(envs)
-
-    write_tsv(Path(args.out), envs, extra_field_names, args.overwrite)
-
-    print(f"Rows: {len(envs)}")
-    print(f"Output: {args.out}")
+    # The manifest holds every note's metadata in memory, which --stream must not do.
+    manifest = None if args.no_manifest or args.stream else NoteManifest(args.manifest)
+
+    caches = None
+    # The cache only exists to skip MultiMarkdown subprocesses.
+    if not args.no_render_cache and args.engine != "builtin":
+        caches = DomainRenderCaches(
+            root=Path(args.render_cache_dir) if args.render_cache_dir else None,
+            max_bytes=args.render_cache_max_mb * 1024 * 1024,
+        )
+
+    out_path = Path(args.out)
+
+    if args.stream:
+        if next(iter_note_paths(args.inputs), None) is None:
+            eprint("No input files found.")
+            return 2
+        lazy_envs = (
+            load_envelope(p, noteid_map, manifest)
+            for p in islice(iter_note_paths(args.inputs), args.limit or None)
+        )
+        rows, failures = stream_tsv(
+            out_path,
+            lazy_envs,
+            args.overwrite,
+            caches,
+            jobs=args.jobs,
+            batch_size=args.batch_size,
+            verify_batch=args.verify_batch,
+            engine=args.engine,
+            shard_size=args.shard_size,
+            sqlite=args.sqlite,
+        )
+        if manifest:
+            manifest.save()
+    else:
+        paths = expand_inputs(args.inputs)
+        if not paths:
+            eprint("No input files found.")
+            return 2
+
+        envs = []
+        for p in paths:
+            envs.append(load_envelope(p, noteid_map, manifest))
+        if manifest:
+            manifest.save()
+
+        if args.limit:
+            envs = envs[: args.limit]
+
+        envs.sort(key=lambda x: x.note_id)
+        extra_field_names = _stable_extra_field_names(envs)
+
+        reuse = None
+        renderer = ""
+        if args.incremental:
+            try:
+                renderer = renderer_identity(args.engine)
+            except RuntimeError as e:
+                eprint(str(e))
+                return 2
+            reuse = load_reusable_rows(out_path, renderer)
+
+        failures = write_tsv(
+            out_path,
+            envs,
+            extra_field_names,
+            args.overwrite or args.incremental,
+            caches,
+            jobs=args.jobs,
+            batch_size=args.batch_size,
+            verify_batch=args.verify_batch,
+            engine=args.engine,
+            reuse=reuse,
+            shard_size=args.shard_size,
+            sqlite=args.sqlite,
+        )
+        rows = len(envs) - len(failures)
+
+    if failures:
+        for env, err in failures:
+            eprint(f"FAIL (render): {env.note_id} ({env.path}): {err}")
+        eprint(f"Render failed for {len(failures)} of {rows + len(failures)} notes; {args.out} not written.")
+        return 1
+
+    print(f"Rows: {rows}")
+    if args.incremental:
+        write_sources(out_path, renderer, envs)
+        reused = sum(1 for env in envs if reusable_html(env, reuse) is not None)
+        print(f"Incremental: reused={reused} rendered={len(envs) - reused}")
+    if manifest:
+        print(f"Manifest: {manifest.stats()}")
+    if caches:
+        print(f"Render cache: {caches.stats()}")
+    if args.shard_size:
+        shards = output_paths(out_path, rows, args.shard_size)
+        print(f"Output: {len(shards)} shards ({shards[0]} .. {shards[-1]})")
+    else:
+        print(f"Output: {args.out}")
     return 0
 
 
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Built-in (in-process) Markdown -> HTML renderer for the CNSF subset.
+
+No subprocess, no third-party dependency. Output follows MultiMarkdown 6
+formatting for what CNSF notes actually use:
+- ATX headings (# ...), paragraphs, hard breaks (two trailing spaces)
+- **bold** / __bold__, *italic* / _italic_, `code`, [links](url)
+- unordered (-, *, +) and ordered (1.) lists, nested by indentation; loose
+  lists (blank lines between/inside items) wrap item paragraphs in <p>
+- pipe tables with column alignment (:---, ---:, :---:)
+- fenced code blocks, horizontal rules, raw HTML blocks
+- MultiMarkdown "smart" typography (quotes, dashes, ellipsis)
+
+Anything outside that subset is rendered as plain paragraph text.
+
+Parity against MultiMarkdown (when the binary is present):
+    python -m tools.anki.md_builtin --parity domains/b737/anki/notes
+and in tests/anki/test_md_builtin.py (repo notes + fixtures).
+"""
+
+from __future__ import annotations
+
+import html
+import re
+from pathlib import Path
+
+# Bump when output changes, so cached renders are invalidated.
+RENDERER_VERSION = "cnsf-builtin-markdown v2"
+
+_ATX_RE = re.compile(r"^ {0,3}(#{1,6})[ \t]+(.*?)(?:[ \t]+#+)?[ \t]*$")
+_HR_RE = re.compile(r"^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+_FENCE_RE = re.compile(r"^ {0,3}(```|~~~)")
+_LIST_RE = re.compile(r"^([ \t]*)([-*+]|\d+\.)[ \t]+(.*)$")
+_TABLE_SEP_RE = re.compile(r"^[ \t]*\|?[ \t]*:?-+:?[ \t]*(\|[ \t]*:?-+:?[ \t]*)*\|?[ \t]*$")
+_HTML_BLOCK_RE = re.compile(r"^ {0,3}<(?:/?[A-Za-z][A-Za-z0-9-]*[\s/>]|!--)")
+
+_CODE_SPAN_RE = re.compile(r"(`+)(.+?)\1", re.S)
+_INLINE_TAG_RE = re.compile(r"</?[A-Za-z][A-Za-z0-9-]*(?:\s[^<>]*)?/?>|<!--.*?-->", re.S)
+_ENTITY_RE = re.compile(r"&(#\d+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);")
+_LINK_RE = re.compile(r"\[([^\]]+)\]\(([^)\s]+)(?:\s+\"([^\"]*)\")?\)")
+# Emphasis content must contain something other than markers (so "___"
+# blanks in fill-in tables stay literal).
+_STRONG_RE = re.compile(r"(\*\*|__)(?=[^\s*_])(.+?)(?<=[^\s*_])\1", re.S)
+_EM_STAR_RE = re.compile(r"\*(?=[^\s*])(.+?)(?<=[^\s*])\*", re.S)
+_EM_UNDER_RE = re.compile(r"(?<![A-Za-z0-9_])_(?=[^\s_])(.+?)(?<=[^\s_])_(?![A-Za-z0-9_])", re.S)
+
+_PH = "\x00{}\x00"
+_PH_RE = re.compile(r"\x00(\d+)\x00")
+
+
+# ----------------------------------------------------------------------------
+# Inline
+# ----------------------------------------------------------------------------
+
+
+def _escape_text(s: str) -> str:
+    # Escape &, <, > but keep existing entities intact.
+    parts = []
+    pos = 0
+    for m in _ENTITY_RE.finditer(s):
+        parts.append(html.escape(s[pos : m.start()], quote=False))
+        parts.append(m.group(0))
+        pos = m.end()
+    parts.append(html.escape(s[pos:], quote=False))
+    return "".join(parts)
+
+
+def _smart(s: str) -> str:
+    s = s.replace("---", "&#8212;").replace("--", "&#8211;").replace("...", "&#8230;")
+
+    def _quote(text: str, q: str, open_ent: str, close_ent: str) -> str:
+        out = []
+        for i, ch in enumerate(text):
+            if ch != q:
+                out.append(ch)
+                continue
+            prev = text[i - 1] if i else ""
+            if not prev or prev.isspace() or prev in "([{-\x00":
+                out.append(open_ent)
+            else:
+                out.append(close_ent)
+        return "".join(out)
+
+    s = _quote(s, '"', "&#8220;", "&#8221;")
+    s = _quote(s, "'", "&#8216;", "&#8217;")
+    return s
+
+
+def render_inline(text: str) -> str:
+    protected: list[str] = []
+
+    def _protect(v: str) -> str:
+        protected.append(v)
+        return _PH.format(len(protected) - 1)
+
+    text = _CODE_SPAN_RE.sub(lambda m: _protect(f"<code>{html.escape(m.group(2).strip(), quote=False)}</code>"), text)
+    text = _INLINE_TAG_RE.sub(lambda m: _protect(m.group(0)), text)
+
+    def _link(m: re.Match[str]) -> str:
+        title = f' title="{html.escape(m.group(3))}"' if m.group(3) else ""
+        return _protect(f'<a href="{html.escape(m.group(2))}"{title}>') + m.group(1) + _protect("</a>")
+
+    text = _LINK_RE.sub(_link, text)
+    text = _escape_text(text)
+    text = _STRONG_RE.sub(lambda m: _protect("<strong>") + m.group(2) + _protect("</strong>"), text)
+    text = _EM_STAR_RE.sub(lambda m: _protect("<em>") + m.group(1) + _protect("</em>"), text)
+    text = _EM_UNDER_RE.sub(lambda m: _protect("<em>") + m.group(1) + _protect("</em>"), text)
+    text = _smart(text)
+
+    # Placeholders can nest (e.g. a tag inside a link); expand until stable.
+    while _PH_RE.search(text):
+        text = _PH_RE.sub(lambda m: protected[int(m.group(1))], text)
+    return text
+
+
+def _render_lines(lines: list[str]) -> str:
+    out = []
+    for i, line in enumerate(lines):
+        hard = line.endswith("  ") and i < len(lines) - 1
+        out.append(render_inline(line.strip()) + (" <br />" if hard else ""))
+    return "\n".join(out)
+
+
+# ----------------------------------------------------------------------------
+# Blocks
+# ----------------------------------------------------------------------------
+
+
+def _label(text: str) -> str:
+    plain = re.sub(r"<[^>]+>", "", render_inline(text))
+    plain = html.unescape(plain).lower()
+    return "".join(ch for ch in plain if ch.isalnum() or ch in "._:-")
+
+
+def _split_row(line: str) -> list[str]:
+    s = line.strip()
+    if s.startswith("|"):
+        s = s[1:]
+    if s.endswith("|") and not s.endswith("\\|"):
+        s = s[:-1]
+    cells = re.split(r"(?<!\\)\|", s)
+    return [c.strip().replace("\\|", "|") for c in cells]
+
+
+def _alignments(sep: str) -> list[str]:
+    out = []
+    for c in _split_row(sep):
+        left, right = c.startswith(":"), c.endswith(":")
+        out.append("center" if left and right else "right" if right else "left" if left else "")
+    return out
+
+
+def _render_table(header: str, sep: str, body: list[str]) -> str:
+    aligns = _alignments(sep)
+    ncols = len(aligns)
+
+    def _style(a: str) -> str:
+        return f' style="text-align:{a};"' if a else ""
+
+    def _row(cells: list[str], tag: str) -> list[str]:
+        cells = (cells + [""] * ncols)[:ncols]
+        out = ["<tr>"]
+        for a, c in zip(aligns, cells):
+            out.append(f"\t<{tag}{_style(a)}>{render_inline(c)}</{tag}>")
+        out.append("</tr>")
+        return out
+
+    lines = ["<table>", "<colgroup>"]
+    lines += [f"<col{_style(a)}/>" if a else "<col />" for a in aligns]
+    lines += ["</colgroup>", "", "<thead>"]
+    lines += _row(_split_row(header), "th")
+    lines += ["</thead>", "", "<tbody>"]
+    for r in body:
+        lines += _row(_split_row(r), "td")
+    lines += ["</tbody>", "</table>"]
+    return "\n".join(lines)
+
+
+def _indent_width(s: str) -> int:
+    return len(s.expandtabs(4))
+
+
+def _item_lines(first: str, rest: list[str], content_indent: int) -> list[str]:
+    """An item's own lines with the item's content indentation removed."""
+    out = [first]
+    for ln in rest:
+        expanded = ln.expandtabs(4)
+        indent = len(expanded) - len(expanded.lstrip())
+        out.append(expanded[min(indent, content_indent) :])
+    return out
+
+
+def _render_list(lines: list[str]) -> str:
+    """
+    Render a list block. `lines` starts with a marker line; nested lists are
+    any marker lines indented deeper than the first marker.
+
+    Each item's content is rendered as blocks of its own. The list is loose
+    (every item's paragraphs wrapped in <p>) if a blank line separates two
+    items or two blocks inside an item, as in MultiMarkdown.
+    """
+    m0 = _LIST_RE.match(lines[0])
+    assert m0
+    base = _indent_width(m0.group(1))
+    ordered = m0.group(2)[0].isdigit()
+
+    # (content indent, first line text, following lines; "" = blank line)
+    items: list[tuple[int, str, list[str]]] = []
+    loose = False
+    pending_blank = False
+    for line in lines:
+        m = _LIST_RE.match(line)
+        if not line.strip():
+            pending_blank = True
+            continue
+        if m and _indent_width(m.group(1)) <= base:
+            if pending_blank and items:
+                loose = True
+            items.append((len(line[: m.start(3)].expandtabs(4)), m.group(3), []))
+        else:
+            if pending_blank:
+                items[-1][2].append("")
+            items[-1][2].append(line)
+        pending_blank = False
+
+    bodies = [_item_lines(first, rest, indent) for indent, first, rest in items]
+    if not loose:
+        loose = any(_render_blocks(body, tight=True, in_list=True)[1] for body in bodies)
+
+    tag = "ol" if ordered else "ul"
+    out = [f"<{tag}>"]
+    for body in bodies:
+        blocks, _ = _render_blocks(body, tight=not loose, in_list=True)
+        out.append("<li>" + "\n\n".join(blocks) + "</li>")
+    out.append(f"</{tag}>")
+    return "\n".join(out)
+
+
+def _render_blocks(lines: list[str], tight: bool = False, in_list: bool = False) -> tuple[list[str], bool]:
+    """
+    Returns (html blocks, whether a blank line separated any two blocks).
+
+    tight: paragraphs are not wrapped in <p> (items of a tight list).
+    in_list: a list marker line ends a paragraph (item content).
+    """
+    blocks: list[str] = []
+    gap = False
+    blank_before = False
+    i = 0
+    n = len(lines)
+    while i < n:
+        line = lines[i]
+        if not line.strip():
+            blank_before = bool(blocks)
+            i += 1
+            continue
+        gap = gap or blank_before
+        blank_before = False
+
+        m = _FENCE_RE.match(line)
+        if m:
+            fence = m.group(1)
+            j = i + 1
+            code: list[str] = []
+            while j < n and not lines[j].lstrip().startswith(fence):
+                code.append(lines[j])
+                j += 1
+            body = html.escape("\n".join(code), quote=False)
+            blocks.append(f"<pre><code>{body}\n</code></pre>")
+            i = j + 1
+            continue
+
+        m = _ATX_RE.match(line)
+        if m:
+            level, text = len(m.group(1)), m.group(2)
+            blocks.append(f'<h{level} id="{_label(text)}">{render_inline(text)}</h{level}>')
+            i += 1
+            continue
+
+        if _HR_RE.match(line):
+            blocks.append("<hr />")
+            i += 1
+            continue
+
+        if "|" in line and i + 1 < n and "|" in lines[i + 1] and _TABLE_SEP_RE.match(lines[i + 1]):
+            j = i + 2
+            body_rows: list[str] = []
+            while j < n and lines[j].strip() and "|" in lines[j]:
+                body_rows.append(lines[j])
+                j += 1
+            blocks.append(_render_table(line, lines[i + 1], body_rows))
+            i = j
+            continue
+
+        lm = _LIST_RE.match(line)
+        if lm:
+            base = _indent_width(lm.group(1))
+            ordered = lm.group(2)[0].isdigit()
+            j = i + 1
+            while j < n:
+                cur = lines[j]
+                cm = _LIST_RE.match(cur)
+                if cm and _indent_width(cm.group(1)) <= base and cm.group(2)[0].isdigit() != ordered:
+                    break
+                if cur.strip():
+                    j += 1
+                    continue
+                # Blank line: the list continues only if the next non-blank
+                # line is indented or is another item of the same list type.
+                k = j
+                while k < n and not lines[k].strip():
+                    k += 1
+                if k >= n:
+                    break
+                nm = _LIST_RE.match(lines[k])
+                indent = _indent_width(lines[k][: len(lines[k]) - len(lines[k].lstrip())])
+                if indent > base or (nm and nm.group(2)[0].isdigit() == ordered):
+                    j = k
+                    continue
+                break
+            blocks.append(_render_list(lines[i:j]))
+            i = j
+            continue
+
+        if _HTML_BLOCK_RE.match(line):
+            j = i
+            while j < n and lines[j].strip():
+                j += 1
+            blocks.append("\n".join(lines[i:j]))
+            i = j
+            continue
+
+        # Paragraph: runs until a blank line or a heading/fence/hr (or, in a
+        # list item, a nested list).
+        j = i
+        para: list[str] = []
+        while j < n and lines[j].strip():
+            if j > i and (_ATX_RE.match(lines[j]) or _FENCE_RE.match(lines[j]) or _HR_RE.match(lines[j])):
+                break
+            if j > i and in_list and _LIST_RE.match(lines[j]):
+                break
+            para.append(lines[j])
+            j += 1
+        body = _render_lines(para)
+        blocks.append(body if tight else f"<p>{body}</p>")
+        i = j
+
+    return blocks, gap
+
+
+def render_markdown(md: str) -> str:
+    lines = md.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    blocks, _ = _render_blocks(lines)
+    return "\n\n".join(blocks) + "\n" if blocks else ""
+
+
+
+
+def render_with_provenance(md: str) -> tuple[str, str]:
+    """Same contract as md_to_html_mmd._render_with_mmd: (html, provenance_comment)."""
+    prov = f"<!-- renderer: {RENDERER_VERSION} -->\n"
+    return prov + render_markdown(md), prov.strip()
+
+
+def main() -> int:
+    import argparse
+    import difflib
+
+    from tools.anki.cnsf_parse import load_cnsf_note
+    from tools.anki.md_to_html_mmd import _find_mmd, _run_mmd
+
+    ap = argparse.ArgumentParser(description="Built-in CNSF Markdown renderer (parity check against MultiMarkdown).")
+    ap.add_argument("--parity", nargs="+", required=True, help="CNSF note files or directories to compare")
+    args = ap.parse_args()
+
+    mmd_cmd = _find_mmd()
+    if not mmd_cmd:
+        print("SKIP: MultiMarkdown not on PATH; parity check needs 'multimarkdown' or 'mmd'.")
+        return 0
+
+    paths: list[Path] = []
+    for p in args.parity:
+        pp = Path(p)
+        paths.extend(sorted(pp.glob("**/*.md")) if pp.is_dir() else [pp])
+
+    bad = 0
+    for p in paths:
+        note = load_cnsf_note(p)
+        for label, md in (("front_md", note.front_md), ("back_md", note.back_md)):
+            expected = _run_mmd(mmd_cmd, md)
+            got = render_markdown(md)
+            if got != expected:
+                bad += 1
+                print(f"DIFF: {p} [{label}]")
+                for d in difflib.unified_diff(
+                    expected.splitlines(), got.splitlines(), "multimarkdown", "builtin", lineterm=""
+                ):
+                    print(f"  {d}")
+    print(f"Checked {len(paths)} notes; mismatched fragments: {bad}")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
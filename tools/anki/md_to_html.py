@@ -23,9 +23,9 @@ def main() -> None:
     ap.add_argument("--out", dest="outp", required=True, help="Output .html file")
     ap.add_argument(
         "--engine",
-        choices=["multimarkdown", "pandoc"],
+        choices=["multimarkdown", "pandoc", "builtin"],
         default="multimarkdown",
-        help="Conversion engine (default: multimarkdown)",
+        help="Conversion engine (default: multimarkdown; builtin = in-process CNSF subset renderer)",
     )
     args = ap.parse_args()
 
@@ -47,6 +47,15 @@ def main() -> None:
             raise SystemExit(p.returncode)
         outp.write_text(p.stdout, encoding="utf-8")
 
+    elif args.engine == "builtin":
+        try:
+            from tools.anki.md_builtin import render_with_provenance
+        except ModuleNotFoundError:  # run as a script (e.g. by pipeline.py)
+            from md_builtin import render_with_provenance  # type: ignore[no-redef]
+
+        html, _ = render_with_provenance(inp.read_text(encoding="utf-8"))
+        outp.write_text(html, encoding="utf-8")
+
     else:  # pandoc
         exe = shutil.which("pandoc")
         if not exe:
@@ -4,22 +4,44 @@ L1 -> L2: CNSF Markdown -> HTML fragments
 
 - Reads a CNSF note .md (YAML + # front_md / # back_md)
 - Renders front_md and back_md to HTML using MultiMarkdown if available
-  (prefers: multimarkdown, then mmd)
+  (prefers: multimarkdown, then mmd), or in-process with --engine builtin
+  (tools/anki/md_builtin.py)
 - Writes:
     domains/<domain>/anki/generated/<note_id>__front.html
     domains/<domain>/anki/generated/<note_id>__back.html
 
 Also embeds an HTML comment with renderer provenance.
+
+Many fragments can be rendered in one MultiMarkdown run with
+render_fragments() (sentinel-delimited batch document).
+
+Rendered bodies can be memoized in an on-disk RenderCache
+(tools/anki/render_cache.py) so unchanged markdown never spawns MultiMarkdown.
 """
 
 from __future__ import annotations
 
+import functools
+import os
+import re
+import secrets
 import shutil
 import subprocess
 from pathlib import Path
-from typing import Any
+from typing import Any, Sequence
+
+from tools.anki.cnsf_parse import CNSFNote, load_cnsf_note
+from tools.anki.md_builtin import RENDERER_VERSION as _BUILTIN_VERSION
+from tools.anki.md_builtin import render_with_provenance as _render_with_builtin
+from tools.anki.render_cache import RenderCache
+
 
-from tools.anki.cnsf_parse import load_cnsf_note
+ENGINES = ("multimarkdown", "builtin")
+
+
+def _as_note(note: str | Path | CNSFNote) -> CNSFNote:
+    # Callers that already parsed the note (e.g. the L3 export) pass it through.
+    return note if isinstance(note, CNSFNote) else load_cnsf_note(str(note))
 
 
 def _run(cmd: list[str], inp: str | None = None) -> subprocess.CompletedProcess[str]:
@@ -41,26 +63,167 @@ def _find_mmd() -> list[str] | None:
     return None
 
 
+def renderer_identity(engine: str = "multimarkdown") -> str:
+    """
+    Cheap identity of the renderer that would be used (no subprocess): the
+    builtin renderer's version, or the MultiMarkdown executable's
+    path/mtime/size. Changes whenever rendered output might change.
+    """
+    if engine == "builtin":
+        return _BUILTIN_VERSION
+    mmd_cmd = _find_mmd()
+    if not mmd_cmd:
+        raise RuntimeError("Could not find MultiMarkdown executable. Expected 'multimarkdown' or 'mmd' on PATH.")
+    st = os.stat(mmd_cmd[0])
+    return f"{os.path.realpath(mmd_cmd[0])}|{st.st_mtime_ns}|{st.st_size}"
+
+
 def _mmd_version(mmd_cmd: list[str]) -> str:
+    # Probed once per process per executable.
+    return _mmd_version_cached(tuple(mmd_cmd))
+
+
+@functools.lru_cache(maxsize=None)
+def _mmd_version_cached(mmd_cmd: tuple[str, ...]) -> str:
     # MultiMarkdown prints version text; keep just first line-ish
-    cp = _run(mmd_cmd + ["--version"])
+    cp = _run(list(mmd_cmd) + ["--version"])
     out = (cp.stdout or cp.stderr).strip()
     if not out:
         return "multimarkdown (unknown version)"
     return out.splitlines()[0].strip()
 
 
-def _render_with_mmd(mmd_cmd: list[str], md: str) -> tuple[str, str]:
+def _run_mmd(mmd_cmd: list[str], md: str) -> str:
+    cp = _run(mmd_cmd, inp=md)
+    if cp.returncode != 0:
+        raise RuntimeError(f"MultiMarkdown failed: {cp.stderr.strip() or cp.stdout.strip()}")
+    return cp.stdout
+
+
+def _render_with_mmd(mmd_cmd: list[str], md: str, cache: RenderCache | None = None) -> tuple[str, str]:
     """
     Returns (html, provenance_comment).
     We pass markdown via stdin.
+
+    With a cache, the body is looked up by (markdown, renderer version) first and
+    the version itself is only probed when the executable changed.
     """
-    cp = _run(mmd_cmd, inp=md)
-    if cp.returncode != 0:
-        raise RuntimeError(f"MultiMarkdown failed: {cp.stderr.strip() or cp.stdout.strip()}")
-    ver = _mmd_version(mmd_cmd)
+    if cache is None:
+        body = _run_mmd(mmd_cmd, md)
+        ver = _mmd_version(mmd_cmd)
+    else:
+        ver = cache.renderer_version(mmd_cmd[0], lambda: _mmd_version(mmd_cmd))
+        cached = cache.get(md, ver)
+        if cached is None:
+            body = _run_mmd(mmd_cmd, md)
+            cache.put(md, ver, body)
+        else:
+            body = cached
     prov = f"<!-- renderer: {ver} -->\n"
-    return prov + cp.stdout, prov.strip()
+    return prov + body, prov.strip()
+
+
+# Syntax whose output depends on the whole document (footnotes, citations,
+# reference links/abbreviations, metadata at document start) or that can
+# swallow a following sentinel (unbalanced code fences). Such fragments are
+# never batched.
+_BATCH_UNSAFE_RE = re.compile(r"(?m)\[\^|\[#|^\s{0,3}\[[^\]]+\]:|^\s{0,3}\*\[[^\]]+\]:")
+_METADATA_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9 _-]*:\s")
+_FENCE_RE = re.compile(r"(?m)^\s{0,3}(```|~~~)")
+
+
+def _batch_safe(md: str) -> bool:
+    if _BATCH_UNSAFE_RE.search(md):
+        return False
+    if _METADATA_RE.match(md.lstrip("\n")):
+        return False
+    if len(_FENCE_RE.findall(md)) % 2:
+        return False
+    return True
+
+
+def _render_batch_mmd(mmd_cmd: list[str], mds: Sequence[str]) -> list[str] | None:
+    """
+    Render several fragments in ONE MultiMarkdown run.
+
+    Fragments are joined with unique HTML-comment sentinels (raw HTML blocks
+    pass through MultiMarkdown untouched) and the output is split back on them.
+    Returns None if the sentinels did not survive intact; callers then fall
+    back to per-fragment rendering.
+    """
+    token = secrets.token_hex(8)
+    parts: list[str] = []
+    for i, md in enumerate(mds):
+        parts.append(f"<!-- cnsf-fragment:{token}:{i} -->")
+        parts.append(md.strip("\n"))
+    parts.append(f"<!-- cnsf-fragment:{token}:end -->")
+    out = _run_mmd(mmd_cmd, "\n\n".join(parts) + "\n")
+
+    pieces = re.split(rf"(?m)^<!-- cnsf-fragment:{token}:(\d+|end) -->$", out)
+    # pieces: [prefix, "0", body0, "1", body1, ..., "end", suffix]
+    labels = pieces[1::2]
+    if labels != [str(i) for i in range(len(mds))] + ["end"]:
+        return None
+    if pieces[0].strip() or pieces[-1].strip():
+        return None
+    bodies = pieces[2::2][: len(mds)]
+    return [b.strip("\n") + "\n" for b in bodies]
+
+
+def render_fragments(
+    mds: Sequence[str],
+    cache: RenderCache | None = None,
+    max_batch: int = 200,
+    verify: bool = False,
+) -> list[tuple[str, str]]:
+    """
+    Render many markdown fragments with one (or a few) MultiMarkdown runs.
+
+    Returns [(html, provenance_comment), ...] in input order, identical to
+    calling _render_with_mmd() per fragment. Cached fragments are not
+    re-rendered; batch-unsafe fragments are rendered on their own.
+
+    verify=True also renders every batched fragment individually and raises
+    RuntimeError on any difference (for tests/benchmarks).
+    """
+    mmd_cmd = _find_mmd()
+    if not mmd_cmd:
+        raise RuntimeError("Could not find MultiMarkdown executable. Expected 'multimarkdown' or 'mmd' on PATH.")
+
+    if cache is not None:
+        ver = cache.renderer_version(mmd_cmd[0], lambda: _mmd_version(mmd_cmd))
+    else:
+        ver = _mmd_version(mmd_cmd)
+
+    bodies: list[str | None] = [cache.get(md, ver) if cache is not None else None for md in mds]
+    todo = [i for i, b in enumerate(bodies) if b is None]
+    batchable = [i for i in todo if _batch_safe(mds[i])]
+    single = [i for i in todo if not _batch_safe(mds[i])]
+
+    for start in range(0, len(batchable), max(1, max_batch)):
+        idxs = batchable[start : start + max(1, max_batch)]
+        out = _render_batch_mmd(mmd_cmd, [mds[i] for i in idxs]) if len(idxs) > 1 else None
+        if out is None:
+            single.extend(idxs)
+            continue
+        for i, body in zip(idxs, out):
+            if verify:
+                expected = _run_mmd(mmd_cmd, mds[i])
+                if body != expected:
+                    raise RuntimeError(
+                        f"Batch render mismatch for fragment {i}:\n--- batch\n{body}--- single\n{expected}"
+                    )
+            bodies[i] = body
+
+    for i in sorted(single):
+        bodies[i] = _run_mmd(mmd_cmd, mds[i])
+
+    if cache is not None:
+        for i in todo:
+            cache.put(mds[i], ver, bodies[i] or "")
+
+    prov = f"<!-- renderer: {ver} -->\n"
+    return [(prov + (b or ""), prov.strip()) for b in bodies]
 
 
 def main() -> None:
@@ -73,6 +236,7 @@ def main() -> None:
         default="",
         help="Override output dir (default: domains/<domain>/anki/generated)",
     )
+    ap.add_argument("--engine", choices=ENGINES, default="multimarkdown", help="Renderer (default: multimarkdown)")
     args = ap.parse_args()
 
     note = load_cnsf_note(args.note)
@@ -92,14 +256,18 @@ def main() -> None:
     out_front = out_dir / f"{note_id}__front.html"
     out_back = out_dir / f"{note_id}__back.html"
 
-    mmd_cmd = _find_mmd()
-    if not mmd_cmd:
-        raise SystemExit(
-            "Could not find MultiMarkdown executable. Expected 'multimarkdown' or 'mmd' on PATH."
-        )
+    if args.engine == "builtin":
+        front_html, front_prov = _render_with_builtin(note.front_md)
+        back_html, back_prov = _render_with_builtin(note.back_md)
+    else:
+        mmd_cmd = _find_mmd()
+        if not mmd_cmd:
+            raise SystemExit(
+                "Could not find MultiMarkdown executable. Expected 'multimarkdown' or 'mmd' on PATH."
+            )
 
-    front_html, front_prov = _render_with_mmd(mmd_cmd, note.front_md)
-    back_html, back_prov = _render_with_mmd(mmd_cmd, note.back_md)
+        front_html, front_prov = _render_with_mmd(mmd_cmd, note.front_md)
+        back_html, back_prov = _render_with_mmd(mmd_cmd, note.back_md)
 
     out_front.write_text(front_html, encoding="utf-8")
     out_back.write_text(back_html, encoding="utf-8")
@@ -113,9 +281,20 @@ def main() -> None:
 if __name__ == "__main__":
     main()
 
-def render_cnsf_note_to_html(note_path: str | Path) -> dict[str, str]:
+def render_cnsf_note_to_html(
+    note_path: str | Path | CNSFNote,
+    cache: RenderCache | None = None,
+    engine: str = "multimarkdown",
+) -> dict[str, str]:
     """
-    Render a CNSF note (.md) into HTML fragments using MultiMarkdown.
+    Render a CNSF note (.md) into HTML fragments using MultiMarkdown
+    (or the in-process renderer with engine="builtin").
+
+    `note_path` may also be an already-parsed CNSFNote, which avoids reading
+    and parsing the file again.
+
+    If `cache` is given, unchanged front/back markdown is served from it
+    without running MultiMarkdown.
 
     Returns:
       {
@@ -125,14 +304,18 @@ def render_cnsf_note_to_html(note_path: str | Path) -> dict[str, str]:
         "back_provenance": "<!-- renderer: ... -->",
       }
     """
-    note = load_cnsf_note(str(note_path))
+    note = _as_note(note_path)
 
-    mmd_cmd = _find_mmd()
-    if not mmd_cmd:
-        raise RuntimeError("Could not find MultiMarkdown executable. Expected 'multimarkdown' or 'mmd' on PATH.")
+    if engine == "builtin":
+        front_html, front_prov = _render_with_builtin(note.front_md)
+        back_html, back_prov = _render_with_builtin(note.back_md)
+    else:
+        mmd_cmd = _find_mmd()
+        if not mmd_cmd:
+            raise RuntimeError("Could not find MultiMarkdown executable. Expected 'multimarkdown' or 'mmd' on PATH.")
 
-    front_html, front_prov = _render_with_mmd(mmd_cmd, note.front_md)
-    back_html, back_prov = _render_with_mmd(mmd_cmd, note.back_md)
+        front_html, front_prov = _render_with_mmd(mmd_cmd, note.front_md, cache)
+        back_html, back_prov = _render_with_mmd(mmd_cmd, note.back_md, cache)
 
     return {
         "front_html": front_html,
@@ -140,3 +323,37 @@ def render_cnsf_note_to_html(note_path: str | Path) -> dict[str, str]:
         "front_provenance": front_prov,
         "back_provenance": back_prov,
     }
+
+
+def render_cnsf_notes_to_html(
+    note_paths: Sequence[str | Path | CNSFNote],
+    cache: RenderCache | None = None,
+    verify: bool = False,
+    engine: str = "multimarkdown",
+) -> list[dict[str, str]]:
+    """
+    Batch form of render_cnsf_note_to_html(): all front/back fragments of all
+    notes go through render_fragments(), i.e. one MultiMarkdown run per batch
+    instead of two (plus two version probes) per note.
+    """
+    notes = [_as_note(p) for p in note_paths]
+    mds: list[str] = []
+    for n in notes:
+        mds.extend([n.front_md, n.back_md])
+    if engine == "builtin":
+        rendered = [_render_with_builtin(md) for md in mds]
+    else:
+        rendered = render_fragments(mds, cache=cache, max_batch=max(len(mds), 1), verify=verify)
+
+    out: list[dict[str, str]] = []
+    for k in range(len(notes)):
+        (front_html, front_prov), (back_html, back_prov) = rendered[2 * k], rendered[2 * k + 1]
+        out.append(
+            {
+                "front_html": front_html,
+                "back_html": back_html,
+                "front_provenance": front_prov,
+                "back_provenance": back_prov,
+            }
+        )
+    return out
@@ -4,7 +4,16 @@ from __future__ import annotations
 import argparse
 from pathlib import Path
 
+try:
+    from tools.anki import tsv_sidecar
+except ModuleNotFoundError:  # run as a script (e.g. by pipeline.py)
+    import tsv_sidecar  # type: ignore[no-redef]
+
 def read_tsv(path: Path) -> tuple[list[str], list[dict[str, str]]]:
+    loaded = tsv_sidecar.load_rows(path)
+    if loaded is not None:
+        header, rows = loaded
+        return header, [r for r in rows if "".join(r.values()).strip()]
     lines = path.read_text(encoding="utf-8").splitlines()
     if not lines:
         raise ValueError(f"Empty TSV: {path}")
@@ -20,18 +29,21 @@ def read_tsv(path: Path) -> tuple[list[str], list[dict[str, str]]]:
         rows.append({header[i]: parts[i] for i in range(len(header))})
     return header, rows
 
-def write_tsv(path: Path, header: list[str], rows: list[dict[str, str]]) -> None:
+def write_tsv(path: Path, header: list[str], rows: list[dict[str, str]], sqlite: bool = False) -> None:
     out_lines = ["\t".join(header)]
     for r in rows:
         out_lines.append("\t".join(r.get(h, "") for h in header))
     path.parent.mkdir(parents=True, exist_ok=True)
     path.write_text("\n".join(out_lines) + "\n", encoding="utf-8")
+    if sqlite:
+        tsv_sidecar.write_sidecar(path, header, rows)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Merge base.tsv with after_html.tsv by note_id.")
     ap.add_argument("--base", required=True, help="Base TSV with note_id, noteId, prompt")
     ap.add_argument("--after", required=True, help="After TSV with note_id, after_html")
     ap.add_argument("--out", required=True, help="Output TSV")
+    ap.add_argument("--sqlite", action="store_true", help="Also write a SQLite sidecar (<out>.sqlite) for update_notes_from_tsv.py")
     args = ap.parse_args()
 
     base_p = Path(args.base)
@@ -59,7 +71,7 @@ def main() -> None:
         merged.append(r2)
 
     header = ["note_id", "noteId", "prompt", "answer_html"]
-    write_tsv(out_p, header, merged)
+    write_tsv(out_p, header, merged, sqlite=args.sqlite)
 
     print(f"Base rows: {len(base_rows)}")
     print(f"After rows: {len(after_rows)}")
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+Local AnkiConnect stand-in (stdlib only) for offline sync testing and
+benchmarking.
+
+Serves the AnkiConnect actions our tools call against an in-memory
+collection:
+
+    version, modelNames, modelFieldNames, deckNames, findNotes, notesInfo,
+    updateNoteFields, getNoteTags, addTags, removeTags, addNote, addNotes,
+    canAddNotes, multi
+
+Behaviour follows AnkiConnect closely enough for tsv_to_anki.py and
+update_notes_from_tsv.py: duplicate checks on the model's first field
+(per deck or collection, honouring `allowDuplicate`), addNotes failing the
+whole call when any note fails, `{"result", "error"}` per `multi` action,
+and a findNotes search subset (AND / OR / -negation / parentheses,
+note:/deck:/tag:/nid: and <field>:value with `*` and `_` wildcards).
+
+Knobs for benchmarks and failure testing:
+- --latency-ms / --jitter-ms: delay before each request is handled
+- --error-rate: fraction of actions answered with an injected API error
+- --fail-action: always fail this action (repeatable)
+- --drop-rate: fraction of requests whose connection is closed unanswered
+- --seed: make the injected errors reproducible
+
+Example:
+  python -m tools.anki.mock_anki_connect --port 8765 --latency-ms 2
+  python -m tools.anki.sync.tsv_to_anki --tsv domains/b737/anki/exports/b737_cnsf_import.tsv
+
+The non-AnkiConnect action `mockStats` returns request/action counters.
+In-process use (benchmarks): MockAnkiConnect(...).start() returns the URL.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+API_VERSION = 6
+
+DEFAULT_MODELS: Dict[str, List[str]] = {
+    "B737_Structured": ["NoteID", "Front", "Back", "Source Document", "Source Location", "Verification Notes"],
+    "Basic": ["Front", "Back"],
+}
+
+
+class MockError(Exception):
+    """An AnkiConnect API error (returned as `error`, not raised over HTTP)."""
+
+
+# -- search --------------------------------------------------------------
+
+_TOKEN_RE = re.compile(r'\(|\)|-?"[^"]*"|-?[^\s()"]+(?:"[^"]*")?')
+
+
+def _glob(pattern: str) -> Callable[[str], bool]:
+    """Anki wildcard match: `*` any run, `_` one char, `\\*` / `\\_` literal; whole value, case-insensitive."""
+    if not any(c in pattern for c in "*_\\"):
+        folded = pattern.casefold()
+        return lambda v: v.casefold() == folded
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        out.append(".*" if c == "*" else "." if c == "_" else re.escape(c))
+        i += 1
+    rx = re.compile("".join(out), re.IGNORECASE | re.DOTALL)
+    return lambda v: rx.fullmatch(v) is not None
+
+
+def _unquote(s: str) -> str:
+    return s[1:-1] if len(s) >= 2 and s[0] == s[-1] == '"' else s
+
+
+def _term(token: str) -> Callable[[Dict[str, Any]], bool]:
+    token = _unquote(token)
+    if ":" not in token:
+        pat = _glob(f"*{token}*")
+        return lambda n: any(pat(v) for v in n["fields"].values())
+    key, value = token.split(":", 1)
+    key, value = key.lower(), _unquote(value)
+    pat = _glob(value)
+    if key == "note":
+        return lambda n: pat(n["modelName"])
+    if key == "deck":
+        child = _glob(f"{value}::*")
+        return lambda n: pat(n["deckName"]) or child(n["deckName"])
+    if key == "tag":
+        child = _glob(f"{value}::*")
+        return lambda n: any(pat(t) or child(t) for t in n["tags"])
+    if key == "nid":
+        ids = {int(x) for x in value.split(",") if x.strip()}
+        return lambda n: n["noteId"] in ids
+    return lambda n: any(k.lower() == key and pat(v) for k, v in n["fields"].items())
+
+
+def compile_query(query: str) -> Callable[[Dict[str, Any]], bool]:
+    """Compile a findNotes query (supported subset, see module docstring) to a predicate."""
+    tokens = _TOKEN_RE.findall(query)
+    pos = 0
+
+    def peek() -> Optional[str]:
+        return tokens[pos] if pos < len(tokens) else None
+
+    def parse_or() -> Callable[[Dict[str, Any]], bool]:
+        nonlocal pos
+        parts = [parse_and()]
+        while peek() is not None and peek().lower() == "or":  # type: ignore[union-attr]
+            pos += 1
+            parts.append(parse_and())
+        return parts[0] if len(parts) == 1 else (lambda n: any(p(n) for p in parts))
+
+    def parse_and() -> Callable[[Dict[str, Any]], bool]:
+        nonlocal pos
+        parts = []
+        while peek() is not None and peek() != ")" and peek().lower() != "or":  # type: ignore[union-attr]
+            tok = tokens[pos]
+            if tok.lower() == "and":
+                pos += 1
+                continue
+            parts.append(parse_unary())
+        return lambda n: all(p(n) for p in parts)
+
+    def parse_unary() -> Callable[[Dict[str, Any]], bool]:
+        nonlocal pos
+        tok = tokens[pos]
+        pos += 1
+        if tok == "(":
+            inner = parse_or()
+            if peek() != ")":
+                raise MockError(f"Invalid search: unbalanced parentheses in {query!r}")
+            pos += 1
+            return inner
+        if tok == ")":
+            raise MockError(f"Invalid search: unbalanced parentheses in {query!r}")
+        if tok.startswith("-") and len(tok) > 1:
+            inner = _term(tok[1:])
+            return lambda n: not inner(n)
+        return _term(tok)
+
+    if query.strip() in ("", "*"):
+        return lambda n: True
+    pred = parse_or()
+    if pos != len(tokens):
+        raise MockError(f"Invalid search: unexpected {tokens[pos]!r} in {query!r}")
+    return pred
+
+
+# -- collection ----------------------------------------------------------
+
+
+class MockCollection:
+    """In-memory notes; every action runs under one lock (like Anki's main thread)."""
+
+    def __init__(self, models: Optional[Dict[str, List[str]]] = None, first_id: int = 1700000000000) -> None:
+        self.models = {k: list(v) for k, v in (models or DEFAULT_MODELS).items()}
+        self.notes: Dict[int, Dict[str, Any]] = {}
+        self._by_first: Dict[tuple, Set[int]] = {}  # (model, first field value) -> note ids
+        self._next_id = first_id
+        self._lock = threading.Lock()
+
+    # helpers
+
+    def _note(self, note_id: Any) -> Dict[str, Any]:
+        note = self.notes.get(int(note_id))
+        if note is None:
+            raise MockError(f"Note was not found: {note_id}")
+        return note
+
+    def _check_new(self, note: Dict[str, Any]) -> Dict[str, str]:
+        """Validate an addNote payload; return the full field dict."""
+        model = note.get("modelName", "")
+        if model not in self.models:
+            raise MockError(f"model was not found: {model}")
+        if not note.get("deckName"):
+            raise MockError("deck was not found: ")
+        names = self.models[model]
+        given = note.get("fields") or {}
+        unknown = [k for k in given if k not in names]
+        if unknown:
+            raise MockError(f"field was not found: {unknown[0]}")
+        fields = {k: str(given.get(k, "")) for k in names}
+        if not fields[names[0]].strip():
+            raise MockError("cannot create note because it is empty")
+        opts = note.get("options") or {}
+        if not opts.get("allowDuplicate", False):
+            scope_deck = opts.get("duplicateScope", "collection") == "deck"
+            for other in self._by_first.get((model, fields[names[0]]), ()):
+                if not scope_deck or self.notes[other]["deckName"] == note["deckName"]:
+                    raise MockError("cannot create note because it is a duplicate")
+        return fields
+
+    def _add(self, note: Dict[str, Any]) -> int:
+        fields = self._check_new(note)
+        self._next_id += 1
+        nid = self._next_id
+        self.notes[nid] = {
+            "noteId": nid,
+            "modelName": note["modelName"],
+            "deckName": note["deckName"],
+            "fields": fields,
+            "tags": [t for t in dict.fromkeys(note.get("tags") or []) if t],
+            "mod": int(time.time()),
+        }
+        self._index(nid, add=True)
+        return nid
+
+    def _index(self, nid: int, add: bool) -> None:
+        n = self.notes[nid]
+        key = (n["modelName"], n["fields"][self.models[n["modelName"]][0]])
+        if add:
+            self._by_first.setdefault(key, set()).add(nid)
+        else:
+            self._by_first.get(key, set()).discard(nid)
+
+    @staticmethod
+    def _tag_list(tags: Any) -> List[str]:
+        return tags.split() if isinstance(tags, str) else [str(t) for t in tags or []]
+
+    # actions
+
+    def act_version(self) -> int:
+        return API_VERSION
+
+    def act_modelNames(self) -> List[str]:
+        return sorted(self.models)
+
+    def act_modelFieldNames(self, modelName: str) -> List[str]:
+        if modelName not in self.models:
+            raise MockError(f"model was not found: {modelName}")
+        return list(self.models[modelName])
+
+    def act_deckNames(self) -> List[str]:
+        return sorted({n["deckName"] for n in self.notes.values()} | {"Default"})
+
+    def act_findNotes(self, query: str) -> List[int]:
+        pred = compile_query(query)
+        return sorted(nid for nid, n in self.notes.items() if pred(n))
+
+    def act_notesInfo(self, notes: Sequence[Any]) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for nid in notes:
+            n = self.notes.get(int(nid))
+            if n is None:
+                out.append({})
+                continue
+            out.append(
+                {
+                    "noteId": n["noteId"],
+                    "modelName": n["modelName"],
+                    "tags": list(n["tags"]),
+                    "fields": {k: {"value": v, "order": i} for i, (k, v) in enumerate(n["fields"].items())},
+                    "mod": n["mod"],
+                    "cards": [n["noteId"] + 1],
+                }
+            )
+        return out
+
+    def act_updateNoteFields(self, note: Dict[str, Any]) -> None:
+        n = self._note(note["id"])
+        fields = note.get("fields") or {}
+        unknown = [k for k in fields if k not in n["fields"]]
+        if unknown:
+            raise MockError(f"field was not found: {unknown[0]}")
+        self._index(n["noteId"], add=False)
+        n["fields"].update({k: str(v) for k, v in fields.items()})
+        self._index(n["noteId"], add=True)
+        n["mod"] = int(time.time())
+
+    def act_getNoteTags(self, note: Any) -> List[str]:
+        return list(self._note(note)["tags"])
+
+    def act_addTags(self, notes: Sequence[Any], tags: Any) -> None:
+        add = self._tag_list(tags)
+        for nid in notes:
+            n = self._note(nid)
+            have = {t.lower() for t in n["tags"]}
+            n["tags"] += [t for t in add if t.lower() not in have]
+
+    def act_removeTags(self, notes: Sequence[Any], tags: Any) -> None:
+        drop = {t.lower() for t in self._tag_list(tags)}
+        for nid in notes:
+            n = self._note(nid)
+            n["tags"] = [t for t in n["tags"] if t.lower() not in drop]
+
+    def act_addNote(self, note: Dict[str, Any]) -> int:
+        return self._add(note)
+
+    def act_addNotes(self, notes: Sequence[Dict[str, Any]]) -> List[Optional[int]]:
+        results: List[Optional[int]] = []
+        errors: List[str] = []
+        for note in notes:
+            try:
+                results.append(self._add(note))
+            except MockError as e:
+                results.append(None)
+                errors.append(str(e))
+        if errors:
+            # Current AnkiConnect: the call fails if any note failed (the others stay added).
+            raise MockError(str(errors))
+        return results
+
+    def act_canAddNotes(self, notes: Sequence[Dict[str, Any]]) -> List[bool]:
+        out = []
+        for note in notes:
+            try:
+                self._check_new(note)
+                out.append(True)
+            except MockError:
+                out.append(False)
+        return out
+
+    def invoke(self, action: str, params: Dict[str, Any]) -> Any:
+        fn = getattr(self, f"act_{action}", None)
+        if fn is None:
+            raise MockError("unsupported action")
+        with self._lock:
+            try:
+                return fn(**params)
+            except TypeError as e:
+                raise MockError(f"invalid params for {action}: {e}") from e
+
+    def load_notes(self, notes: Iterable[Dict[str, Any]]) -> List[int]:
+        """Seed the collection with addNote payloads (duplicates allowed); returns the new ids."""
+        with self._lock:
+            return [self._add({**n, "options": {"allowDuplicate": True}}) for n in notes]
+
+
+# -- server --------------------------------------------------------------
+
+
+class MockAnkiConnect:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        collection: Optional[MockCollection] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        fail_actions: Iterable[str] = (),
+        drop_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.collection = collection or MockCollection()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fail_actions = set(fail_actions)
+        self.drop_rate = drop_rate
+        self.requests = 0
+        self.actions: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._stats_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _roll(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._stats_lock:
+            return self._rng.random() < rate
+
+    def _run_action(self, action: str, params: Dict[str, Any]) -> Any:
+        with self._stats_lock:
+            self.actions[action] += 1
+        if action in self.fail_actions or self._roll(self.error_rate):
+            raise MockError(f"mock: injected error for {action}")
+        if action == "multi":
+            out = []
+            for sub in params.get("actions") or []:
+                try:
+                    out.append({"result": self._run_action(sub["action"], sub.get("params") or {}), "error": None})
+                except MockError as e:
+                    out.append({"result": None, "error": str(e)})
+            return out
+        if action == "mockStats":
+            return {"requests": self.requests, "actions": dict(self.actions), "notes": len(self.collection.notes)}
+        return self.collection.invoke(action, params)
+
+    def handle(self, body: bytes) -> Dict[str, Any]:
+        with self._stats_lock:
+            self.requests += 1
+        try:
+            req = json.loads(body.decode("utf-8"))
+            return {"result": self._run_action(req["action"], req.get("params") or {}), "error": None}
+        except (MockError, ValueError, KeyError) as e:
+            return {"result": None, "error": str(e)}
+
+    def _handler_class(self) -> type:
+        mock = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like AnkiConnect
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                delay = mock.latency + (mock._rng.uniform(0, mock.jitter) if mock.jitter else 0.0)
+                if delay:
+                    time.sleep(delay)
+                if mock._roll(mock.drop_rate):
+                    self.close_connection = True
+                    return
+                data = json.dumps(mock.handle(body)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return _Handler
+
+    def start(self) -> str:
+        """Serve on a background thread; returns the URL."""
+        # Short poll interval: stop() returns within 50 ms (tests start one server each).
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockAnkiConnect":
+        self.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def _parse_model(spec: str) -> tuple:
+    name, sep, fields = spec.partition("=")
+    if not sep or not fields:
+        raise argparse.ArgumentTypeError(f"expected NAME=Field1,Field2,...: {spec!r}")
+    return name, [f.strip() for f in fields.split(",") if f.strip()]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Local AnkiConnect stand-in (in-memory collection) for offline testing.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765, help="Port (default: 8765, AnkiConnect's)")
+    ap.add_argument("--model", action="append", type=_parse_model, default=[], help="Extra note type NAME=Field1,Field2,... (repeatable)")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="Delay per request (default: 0)")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="Extra random delay per request, 0..N ms (default: 0)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of actions answered with an injected error")
+    ap.add_argument("--fail-action", action="append", default=[], help="Always fail this action (repeatable)")
+    ap.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of requests whose connection is closed unanswered")
+    ap.add_argument("--seed", type=int, default=None, help="Random seed for jitter and injected errors")
+    args = ap.parse_args()
+
+    models = dict(DEFAULT_MODELS)
+    models.update(dict(args.model))
+    mock = MockAnkiConnect(
+        args.host,
+        args.port,
+        collection=MockCollection(models),
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        fail_actions=args.fail_action,
+        drop_rate=args.drop_rate,
+        seed=args.seed,
+    )
+    print(f"Mock AnkiConnect on {mock.url} (models: {', '.join(sorted(models))}; Ctrl-C to stop)")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+        print(f"requests={mock.requests} notes={len(mock.collection.notes)} actions={dict(mock.actions)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+note_id <-> noteId mapping store shared by the exporter and the sync tools.
+
+A map is either a TSV (default; header `note_id \t noteId`, one pair per
+line, later lines win) or, for paths ending in .sqlite/.db, a SQLite file
+(one row per note_id), which suits large multi-domain maps:
+
+    meta(key, value)           format (JSON values)
+    noteids(note_id, noteId)   note_id is the primary key
+
+NoteIdMap loads the whole map into a dict index. add()/add_many() are
+buffered; flush() writes the pending pairs in one go: for a TSV, the file
+plus the new lines is written to a temp file and renamed over the map, so
+a reader never sees a half-written line; for SQLite, in one transaction.
+
+Problems found while loading are kept, not raised:
+- `duplicates`: TSV lines repeating a pair already seen
+- `conflicts`: (note_id, old noteId, new noteId) where a later line
+  remapped a note_id (the later line wins)
+- `invalid`: (note_id, noteId) pairs whose noteId is not a number; they
+  are left out of the index (and so out of compact() and --to copies)
+- shared_noteids(): one noteId mapped from several note_ids
+
+read_noteid_map() opens a SQLite map read-only and never creates it.
+
+compact() rewrites a TSV with one line per note_id. CLI:
+
+    python -m tools.anki.noteid_map <map> [--compact] [--to <other map>]
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from tools.anki.render_cache import atomic_write
+
+MAP_HEADER = ("note_id", "noteId")
+SQLITE_SUFFIXES = (".sqlite", ".db")
+SQLITE_FORMAT = 1
+
+
+class _TsvBackend:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lines = 0
+
+    def load(self) -> Iterator[Tuple[str, str]]:
+        self.lines = 0
+        if not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f, delimiter="\t"):
+                nid = (row.get("note_id") or "").strip()
+                aid = (row.get("noteId") or "").strip()
+                if nid and aid:
+                    self.lines += 1
+                    yield nid, aid
+
+    def append(self, pairs: List[Tuple[str, str]]) -> None:
+        text = self.path.read_text(encoding="utf-8") if self.path.exists() else ""
+        if not text:
+            text = "\t".join(MAP_HEADER) + "\n"
+        elif not text.endswith("\n"):
+            text += "\n"
+        atomic_write(self.path, text + "".join(f"{nid}\t{aid}\n" for nid, aid in pairs))
+        self.lines += len(pairs)
+
+    def rewrite(self, index: Dict[str, str]) -> None:
+        lines = ["\t".join(MAP_HEADER)] + [f"{nid}\t{aid}" for nid, aid in index.items()]
+        atomic_write(self.path, "\n".join(lines) + "\n")
+        self.lines = len(index)
+
+    def close(self) -> None:
+        pass
+
+
+class _SqliteBackend:
+    def __init__(self, path: Path, readonly: bool = False) -> None:
+        self.path = path
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            with self._conn:
+                self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                self._conn.execute("CREATE TABLE IF NOT EXISTS noteids (note_id TEXT PRIMARY KEY, noteId INTEGER NOT NULL)")
+                self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('format', ?)", (json.dumps(SQLITE_FORMAT),))
+        fmt = self._conn.execute("SELECT value FROM meta WHERE key = 'format'").fetchone()
+        if json.loads(fmt[0]) != SQLITE_FORMAT:
+            self._conn.close()
+            raise ValueError(f"Unsupported noteId map format in {path}")
+
+    @property
+    def lines(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM noteids").fetchone()[0]
+
+    def load(self) -> Iterator[Tuple[str, str]]:
+        for nid, aid in self._conn.execute("SELECT note_id, noteId FROM noteids ORDER BY rowid"):
+            yield nid, str(aid)
+
+    def append(self, pairs: List[Tuple[str, str]]) -> None:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO noteids VALUES (?, ?) ON CONFLICT(note_id) DO UPDATE SET noteId = excluded.noteId",
+                [(nid, int(aid)) for nid, aid in pairs],
+            )
+
+    def rewrite(self, index: Dict[str, str]) -> None:
+        # One row per note_id already; just reclaim space.
+        self._conn.execute("VACUUM")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _valid_noteid(aid: str) -> bool:
+    return aid.isascii() and aid.isdigit()
+
+
+class NoteIdMap:
+    def __init__(self, path: Path, readonly: bool = False) -> None:
+        self.path = path
+        self.sqlite = path.suffix.lower() in SQLITE_SUFFIXES
+        self._backend = _SqliteBackend(path, readonly) if self.sqlite else _TsvBackend(path)
+        self._index: Dict[str, str] = {}
+        self._pending: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self.duplicates = 0
+        self.conflicts: List[Tuple[str, str, str]] = []
+        self.invalid: List[Tuple[str, str]] = []
+        for nid, aid in self._backend.load():
+            if not _valid_noteid(aid):
+                self.invalid.append((nid, aid))
+                continue
+            old = self._index.get(nid)
+            if old == aid:
+                self.duplicates += 1
+            elif old is not None:
+                self.conflicts.append((nid, old, aid))
+            self._index[nid] = aid
+
+    def get(self, note_id: str, default: str = "") -> str:
+        return self._index.get(note_id, default)
+
+    def __contains__(self, note_id: object) -> bool:
+        return note_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def items(self) -> Iterable[Tuple[str, str]]:
+        return self._index.items()
+
+    def as_dict(self) -> Dict[str, str]:
+        return dict(self._index)
+
+    def shared_noteids(self) -> Dict[str, List[str]]:
+        """noteId -> note_ids, for noteIds mapped from more than one note_id."""
+        by_aid: Dict[str, List[str]] = {}
+        for nid, aid in self._index.items():
+            by_aid.setdefault(aid, []).append(nid)
+        return {aid: nids for aid, nids in by_aid.items() if len(nids) > 1}
+
+    def add(self, note_id: str, noteId: int | str) -> bool:
+        """Buffer note_id -> noteId; False if the map already says so or noteId is not a number.
+
+        A changed noteId is recorded as a conflict, a non-numeric one as invalid.
+        """
+        aid = str(noteId).strip()
+        with self._lock:
+            if not _valid_noteid(aid):
+                self.invalid.append((note_id, aid))
+                return False
+            old = self._index.get(note_id)
+            if old == aid:
+                return False
+            if old is not None:
+                self.conflicts.append((note_id, old, aid))
+            self._index[note_id] = aid
+            self._pending.append((note_id, aid))
+            return True
+
+    def add_many(self, pairs: Iterable[Tuple[str, int | str]]) -> int:
+        return sum(self.add(nid, aid) for nid, aid in pairs)
+
+    def flush(self) -> None:
+        """Write buffered pairs (one atomic rename / one transaction)."""
+        with self._lock:
+            if self._pending:
+                self._backend.append(self._pending)
+                self._pending = []
+
+    def compact(self) -> int:
+        """Rewrite the map with one entry per note_id; returns the number of lines dropped."""
+        self.flush()
+        with self._lock:
+            dropped = self._backend.lines - len(self._index)
+            self._backend.rewrite(self._index)
+            self.duplicates = 0
+            self.conflicts = []
+        return dropped
+
+    def problems(self) -> str:
+        """One-line summary of duplicate/conflicting/invalid entries, or "" if there are none."""
+        shared = self.shared_noteids()
+        if not (self.duplicates or self.conflicts or self.invalid or shared):
+            return ""
+        return (
+            f"{self.path}: duplicate lines={self.duplicates} remapped note_ids={len(self.conflicts)} "
+            f"noteIds shared by several note_ids={len(shared)} non-numeric noteIds={len(self.invalid)}"
+        )
+
+    def close(self) -> None:
+        self.flush()
+        self._backend.close()
+
+    def __enter__(self) -> "NoteIdMap":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def read_noteid_map(map_path: Path) -> Dict[str, str]:
+    """note_id -> noteId (later entries win); warns on stderr about duplicate/conflicting/invalid entries."""
+    if not map_path.exists() or map_path.stat().st_size == 0:
+        return {}
+    with NoteIdMap(map_path, readonly=True) as m:
+        problems = m.problems()
+        if problems:
+            print(f"WARN: noteId map {problems} (see python -m tools.anki.noteid_map)", file=sys.stderr)
+        return m.as_dict()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Inspect, compact or convert a note_id -> noteId map (TSV or .sqlite)")
+    ap.add_argument("map", help="Mapping TSV, or .sqlite/.db map")
+    ap.add_argument("--compact", action="store_true", help="Rewrite with one entry per note_id (later entries win)")
+    ap.add_argument("--to", default="", help="Copy all entries into another map (e.g. TSV -> .sqlite)")
+    args = ap.parse_args()
+
+    path = Path(args.map)
+    if not path.exists():
+        print(f"Map not found: {path}", file=sys.stderr)
+        return 2
+    with NoteIdMap(path) as m:
+        print(
+            f"OK: {path}: entries={len(m)} duplicate_lines={m.duplicates} remapped_note_ids={len(m.conflicts)} "
+            f"non_numeric_noteids={len(m.invalid)}"
+        )
+        for nid, old, new in m.conflicts:
+            print(f"  remapped: {nid}: {old} -> {new}")
+        for aid, nids in m.shared_noteids().items():
+            print(f"  shared noteId {aid}: {', '.join(nids)}")
+        for nid, aid in m.invalid:
+            print(f"  non-numeric noteId (ignored): {nid}: {aid!r}")
+        if args.compact:
+            print(f"OK: compacted {path} (lines dropped={m.compact()})")
+        if args.to:
+            with NoteIdMap(Path(args.to)) as out:
+                added = out.add_many(m.items())
+                problems = out.problems()
+            print(f"OK: wrote entries={added} to {args.to}")
+            if problems:
+                print(f"WARN: noteId map {problems}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
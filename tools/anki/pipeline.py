@@ -123,6 +123,25 @@ def cmd_update_notes(repo: Path, inp_tsv: Path, field: str | None, dry_run: bool
     return cmd
 
 
+def cmd_watch(notes_dir: Path, out_tsv: Path, map_tsv: Path | None, engine: str, interval: float) -> list[str]:
+    # watch.py imports tools.anki.*, so it runs as a module from the repo root.
+    cmd = [
+        sys.executable,
+        "-m",
+        "tools.anki.watch",
+        str(notes_dir),
+        "--out",
+        str(out_tsv),
+        "--engine",
+        engine,
+        "--interval",
+        str(interval),
+    ]
+    if map_tsv:
+        cmd += ["--map", str(map_tsv)]
+    return cmd
+
+
 def main() -> None:
     ap = argparse.ArgumentParser(
         description="Generalized Anki pipeline orchestrator (canonical MD -> HTML -> TSV -> Anki updates)."
@@ -147,7 +166,7 @@ def main() -> None:
     sub = ap.add_subparsers(dest="cmd", required=True)
 
     p_html = sub.add_parser("html", help="canonical.md -> canonical.html")
-    p_html.add_argument("--engine", choices=["multimarkdown", "pandoc"], default="multimarkdown")
+    p_html.add_argument("--engine", choices=["multimarkdown", "pandoc", "builtin"], default="multimarkdown")
 
     p_after_html = sub.add_parser("after-html", help="canonical.html -> after_html.tsv")
     # (no args yet)
@@ -160,6 +179,13 @@ def main() -> None:
     p_update_html.add_argument("--field", default=None, help="Explicit Anki field name to update (else auto-detect)")
     p_update_html.add_argument("--dry-run", action="store_true")
 
+    p_watch = sub.add_parser("watch", help="CNSF notes -> L3 import TSV, rebuilt incrementally on every save")
+    p_watch.add_argument("--notes", default="domains/b737/anki/notes", help="CNSF notes dir (relative to repo root)")
+    p_watch.add_argument("--out", default="", help="L3 import TSV (default: <exports>/<slug>__cnsf_import.tsv)")
+    p_watch.add_argument("--map", default="", help="noteId map TSV (relative to repo root)")
+    p_watch.add_argument("--engine", choices=["multimarkdown", "builtin"], default="multimarkdown")
+    p_watch.add_argument("--interval", type=float, default=0.25, help="Polling interval in seconds")
+
     args = ap.parse_args()
 
     repo = find_repo_root()
@@ -204,6 +230,18 @@ def main() -> None:
         run(cmd_update_notes(repo, paths.import_html_tsv, args.field, args.dry_run, args.anki_url), cwd=repo)
         return
 
+    if args.cmd == "watch":
+        notes_dir = (repo / args.notes).resolve()
+        if not notes_dir.is_dir():
+            raise FileNotFoundError(f"Missing notes dir: {notes_dir}")
+        out_tsv = (repo / args.out).resolve() if args.out else paths.exports_dir / f"{args.slug}__cnsf_import.tsv"
+        map_tsv = (repo / args.map).resolve() if args.map else None
+        try:
+            run(cmd_watch(notes_dir, out_tsv, map_tsv, args.engine, args.interval), cwd=repo)
+        except KeyboardInterrupt:
+            pass
+        return
+
 
 if __name__ == "__main__":
     main()
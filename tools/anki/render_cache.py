@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+L2 render cache: content-addressed store for rendered HTML fragments.
+
+- Key: sha256(renderer version + markdown text)
+- Layout:
+    <root>/<key[:2]>/<key>.html
+    <root>/versions.json   (renderer version per executable path/mtime/size)
+- Size-bounded: least-recently-used entries (by mtime; hits touch the file)
+  are evicted once the total exceeds max_bytes.
+
+Default location per domain:
+    domains/<domain>/anki/generated/.cache
+(.cache/render for notes without a domain).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Evict down to this fraction of max_bytes so we don't evict on every put.
+_EVICT_TARGET = 0.9
+
+
+def default_cache_dir(domain: str) -> Path:
+    if not domain:
+        # Notes without a `domain` share one cache under the repo-level .cache.
+        return Path(".cache") / "render"
+    return Path("domains") / domain / "anki" / "generated" / ".cache"
+
+
+# Read once: os.umask() can only be queried by setting it, which is not thread-safe.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def staging_path(path: Path) -> Path:
+    """
+    A new empty file next to `path` (unique, so concurrent writers never
+    share one) to stage a replacement in before os.replace(). It gets
+    0666 & ~umask, like a plain open() (mkstemp alone would leave it 0600).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    os.chmod(tmp, 0o666 & ~_UMASK)
+    return Path(tmp)
+
+
+def atomic_write(path: Path, text: str) -> None:
+    """Write `text` to a staging file next to `path` and rename it over `path`."""
+    tmp = staging_path(path)
+    try:
+        with tmp.open("w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class RenderCache:
+    def __init__(self, root: str | Path, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size: int | None = None  # lazily computed on first put
+        self._versions: dict[str, str] = {}  # in-process memo of versions.json
+
+    @staticmethod
+    def key(md: str, renderer_version: str) -> str:
+        h = hashlib.sha256()
+        h.update(renderer_version.encode("utf-8"))
+        h.update(b"\0")
+        h.update(md.encode("utf-8"))
+        return h.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.html"
+
+    def get(self, md: str, renderer_version: str) -> str | None:
+        p = self._entry_path(self.key(md, renderer_version))
+        try:
+            html = p.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(p)  # mark as recently used
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return html
+
+    def put(self, md: str, renderer_version: str, html: str) -> None:
+        p = self._entry_path(self.key(md, renderer_version))
+        try:
+            replaced = p.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        atomic_write(p, html)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(html.encode("utf-8")) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def renderer_version(self, exe: str, probe: Callable[[], str]) -> str:
+        """
+        Return the renderer version for `exe`, running `probe()` only when the
+        executable changed (path, mtime or size) since the version was recorded.
+        """
+        st = os.stat(exe)
+        ident = f"{os.path.realpath(exe)}|{st.st_mtime_ns}|{st.st_size}"
+        if ident in self._versions:
+            return self._versions[ident]
+        vpath = self.root / "versions.json"
+        with self._lock:
+            try:
+                versions = json.loads(vpath.read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                versions = {}
+            if ident not in versions:
+                versions[ident] = probe()
+                atomic_write(vpath, json.dumps(versions, indent=2, sort_keys=True) + "\n")
+            self._versions[ident] = str(versions[ident])
+            return self._versions[ident]
+
+    def stats(self) -> str:
+        return f"hits={self.hits} misses={self.misses} evictions={self.evictions}"
+
+    def _entries(self) -> list[os.DirEntry[str]]:
+        out: list[os.DirEntry[str]] = []
+        if not self.root.is_dir():
+            return out
+        for sub in os.scandir(self.root):
+            if not sub.is_dir():
+                continue
+            for e in os.scandir(sub.path):
+                if e.name.endswith(".html") and not e.name.startswith("."):
+                    out.append(e)
+        return out
+
+    def _scan_size(self) -> int:
+        return sum(e.stat().st_size for e in self._entries())
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime_ns)
+        size = sum(e.stat().st_size for e in entries)
+        target = int(self.max_bytes * _EVICT_TARGET)
+        for e in entries:
+            if size <= target:
+                break
+            try:
+                sz = e.stat().st_size
+                os.unlink(e.path)
+            except OSError:
+                continue
+            size -= sz
+            self.evictions += 1
+        self._size = size
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Write-ahead journal for tsv_to_anki.py (JSON lines, append-only).
+
+    {"journal": 1, "anki_url": "...", "tsv": "..."}      header
+    {"begin": ["b737_...", ...]}                         rows about to be written
+    {"note_id": "...", "digest": "...", "noteId": ..., "action": "..."}
+                                                         row committed
+
+A row is committed only after everything it needs is in Anki and its
+mapping line (if any) is in --map-out. `--resume` skips rows whose
+(note_id, payload digest) is committed; rows that were begun but never
+committed are simply synced again (updates are idempotent, and a note
+whose create did land is found by the NoteID resolution stage instead of
+being created twice). A row whose TSV payload changed since is synced
+again too. A journal written for another AnkiConnect URL is ignored (and
+replaced): its committed rows say nothing about this collection.
+
+The journal is removed after a run with no failures.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+from typing import Iterable, Set, Tuple
+
+JOURNAL_FORMAT = 1
+
+
+def default_journal_path(tsv_path: Path) -> Path:
+    return tsv_path.with_name(f"{tsv_path.name}.sync-journal.jsonl")
+
+
+class SyncJournal:
+    def __init__(self, path: Path, anki_url: str, tsv_path: Path) -> None:
+        self.path = path
+        self.anki_url = anki_url
+        self.tsv_path = tsv_path
+        self.committed: Set[Tuple[str, str]] = set()  # (note_id, digest)
+        self.in_flight: Set[str] = set()  # begun, not committed (previous run)
+        self.foreign_url = ""  # set by load() if the journal belongs to another AnkiConnect URL
+        self._f = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Read an existing journal (for --resume); tolerates a torn last line. Ignores another URL's journal."""
+        if not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        begun: Set[str] = set()
+        for n, line in enumerate(lines):
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                if n == len(lines) - 1:
+                    break  # crash mid-write
+                raise ValueError(f"Corrupt sync journal line {n + 1}: {self.path}")
+            if "journal" in rec:
+                if rec.get("journal") != JOURNAL_FORMAT:
+                    raise ValueError(f"Unsupported sync journal format in {self.path}")
+                if rec.get("anki_url") != self.anki_url:
+                    self.foreign_url = str(rec.get("anki_url"))
+                    return
+            elif "begin" in rec:
+                begun.update(rec["begin"])
+            else:
+                self.committed.add((rec["note_id"], rec["digest"]))
+                begun.discard(rec["note_id"])
+        self.in_flight = begun
+
+    def open(self, resume: bool) -> None:
+        """Start writing: append when resuming this URL's journal, else start a new journal."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume and self.path.exists() and not self.foreign_url:
+            self._f = self.path.open("a", encoding="utf-8")
+            return
+        self._f = self.path.open("w", encoding="utf-8")
+        self._write([{"journal": JOURNAL_FORMAT, "anki_url": self.anki_url, "tsv": str(self.tsv_path)}])
+
+    def _write(self, records: Iterable[dict]) -> None:
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        if not data or self._f is None:
+            return
+        with self._lock:
+            self._f.write(data)
+            # Flushed per record batch: survives a killed process (not a power loss).
+            self._f.flush()
+
+    def begin(self, note_ids: Iterable[str]) -> None:
+        ids = list(note_ids)
+        if ids:
+            self._write([{"begin": ids}])
+
+    def commit(self, entries: Iterable[Tuple[str, str, str, str]]) -> None:
+        """entries: (note_id, digest, noteId, action)."""
+        self._write(
+            {"note_id": nid, "digest": digest, "noteId": int(anki_id) if anki_id else None, "action": action}
+            for nid, digest, anki_id, action in entries
+        )
+
+    def is_committed(self, note_id: str, digest: str) -> bool:
+        return (note_id, digest) in self.committed
+
+    def close(self, remove: bool = False) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        if remove and self.path.exists():
+            self.path.unlink()
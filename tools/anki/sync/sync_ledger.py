@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Offline sync-state ledger for tsv_to_anki.py (SQLite).
+
+Next to `<name>.tsv` the sync keeps `<name>.tsv.sync-ledger.sqlite` holding,
+per AnkiConnect URL and note_id, the noteId and the payload digest (deck,
+model, fields, tags; see row_digest) of the last row that was confirmed in
+that Anki:
+
+    meta(key, value)                        format (JSON values)
+    notes(anki_url, note_id, noteId, digest)
+
+Syncing the same TSV to another URL (profile, machine) uses its own rows
+and leaves the others alone. A ledger in an older or unknown format is
+reset (it only caches sync state; the next run is a full sync).
+
+Every confirmed batch is written in one transaction, so an interrupted run
+leaves the ledger at the last finished batch. Rows that fail are dropped
+from the ledger, so a partly applied row is never taken as in sync.
+
+With `--changed-only` the sync sends only rows whose digest differs from
+the ledger (and fills missing noteIds from it). The ledger cannot see edits
+made in Anki itself; a run without --changed-only (e.g. --diff) reconciles
+and refreshes it.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+LEDGER_FORMAT = 2
+
+
+def default_ledger_path(tsv_path: Path) -> Path:
+    return tsv_path.with_name(f"{tsv_path.name}.sync-ledger.sqlite")
+
+
+class SyncLedger:
+    def __init__(self, path: Path, anki_url: str) -> None:
+        self.path = path
+        self.anki_url = anki_url
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Commits may come from the asyncio engine's thread; writes are serialized by _lock.
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Why the ledger was emptied on open ("" if it wasn't); callers warn about it.
+        self.reset = ""
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            meta = {k: json.loads(v) for k, v in self._conn.execute("SELECT key, value FROM meta")}
+            if meta and meta.get("format") != LEDGER_FORMAT:
+                self.reset = f"sync ledger {path} has format {meta.get('format')!r}, not {LEDGER_FORMAT}; starting over"
+                self._conn.execute("DROP TABLE IF EXISTS notes")
+                self._conn.execute("DELETE FROM meta")
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('format', ?)", (json.dumps(LEDGER_FORMAT),))
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS notes (anki_url TEXT NOT NULL, note_id TEXT NOT NULL, "
+                "noteId INTEGER, digest TEXT NOT NULL, PRIMARY KEY (anki_url, note_id))"
+            )
+
+    def load(self) -> Dict[str, Tuple[str, str]]:
+        """note_id -> (noteId, digest) of the last confirmed sync."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT note_id, noteId, digest FROM notes WHERE anki_url = ?", (self.anki_url,)
+            ).fetchall()
+        return {nid: ("" if anki_id is None else str(anki_id), digest) for nid, anki_id, digest in rows}
+
+    def commit(self, entries: Iterable[Tuple[str, str, str]], failed: Iterable[str] = ()) -> None:
+        """entries: (note_id, digest, noteId) confirmed in Anki; failed: note_ids to forget. One transaction."""
+        upserts = [(self.anki_url, nid, int(anki_id) if anki_id else None, digest) for nid, digest, anki_id in entries]
+        forget = [(self.anki_url, nid) for nid in failed]
+        if not upserts and not forget:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?)", upserts)
+            # After the upserts: a note with any failed row in the batch is not in sync.
+            self._conn.executemany("DELETE FROM notes WHERE anki_url = ? AND note_id = ?", forget)
+
+    def close(self) -> None:
+        self._conn.close()
@@ -4,48 +4,49 @@ L3 -> L4: Import TSV (HTML payload) -> Anki via AnkiConnect.
 
 This script is intentionally minimal-first:
 - Reads a TSV produced by tools/anki/export/cnsf_to_import_tsv.py
+- Rows without noteId are first looked up in bulk by NoteID; notes that
+  already exist get their noteId filled in (and written to --map-out)
 - For each row:
-  - If noteId present: update existing note fields + tags
+  - If noteId present: update existing note fields + tags (only the tag
+    delta is sent; manual tags outside the managed namespaces are kept)
   - Else: create note and (optionally) append note_id<->noteId mapping
+- Confirmed rows are recorded in a local ledger (sync_ledger.py); with
+  --changed-only, rows whose payload is unchanged since then are skipped
+  without contacting Anki
 
 Later we will add:
 - Strict schema validation against model field order
-- Tag policy (add/remove) with idempotence
 - Mapping file auto-detection per domain/note_type
 """
 
 from __future__ import annotations
 
 import argparse
+import asyncio
 import csv
+import hashlib
 import json
 import sys
-import urllib.request
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-
-ANKI_CONNECT_URL_DEFAULT = "http://127.0.0.1:8765"
+from tools.anki import anki_client, tsv_sidecar
+from tools.anki.anki_client import ANKI_CONNECT_URL_DEFAULT, DEFAULT_RETRIES, DEFAULT_TIMEOUT, get_client
+from tools.anki.noteid_map import NoteIdMap
+from tools.anki.sync.sync_journal import SyncJournal, default_journal_path
+from tools.anki.sync.sync_ledger import SyncLedger, default_ledger_path
+from tools.anki.tag_utils import MANAGED_PREFIXES, REPO_NAMESPACES, TagSpec, group_tag_deltas, tag_delta, tag_namespaces
 
 
 def eprint(*args: Any) -> None:
     print(*args, file=sys.stderr)
 
 
-def anki_request(action: str, params: Optional[dict] = None, url: str = ANKI_CONNECT_URL_DEFAULT) -> Any:
-    payload = {"action": action, "version": 6, "params": params or {}}
-    req = urllib.request.Request(
-        url,
-        data=json.dumps(payload).encode("utf-8"),
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    with urllib.request.urlopen(req, timeout=15) as resp:
-        data = json.loads(resp.read().decode("utf-8"))
-    if data.get("error"):
-        raise RuntimeError(f"AnkiConnect error for {action}: {data['error']}")
-    return data.get("result")
+def chunked(items: List[Any], size: int) -> List[List[Any]]:
+    size = max(1, size)
+    return [items[i : i + size] for i in range(0, len(items), size)]
 
 
 @dataclass
@@ -60,11 +61,49 @@ class TsvRow:
     extra_fields: Dict[str, str]
 
 
+_REQUIRED_COLUMNS = {"note_id", "noteId", "model", "deck", "tags", "front_html", "back_html"}
+
+
+def _rows_from_tuples(header: List[str], tuples: List[Tuple[str, ...]]) -> List[TsvRow]:
+    idx = {k: i for i, k in enumerate(header)}
+    extra_cols = [(k, i) for k, i in idx.items() if k not in _REQUIRED_COLUMNS]
+    i_nid, i_aid, i_model, i_deck, i_tags, i_front, i_back = (
+        idx[k] for k in ("note_id", "noteId", "model", "deck", "tags", "front_html", "back_html")
+    )
+    rows: List[TsvRow] = []
+    for t in tuples:
+        note_id = t[i_nid].strip()
+        if not note_id:
+            continue
+        rows.append(
+            TsvRow(
+                note_id=note_id,
+                noteId=t[i_aid].strip(),
+                model=t[i_model].strip(),
+                deck=t[i_deck].strip(),
+                tags=t[i_tags].split(),
+                front_html=t[i_front],
+                back_html=t[i_back],
+                extra_fields={k: t[i] for k, i in extra_cols},
+            )
+        )
+    return rows
+
+
 def parse_tsv(path: Path) -> Tuple[List[str], List[TsvRow]]:
+    # Prefer the SQLite sidecar (cnsf_to_import_tsv.py --sqlite) when it matches the TSV.
+    loaded = tsv_sidecar.load_tuples(path)
+    if loaded is not None:
+        header, tuples = loaded
+        missing = _REQUIRED_COLUMNS - set(header)
+        if missing:
+            raise ValueError(f"Missing required TSV columns: {sorted(missing)}")
+        return header, _rows_from_tuples(header, tuples)
+
     with path.open("r", encoding="utf-8", newline="") as f:
         reader = csv.DictReader(f, delimiter="\t")
         header = list(reader.fieldnames or [])
-        required = {"note_id", "noteId", "model", "deck", "tags", "front_html", "back_html"}
+        required = _REQUIRED_COLUMNS
         missing = required - set(header)
         if missing:
             raise ValueError(f"Missing required TSV columns: {sorted(missing)}")
@@ -113,7 +152,7 @@ def build_fields_payload(row: TsvRow) -> Dict[str, str]:
 
 def model_field_names(model_name: str, url: str) -> List[str]:
     # AnkiConnect: returns list of field names for a given model.
-    return anki_request("modelFieldNames", {"modelName": model_name}, url=url) or []
+    return get_client(url).model_field_names(model_name)
 
 
 def validate_fields_against_model(row: TsvRow, model_fields: List[str]) -> None:
@@ -129,56 +168,573 @@ def validate_fields_against_model(row: TsvRow, model_fields: List[str]) -> None:
         )
 
 
-def update_note(row: TsvRow, url: str) -> None:
+def managed_tag_spec(rows: Iterable[TsvRow]) -> TagSpec:
+    """
+    Tag policy for a sync: tags under MANAGED_PREFIXES, REPO_NAMESPACES
+    (domain:, status:, ...) or any other namespace the TSV itself uses belong
+    to the repo; other tags on a note (leech, marked, personal ones) are left
+    alone. REPO_NAMESPACES are managed even when no row uses them any more.
+    """
+    namespaces = tag_namespaces(t for r in rows for t in r.tags)
+    return TagSpec(managed_prefixes=tuple(dict.fromkeys(MANAGED_PREFIXES + REPO_NAMESPACES + namespaces)))
+
+
+def update_note(row: TsvRow, url: str, tag_spec: Optional[TagSpec] = None) -> None:
     note_id_num = int(row.noteId)
     fields = build_fields_payload(row)
+    client = get_client(url)
 
-    anki_request("updateNoteFields", {"note": {"id": note_id_num, "fields": fields}}, url=url)
+    client.update_note_fields(note_id_num, fields)
 
-    # For now: replace tags by clearing then adding (simple + deterministic).
-    # (We can implement a smarter diff later.)
-    current = anki_request("getNoteTags", {"note": note_id_num}, url=url) or []
-    if current:
-        anki_request("removeTags", {"notes": [note_id_num], "tags": " ".join(current)}, url=url)
-    if row.tags:
-        anki_request("addTags", {"notes": [note_id_num], "tags": " ".join(row.tags)}, url=url)
+    # Only the tag delta is sent; manual tags stay (see managed_tag_spec).
+    current = client.get_note_tags(note_id_num)
+    add, remove = tag_delta(current, row.tags, tag_spec or managed_tag_spec([row]))
+    if remove:
+        client.remove_tags([note_id_num], " ".join(remove))
+    if add:
+        client.add_tags([note_id_num], " ".join(add))
 
 
-def create_note(row: TsvRow, url: str) -> int:
-    fields = build_fields_payload(row)
-    note = {
+def build_note_payload(row: TsvRow) -> Dict[str, Any]:
+    return {
         "deckName": row.deck,
         "modelName": row.model,
-        "fields": fields,
+        "fields": build_fields_payload(row),
         "tags": row.tags,
         "options": {"allowDuplicate": False, "duplicateScope": "deck"},
     }
-    new_id = anki_request("addNote", {"note": note}, url=url)
-    return int(new_id)
 
 
-def append_mapping(map_path: Path, note_id: str, noteId: int) -> None:
-    map_path.parent.mkdir(parents=True, exist_ok=True)
-    exists = map_path.exists()
-    with map_path.open("a", encoding="utf-8", newline="") as f:
-        if not exists:
-            f.write("note_id\tnoteId\n")
-        f.write(f"{note_id}\t{noteId}\n")
+def find_note_ids(
+    want: Dict[str, str],
+    url: str,
+    query_chunk_size: int = 100,
+    info_chunk_size: int = 1000,
+) -> Dict[str, int]:
+    """
+    Look up existing notes by the stable CNSF note_id stored in the NoteID field.
 
+    `want` maps note_id -> model name. One findNotes per `query_chunk_size`
+    ids (OR-ed NoteID:"..." terms), then notesInfo on the hits to confirm the
+    exact field value (field search is case-insensitive and treats `_` as a
+    wildcard). If several notes carry the same NoteID, the oldest one of the
+    row's model wins. Returns note_id -> noteId for the ids that were found.
+    """
+    client = get_client(url)
+    hits: set = set()
+    for chunk in chunked(sorted(want), query_chunk_size):
+        hits.update(client.find_notes(" OR ".join(f'NoteID:"{v}"' for v in chunk)))
 
-def read_noteid_map(map_path: Path) -> Dict[str, str]:
-    """Read a mapping TSV with header: note_id \t noteId"""
-    m: Dict[str, str] = {}
-    if not map_path.exists():
-        return m
-    with map_path.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f, delimiter="\t")
-        for row in reader:
-            nid = (row.get("note_id") or "").strip()
-            aid = (row.get("noteId") or "").strip()
-            if nid and aid:
-                m[nid] = aid
-    return m
+    best: Dict[str, Tuple[bool, int]] = {}  # note_id -> (model differs, noteId); smallest wins
+    for chunk in chunked(sorted(hits), info_chunk_size):
+        for info in client.notes_info(chunk):
+            if not info or not info.get("noteId"):
+                continue
+            value = (((info.get("fields") or {}).get("NoteID") or {}).get("value") or "").strip()
+            if value not in want:
+                continue
+            cand = (info.get("modelName") != want[value], int(info["noteId"]))
+            if value not in best or cand < best[value]:
+                best[value] = cand
+    return {k: nid for k, (_, nid) in best.items()}
+
+
+def resolve_note_ids(rows: List[TsvRow], url: str) -> List[Tuple[str, int]]:
+    """
+    Fill row.noteId, before any writes, for rows that lack one but whose
+    note already exists in Anki (bulk NoteID search, see find_note_ids()).
+    Returns the resolved (note_id, noteId) pairs in row order, one per note_id.
+    """
+    want: Dict[str, str] = {}
+    for r in rows:
+        if not r.noteId:
+            want.setdefault(r.note_id, r.model)
+    if not want:
+        return []
+    found = find_note_ids(want, url=url)
+    for r in rows:
+        if not r.noteId and r.note_id in found:
+            r.noteId = str(found[r.note_id])
+    return [(nid, found[nid]) for nid in want if nid in found]
+
+
+@dataclass
+class RowResult:
+    note_id: str
+    noteId: str = ""
+    action: str = ""  # "updated" | "created" | "adopted" | "unchanged"
+    error: str = ""
+    # Filled in by sync_diff only.
+    changed_fields: List[str] = field(default_factory=list)
+    tags_added: List[str] = field(default_factory=list)
+    tags_removed: List[str] = field(default_factory=list)
+
+
+def _fail(res: RowResult, err: Any) -> None:
+    # Keep the first error seen for a row; later phases skip failed rows.
+    if not res.error:
+        res.error = str(err)
+
+
+def plan_creates(
+    rows: List[TsvRow],
+    results: List[RowResult],
+    idxs: List[int],
+    url: str,
+    chunk_size: int = 500,
+) -> None:
+    """
+    Create the rows in idxs that have no noteId, in bulk:
+      1. one canAddNotes call preflights every pending note
+      2. addable notes are created with addNotes, chunk_size per request
+      3. notes Anki refuses (duplicates) are adopted in bulk via find_note_ids()
+
+    A row repeating an earlier row's note_id reuses that row's note. Sets
+    results[i].action to "created" or "adopted" (rows[i].noteId is filled in
+    for adopted rows, which still need their update) or records an error.
+    """
+    first: Dict[str, int] = {}
+    pending: List[int] = []
+    repeats: List[int] = []
+    for i in idxs:
+        if rows[i].noteId or results[i].error:
+            continue
+        if rows[i].note_id in first:
+            repeats.append(i)
+        else:
+            first[rows[i].note_id] = i
+            pending.append(i)
+    if not pending:
+        return
+
+    client = get_client(url)
+    can_add = client.can_add_notes([build_note_payload(rows[i]) for i in pending])
+    if len(can_add) != len(pending):
+        raise RuntimeError(f"AnkiConnect canAddNotes returned {len(can_add)} answers for {len(pending)} notes")
+    refused = [i for i, ok in zip(pending, can_add) if not ok]
+
+    unconfirmed: Dict[int, str] = {}  # row -> addNotes error, if any
+    for chunk in chunked([i for i, ok in zip(pending, can_add) if ok], chunk_size):
+        try:
+            new_ids = client.add_notes([build_note_payload(rows[i]) for i in chunk])
+            err = ""
+        except RuntimeError as e:
+            # Newer AnkiConnect versions fail the whole call if any note fails,
+            # after adding the others: find out below which ones made it.
+            new_ids, err = [], str(e)
+        for k, i in enumerate(chunk):
+            new_id = new_ids[k] if k < len(new_ids) else None
+            if new_id:
+                results[i].noteId = str(int(new_id))
+                results[i].action = "created"
+            else:
+                unconfirmed[i] = err
+
+    lookup = refused + list(unconfirmed)
+    found = find_note_ids({rows[i].note_id: rows[i].model for i in lookup}, url=url) if lookup else {}
+    for i in lookup:
+        r = rows[i]
+        if r.note_id not in found:
+            if i in unconfirmed:
+                _fail(results[i], unconfirmed[i] or f"addNotes did not create {r.note_id}")
+            else:
+                _fail(
+                    results[i],
+                    f"Anki refused to create {r.note_id} (duplicate or empty first field), "
+                    "but no existing note has this NoteID.",
+                )
+            continue
+        # For unconfirmed rows the note may be ours or another client's; adopting
+        # (update with this row's payload) is correct either way.
+        r.noteId = str(found[r.note_id])
+        results[i].noteId = r.noteId
+        results[i].action = "adopted"
+
+    for i in repeats:
+        res = results[first[rows[i].note_id]]
+        if res.error:
+            _fail(results[i], f"skipped: creating {rows[i].note_id} failed")
+            continue
+        rows[i].noteId = res.noteId
+        results[i].noteId = res.noteId
+        results[i].action = "adopted"
+
+
+def write_created_mappings(map_out: NoteIdMap, results: List[RowResult]) -> None:
+    """Append note_id -> noteId for created/adopted rows, in row order (one flush)."""
+    map_out.add_many(
+        (res.note_id, int(res.noteId)) for res in results if res.action in ("created", "adopted") and not res.error
+    )
+    map_out.flush()
+
+
+def row_digest(row: TsvRow) -> str:
+    """Digest of what a sync writes for this row (deck, model, fields, tags)."""
+    payload = json.dumps(build_note_payload(row), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def commit_rows(
+    journal: Optional[SyncJournal],
+    ledger: Optional[SyncLedger],
+    rows: List[TsvRow],
+    results: List[RowResult],
+    idxs: Iterable[int],
+) -> None:
+    """Record finished rows in the journal and ledger (call after their mapping line, if any, is written)."""
+    if journal is None and ledger is None:
+        return
+    idxs = list(idxs)
+    done = [(i, row_digest(rows[i])) for i in idxs if results[i].action and not results[i].error]
+    if journal:
+        journal.commit((rows[i].note_id, digest, results[i].noteId, results[i].action) for i, digest in done)
+    if ledger:
+        ledger.commit(
+            ((rows[i].note_id, digest, results[i].noteId) for i, digest in done),
+            failed=[rows[i].note_id for i in idxs if results[i].error],
+        )
+
+
+def send_tag_deltas(
+    rows: List[TsvRow],
+    results: List[RowResult],
+    deltas: Iterable[Tuple[int, List[str], List[str]]],
+    url: str,
+    chunk_size: int,
+) -> None:
+    """
+    Apply (row index, add, remove) tag deltas with one removeTags/addTags per
+    distinct tag string across all the notes (group_tag_deltas), at most
+    `chunk_size` of them per `multi`. When a note has several rows, its last
+    row's delta is used. A failed call fails every row it covered.
+    """
+    by_note: Dict[int, Tuple[List[str], List[str]]] = {}
+    owners: Dict[int, List[int]] = {}
+    for i, add, remove in deltas:
+        nid = int(rows[i].noteId)
+        by_note[nid] = (add, remove)
+        owners.setdefault(nid, []).append(i)
+    adds, removes = group_tag_deltas({nid: d for nid, d in by_note.items() if d[0] or d[1]})
+    calls = [("removeTags", tags, nids) for tags, nids in removes] + [("addTags", tags, nids) for tags, nids in adds]
+    for chunk in chunked(calls, chunk_size):
+        replies = get_client(url).multi([anki_client.action(name, {"notes": nids, "tags": tags}) for name, tags, nids in chunk])
+        for (_, _, nids), (_, err) in zip(chunk, replies):
+            if err:
+                for nid in nids:
+                    for i in owners[nid]:
+                        _fail(results[i], err)
+
+
+def _created(results: List[RowResult], idxs: Iterable[int]) -> List[int]:
+    return [i for i in idxs if results[i].action == "created"]
+
+
+def sync_batched(
+    rows: List[TsvRow],
+    url: str,
+    chunk_size: int,
+    map_out: Optional[NoteIdMap] = None,
+    create_chunk_size: int = 500,
+    journal: Optional[SyncJournal] = None,
+    ledger: Optional[SyncLedger] = None,
+    tag_spec: Optional[TagSpec] = None,
+) -> List[RowResult]:
+    """
+    Batched equivalent of the per-row sync loop.
+
+    Rows without noteId are created up front by plan_creates(). Then each
+    chunk of rows costs a fixed number of `multi` round-trips instead of up
+    to three requests per row:
+      1. updateNoteFields + getNoteTags for every row with a noteId
+      2. the chunk's tag deltas, one removeTags/addTags per distinct tag
+         string (send_tag_deltas; none if the tags already match)
+
+    Returns one RowResult per input row, in input order.
+    """
+    tag_spec = tag_spec or managed_tag_spec(rows)
+    results = [RowResult(note_id=r.note_id, noteId=r.noteId) for r in rows]
+    everything = list(range(len(rows)))
+    plan_creates(rows, results, everything, url, create_chunk_size)
+    if map_out is not None:
+        write_created_mappings(map_out, results)
+    commit_rows(journal, ledger, rows, results, _created(results, everything))
+
+    for chunk in chunked(everything, chunk_size):
+        # 1) Field updates + current tags
+        updates = [i for i in chunk if rows[i].noteId and not results[i].error and results[i].action != "created"]
+        if journal:
+            journal.begin(rows[i].note_id for i in updates)
+        actions: List[Dict[str, Any]] = []
+        for i in updates:
+            nid = int(rows[i].noteId)
+            actions.append(anki_client.action("updateNoteFields", {"note": {"id": nid, "fields": build_fields_payload(rows[i])}}))
+            actions.append(anki_client.action("getNoteTags", {"note": nid}))
+        replies = get_client(url).multi(actions)
+        current_tags: Dict[int, List[str]] = {}
+        for k, i in enumerate(updates):
+            (_, upd_err), (tags, tags_err) = replies[2 * k], replies[2 * k + 1]
+            if upd_err or tags_err:
+                _fail(results[i], upd_err or tags_err)
+                continue
+            current_tags[i] = list(tags or [])
+
+        # 2) Tag deltas (same policy as update_note), grouped across the chunk
+        deltas = [(i, *tag_delta(tags, rows[i].tags, tag_spec)) for i, tags in current_tags.items()]
+        send_tag_deltas(rows, results, deltas, url, chunk_size)
+        for i in updates:
+            if not results[i].error and not results[i].action:
+                results[i].action = "updated"
+        commit_rows(journal, ledger, rows, results, updates)
+
+    return results
+
+
+def note_delta(
+    row: TsvRow, info: Dict[str, Any], tag_spec: TagSpec = TagSpec()
+) -> Tuple[Dict[str, str], List[str], List[str]]:
+    """
+    Compare a TSV row with its notesInfo entry.
+
+    Returns (changed fields, tags to add, tags to remove). Fields absent from
+    the TSV are left alone, as with a full update.
+    """
+    current_fields = {k: (v or {}).get("value", "") for k, v in (info.get("fields") or {}).items()}
+    changed = {k: v for k, v in build_fields_payload(row).items() if current_fields.get(k) != v}
+    add, remove = tag_delta(info.get("tags") or [], row.tags, tag_spec)
+    return changed, add, remove
+
+
+def sync_diff(
+    rows: List[TsvRow],
+    url: str,
+    chunk_size: int,
+    map_out: Optional[NoteIdMap] = None,
+    info_chunk_size: int = 1000,
+    create_chunk_size: int = 500,
+    journal: Optional[SyncJournal] = None,
+    ledger: Optional[SyncLedger] = None,
+    tag_spec: Optional[TagSpec] = None,
+) -> List[RowResult]:
+    """
+    Diff-aware sync: only send what actually differs from Anki.
+
+    Creates go through plan_creates() as in sync_batched(). For every row
+    with a noteId, current state is fetched with chunked notesInfo calls; a
+    note is then touched only if its fields or tags differ, and only the
+    changed fields / tag deltas are sent. Per notesInfo window, field
+    updates go in one `multi` per chunk of changed notes and tag deltas are
+    grouped across the window (send_tag_deltas), so a deck-wide retag costs
+    a few requests. Unchanged notes keep their Anki modification time.
+
+    Returns one RowResult per input row, in input order.
+    """
+    tag_spec = tag_spec or managed_tag_spec(rows)
+    results = [RowResult(note_id=r.note_id, noteId=r.noteId) for r in rows]
+    everything = list(range(len(rows)))
+
+    plan_creates(rows, results, everything, url, create_chunk_size)
+    if map_out is not None:
+        write_created_mappings(map_out, results)
+    commit_rows(journal, ledger, rows, results, _created(results, everything))
+
+    existing = [i for i in everything if rows[i].noteId and not results[i].error and results[i].action != "created"]
+    for window in chunked(existing, info_chunk_size):
+        infos = get_client(url).notes_info([int(rows[i].noteId) for i in window])
+        if len(infos) != len(window):
+            raise RuntimeError(f"AnkiConnect notesInfo returned {len(infos)} notes for {len(window)} ids")
+        changed: List[Tuple[int, Dict[str, str], List[str], List[str]]] = []
+        settled: List[int] = []
+        for i, info in zip(window, infos):
+            if not info or not info.get("noteId"):
+                _fail(results[i], f"Note {rows[i].noteId} not found in Anki")
+                continue
+            fields, add, remove = note_delta(rows[i], info, tag_spec)
+            res = results[i]
+            res.changed_fields = sorted(fields)
+            res.tags_added = add
+            res.tags_removed = remove
+            if fields or add or remove:
+                changed.append((i, fields, add, remove))
+                continue
+            if not res.action:
+                res.action = "unchanged"
+            settled.append(i)
+        commit_rows(journal, ledger, rows, results, settled)
+        if not changed:
+            continue
+
+        if journal:
+            journal.begin(rows[i].note_id for i, _, _, _ in changed)
+        for chunk in chunked([c for c in changed if c[1]], chunk_size):
+            actions = [
+                anki_client.action("updateNoteFields", {"note": {"id": int(rows[i].noteId), "fields": fields}})
+                for i, fields, _, _ in chunk
+            ]
+            for (i, _, _, _), (_, err) in zip(chunk, get_client(url).multi(actions)):
+                if err:
+                    _fail(results[i], err)
+        send_tag_deltas(rows, results, [(i, add, remove) for i, _, add, remove in changed], url, chunk_size)
+        for i, _, _, _ in changed:
+            if not results[i].error and not results[i].action:
+                results[i].action = "updated"
+        commit_rows(journal, ledger, rows, results, [i for i, _, _, _ in changed])
+
+    return results
+
+
+def finish_row(r: TsvRow, res: RowResult, url: str, tag_spec: Optional[TagSpec] = None) -> None:
+    """
+    Per-row part of the serial sync, after plan_creates(): rows that were not
+    just created (existing or adopted notes) get their fields, then their
+    tags, updated. Errors raise.
+    """
+    if res.error or res.action == "created":
+        return
+    update_note(r, url=url, tag_spec=tag_spec)
+    res.noteId = r.noteId
+    res.action = res.action or "updated"
+
+
+class AsyncSync:
+    """
+    Concurrent version of the serial sync loop (asyncio + worker threads on
+    the shared pooled AnkiConnect client). Creates are planned in bulk
+    before the concurrent phase, exactly as in the serial path.
+
+    - At most `concurrency` rows are in flight at once.
+    - Rows sharing a note_id run one after another, in TSV order, and each
+      row is finished by finish_row(), so a note's fields always land before its
+      tags and a later row never overtakes an earlier one.
+    - Mapping lines for created/adopted notes are written in one flush right
+      after planning, as in the serial run; journal and ledger commits
+      follow in TSV order as soon as every earlier row has finished.
+    - Progress goes to stderr every `progress_interval` seconds. On
+      cancellation (Ctrl-C) in-flight rows are allowed to finish and are
+      committed, and `results` keeps every finished row (None for rows that
+      never ran) so the caller can still print the log.
+    """
+
+    def __init__(
+        self,
+        rows: List[TsvRow],
+        url: str,
+        concurrency: int = 8,
+        map_out: Optional[NoteIdMap] = None,
+        progress_interval: float = 2.0,
+        create_chunk_size: int = 500,
+        journal: Optional[SyncJournal] = None,
+        ledger: Optional[SyncLedger] = None,
+        tag_spec: Optional[TagSpec] = None,
+    ) -> None:
+        self.rows = rows
+        self.url = url
+        self.concurrency = max(1, concurrency)
+        self.map_out = map_out
+        self.progress_interval = progress_interval
+        self.create_chunk_size = create_chunk_size
+        self.journal = journal
+        self.ledger = ledger
+        self.tag_spec = tag_spec or managed_tag_spec(rows)
+        self.results: List[Optional[RowResult]] = [None] * len(rows)
+        self._planned = [RowResult(note_id=r.note_id, noteId=r.noteId) for r in rows]  # filled in by _plan()
+        self._committed = 0  # rows[:_committed] have been passed to commit_rows()
+
+    def _run_row(self, i: int) -> None:
+        # Runs in a worker thread; the result is stored even if the awaiting task was cancelled.
+        res = self._planned[i]
+        if self.journal and not (res.error or res.action == "created"):
+            self.journal.begin([res.note_id])
+        try:
+            finish_row(self.rows[i], res, self.url, self.tag_spec)
+        except Exception as e:
+            _fail(res, e)
+        self.results[i] = res
+
+    def _commit_in_order(self, final: bool = False) -> None:
+        """Commit finished rows in TSV order (past gaps only when final)."""
+        done: List[int] = []
+        while self._committed < len(self.rows):
+            res = self.results[self._committed]
+            if res is None and not final:
+                break
+            if res is not None:
+                done.append(self._committed)
+            self._committed += 1
+        commit_rows(self.journal, self.ledger, self.rows, self.results, done)  # type: ignore[arg-type]
+
+    def _progress(self) -> None:
+        finished = [res for res in self.results if res is not None]
+        failed = sum(1 for res in finished if res.error)
+        eprint(f"progress: {len(finished)}/{len(self.rows)} rows (failed={failed})")
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            self._progress()
+
+    async def _run_note(self, idxs: List[int], sem: asyncio.Semaphore, pool: ThreadPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        for n, i in enumerate(idxs):
+            async with sem:
+                await loop.run_in_executor(pool, self._run_row, i)
+            if self.results[i].error:  # type: ignore[union-attr]
+                # Later rows for the same note would race past the failure; skip them.
+                for j in idxs[n + 1 :]:
+                    r = self.rows[j]
+                    self.results[j] = RowResult(
+                        note_id=r.note_id, noteId=r.noteId, error="skipped: an earlier row for this note_id failed"
+                    )
+                self._commit_in_order()
+                return
+            self._commit_in_order()
+
+    def _plan(self) -> None:
+        # Runs in a worker thread, so an interrupt while planning still records what was created.
+        plan_creates(self.rows, self._planned, list(range(len(self.rows))), self.url, self.create_chunk_size)
+        if self.map_out is not None:
+            write_created_mappings(self.map_out, self._planned)
+        for i, res in enumerate(self._planned):
+            if res.action == "created" or res.error:
+                self.results[i] = res
+
+    async def run(self) -> List[Optional[RowResult]]:
+        groups: Dict[str, List[int]] = {}
+        for i, r in enumerate(self.rows):
+            groups.setdefault(r.note_id, []).append(i)
+
+        get_client(self.url).grow_pool(self.concurrency)
+        sem = asyncio.Semaphore(self.concurrency)
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="anki-sync")
+        reporter = asyncio.create_task(self._report()) if self.progress_interval > 0 else None
+        tasks: List[asyncio.Task] = []
+        try:
+            await asyncio.get_running_loop().run_in_executor(pool, self._plan)
+            self._commit_in_order()
+            tasks = [asyncio.create_task(self._run_note(idxs, sem, pool)) for idxs in groups.values()]
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+            if reporter:
+                reporter.cancel()
+            # Queued rows are dropped; rows already sent to Anki finish so their outcome is known.
+            pool.shutdown(wait=True, cancel_futures=True)
+            self._commit_in_order(final=True)
+            if self.progress_interval > 0:
+                self._progress()
+        return self.results
+
+
+def print_row_result(res: RowResult) -> None:
+    """One log line per row, same wording as the serial loop."""
+    if res.error:
+        eprint(f"FAIL: {res.note_id} ({res.noteId or 'no noteId'}): {res.error}")
+    elif res.action == "created":
+        print(f"OK: created noteId {res.noteId} ({res.note_id})")
+    elif res.action == "adopted":
+        print(f"OK: adopted+updated existing noteId {res.noteId} ({res.note_id})")
+    else:
+        print(f"OK: updated noteId {res.noteId} ({res.note_id})")
 
 
 def apply_noteid_map(rows: List[TsvRow], mapping: Dict[str, str]) -> int:
@@ -207,15 +763,171 @@ def apply_noteid_map(rows: List[TsvRow], mapping: Dict[str, str]) -> int:
 
 
 
+def run_sync(
+    args: argparse.Namespace,
+    rows: List[TsvRow],
+    journal: Optional[SyncJournal],
+    ledger: Optional[SyncLedger] = None,
+    tag_spec: Optional[TagSpec] = None,
+    map_store: Optional[NoteIdMap] = None,
+) -> int:
+    """Run the sync mode selected on the command line; returns the exit code."""
+    tag_spec = tag_spec or managed_tag_spec(rows)
+    if args.diff:
+        results = sync_diff(
+            rows,
+            url=args.anki_url,
+            chunk_size=args.chunk_size,
+            map_out=map_store,
+            info_chunk_size=args.info_chunk_size,
+            create_chunk_size=args.create_chunk_size,
+            journal=journal,
+            ledger=ledger,
+            tag_spec=tag_spec,
+        )
+        failed = 0
+        for res in results:
+            if res.error:
+                failed += 1
+                eprint(f"FAIL: {res.note_id} ({res.noteId or 'no noteId'}): {res.error}")
+            elif res.action == "created":
+                print(f"OK: created noteId {res.noteId} ({res.note_id})")
+            elif res.action == "unchanged":
+                print(f"OK: unchanged noteId {res.noteId} ({res.note_id})")
+            else:
+                what = []
+                if res.changed_fields:
+                    what.append("fields: " + ", ".join(res.changed_fields))
+                if res.tags_added or res.tags_removed:
+                    what.append("tags: " + " ".join([f"+{t}" for t in res.tags_added] + [f"-{t}" for t in res.tags_removed]))
+                if res.action == "adopted":
+                    verb = "adopted+updated existing" if what else "adopted existing"
+                else:
+                    verb = "updated"
+                print(f"OK: {verb} noteId {res.noteId} ({res.note_id}) [{'; '.join(what) or 'no changes'}]")
+        ok = [res for res in results if not res.error]
+        noop = sum(
+            1
+            for res in ok
+            if res.action in ("unchanged", "adopted")
+            and not (res.changed_fields or res.tags_added or res.tags_removed)
+        )
+        fields_changed = sum(1 for res in ok if res.changed_fields)
+        tags_changed = sum(1 for res in ok if res.tags_added or res.tags_removed)
+        created = sum(1 for res in ok if res.action == "created")
+        print(
+            f"Done. noop={noop} fields_changed={fields_changed} tags_changed={tags_changed} "
+            f"created={created} failed={failed}"
+        )
+        return 1 if failed else 0
+
+    if args.batch:
+        results = sync_batched(
+            rows,
+            url=args.anki_url,
+            chunk_size=args.chunk_size,
+            map_out=map_store,
+            create_chunk_size=args.create_chunk_size,
+            journal=journal,
+            ledger=ledger,
+            tag_spec=tag_spec,
+        )
+        failed = 0
+        for res in results:
+            failed += bool(res.error)
+            print_row_result(res)
+        created = sum(1 for res in results if res.action == "created" and not res.error)
+        updated = sum(1 for res in results if res.action in ("updated", "adopted") and not res.error)
+        print(f"Done. updated={updated} created={created} failed={failed}")
+        return 1 if failed else 0
+
+    if args.concurrency:
+        engine = AsyncSync(
+            rows,
+            url=args.anki_url,
+            concurrency=args.concurrency,
+            map_out=map_store,
+            progress_interval=args.progress_interval,
+            create_chunk_size=args.create_chunk_size,
+            journal=journal,
+            ledger=ledger,
+            tag_spec=tag_spec,
+        )
+        interrupted = False
+        try:
+            asyncio.run(engine.run())
+        except KeyboardInterrupt:
+            interrupted = True
+        finished = [res for res in engine.results if res is not None]
+        for res in finished:
+            print_row_result(res)
+        failed = sum(1 for res in finished if res.error)
+        created = sum(1 for res in finished if res.action == "created" and not res.error)
+        updated = sum(1 for res in finished if res.action in ("updated", "adopted") and not res.error)
+        if interrupted:
+            print(f"Interrupted. updated={updated} created={created} failed={failed} not_run={len(rows) - len(finished)}")
+            return 130
+        # Same summary as the serial loop; failures are reported instead of aborting the run.
+        print(f"Done. updated={updated} created={created}" + (f" failed={failed}" if failed else ""))
+        return 1 if failed else 0
+
+    results = [RowResult(note_id=r.note_id, noteId=r.noteId) for r in rows]
+    plan_creates(rows, results, list(range(len(rows))), args.anki_url, args.create_chunk_size)
+    if map_store is not None:
+        write_created_mappings(map_store, results)
+    created = 0
+    updated = 0
+    for i, (r, res) in enumerate(zip(rows, results)):
+        if res.error:
+            raise RuntimeError(res.error)
+        if journal and res.action != "created":
+            journal.begin([r.note_id])
+        finish_row(r, res, url=args.anki_url, tag_spec=tag_spec)
+        print_row_result(res)
+        if res.action == "created":
+            created += 1
+        else:
+            updated += 1
+        commit_rows(journal, ledger, rows, results, [i])
+
+    print(f"Done. updated={updated} created={created}")
+    return 0
+
+
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("--tsv", required=True, help="Path to L3 import TSV (HTML payload)")
     ap.add_argument("--anki-url", default=ANKI_CONNECT_URL_DEFAULT)
-    ap.add_argument("--map-out", default="", help="Optional mapping TSV to append to on CREATE flows")
-    ap.add_argument("--map-in", default="", help="Optional mapping TSV (note_id->noteId) to apply before sync")
+    ap.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help=f"Seconds to wait for each AnkiConnect request (default: {DEFAULT_TIMEOUT:g})")
+    ap.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help=f"Retries after transport errors; writes only when Anki never got the request (default: {DEFAULT_RETRIES})")
+    ap.add_argument("--map-out", default="", help="Optional mapping TSV (or .sqlite map) to append to on CREATE flows (and for resolved noteIds)")
+    ap.add_argument("--map-in", default="", help="Optional mapping TSV or .sqlite map (note_id->noteId) to apply before sync")
     ap.add_argument("--dry-run", action="store_true", help="Parse + validate only; do not call AnkiConnect")
     ap.add_argument("--check", action="store_true", help="Validate TSV; fail if any row would CREATE (missing noteId); no AnkiConnect calls")
+    ap.add_argument("--batch", action="store_true", help="Send AnkiConnect actions in chunked `multi` requests")
+    ap.add_argument("--chunk-size", type=int, default=50, help="Rows per `multi` chunk in --batch/--diff mode (default: 50)")
+    ap.add_argument("--diff", action="store_true", help="Fetch current notes (notesInfo) and only send changed fields/tags")
+    ap.add_argument("--info-chunk-size", type=int, default=1000, help="Notes per notesInfo call in --diff mode (default: 1000)")
+    ap.add_argument("--create-chunk-size", type=int, default=500, help="Notes per addNotes request when creating (default: 500)")
+    ap.add_argument("--concurrency", type=int, default=0, help="Sync rows with N concurrent requests (asyncio engine; default: serial)")
+    ap.add_argument("--progress-interval", type=float, default=2.0, help="Seconds between progress lines on stderr with --concurrency (0 = off)")
+    ap.add_argument("--no-resolve", action="store_true", help="Skip the bulk NoteID lookup for rows without noteId (e.g. a brand-new deck)")
+    ap.add_argument("--resolve-only", action="store_true", help="Only resolve noteIds of existing notes (written to --map-out); no note writes")
+    ap.add_argument("--journal", default="", help="Sync journal path (default: <tsv>.sync-journal.jsonl)")
+    ap.add_argument("--no-journal", action="store_true", help="Do not write a sync journal")
+    ap.add_argument("--resume", action="store_true", help="Skip rows the journal of an interrupted run marks as committed")
+    ap.add_argument("--ledger", default="", help="Sync-state ledger path (default: <tsv>.sync-ledger.sqlite)")
+    ap.add_argument("--no-ledger", action="store_true", help="Do not read or update the sync-state ledger")
+    ap.add_argument("--changed-only", action="store_true", help="Only sync rows whose payload changed since the last confirmed sync (per the ledger)")
     args = ap.parse_args()
+    if args.resume and args.no_journal:
+        ap.error("--resume cannot be combined with --no-journal")
+    if args.changed_only and args.no_ledger:
+        ap.error("--changed-only cannot be combined with --no-ledger")
+    if args.concurrency and (args.batch or args.diff):
+        ap.error("--concurrency cannot be combined with --batch or --diff")
+    if args.resolve_only and args.no_resolve:
+        ap.error("--resolve-only cannot be combined with --no-resolve")
 
     tsv_path = Path(args.tsv)
     if not tsv_path.exists():
@@ -227,10 +939,15 @@ def main() -> int:
         eprint("No rows found.")
         return 2
 
-    # Optional: fill missing noteId values from a mapping TSV (note_id -> noteId)
-    if args.map_in:
-        mapping = read_noteid_map(Path(args.map_in))
-        applied = apply_noteid_map(rows, mapping)
+    # Optional: fill missing noteId values from a mapping TSV (note_id -> noteId).
+    # A missing map is not created here: --dry-run/--check must not write.
+    mapping: Optional[NoteIdMap] = None
+    if args.map_in and Path(args.map_in).exists():
+        mapping = NoteIdMap(Path(args.map_in))
+        problems = mapping.problems()
+        if problems:
+            eprint(f"WARN: noteId map {problems} (see python -m tools.anki.noteid_map)")
+        applied = apply_noteid_map(rows, mapping.as_dict())
         if applied:
             print(f"OK: map-in applied noteId for rows={applied}")
 
@@ -248,8 +965,72 @@ def main() -> int:
         print(f"OK: check passed rows={len(rows)} (no creates)")
         return 0
 
-    # Basic connectivity check
-    anki_request("version", {}, url=args.anki_url)
+    map_store = None
+    if args.map_out:
+        same = mapping is not None and Path(args.map_out).resolve() == mapping.path.resolve()
+        map_store = mapping if same else NoteIdMap(Path(args.map_out))
+    if mapping is not None and mapping is not map_store:
+        mapping.close()
+
+    # Tag namespaces come from the whole TSV, also when --resume/--changed-only narrow the rows.
+    tag_spec = managed_tag_spec(rows)
+
+    journal = None
+    if not args.no_journal:
+        journal = SyncJournal(Path(args.journal) if args.journal else default_journal_path(tsv_path), args.anki_url, tsv_path)
+    if journal and args.resume:
+        try:
+            journal.load()
+        except ValueError as e:
+            eprint(f"FAIL: {e}")
+            return 2
+        if journal.foreign_url:
+            eprint(f"WARN: {journal.path} was written for {journal.foreign_url}; not resuming, syncing all rows")
+        before = len(rows)
+        rows = [r for r in rows if not journal.is_committed(r.note_id, row_digest(r))]
+        print(
+            f"OK: resume skipped rows={before - len(rows)} committed in {journal.path} "
+            f"(in flight when interrupted: {len(journal.in_flight)})"
+        )
+        if not rows:
+            print("Done. nothing left to sync")
+            journal.close(remove=True)
+            return 0
+
+    ledger = None
+    if not args.no_ledger:
+        ledger = SyncLedger(Path(args.ledger) if args.ledger else default_ledger_path(tsv_path), args.anki_url)
+        if ledger.reset:
+            eprint(f"WARN: {ledger.reset}")
+    if ledger and args.changed_only:
+        state = ledger.load()
+        filled = 0
+        for r in rows:
+            if not r.noteId and state.get(r.note_id, ("", ""))[0]:
+                r.noteId = state[r.note_id][0]
+                filled += 1
+        # A note is judged by its last row (the state Anki ends up in); all its rows go or none do.
+        last = {r.note_id: r for r in rows}
+        changed = {
+            nid
+            for nid, r in last.items()
+            if nid not in state or state[nid][1] != row_digest(r) or state[nid][0] != r.noteId
+        }
+        before = len(rows)
+        rows = [r for r in rows if r.note_id in changed]
+        print(
+            f"OK: changed-only skipped rows={before - len(rows)} unchanged since the last sync "
+            f"(ledger: {ledger.path}; noteIds filled={filled})"
+        )
+        if not rows:
+            print("Done. nothing changed since the last sync")
+            ledger.close()
+            if journal:
+                journal.close(remove=True)
+            return 0
+
+    # Basic connectivity check; later get_client(url) calls share these settings.
+    get_client(args.anki_url, timeout=args.timeout, retries=args.retries).version()
 
 
     # Validate TSV field names against the target Anki model field names.
@@ -262,55 +1043,45 @@ def main() -> int:
             model_fields_cache[r.model] = model_field_names(r.model, url=args.anki_url)
         validate_fields_against_model(r, model_fields_cache[r.model])
 
+    # Rows without noteId whose note already exists: resolve them in bulk before any writes.
+    if not args.no_resolve:
+        resolved = resolve_note_ids(rows, url=args.anki_url)
+        if resolved:
+            print(f"OK: resolved noteId via NoteID search for notes={len(resolved)}")
+            if map_store is not None:
+                map_store.add_many(resolved)
+                map_store.flush()
+        if args.resolve_only:
+            creates = sum(1 for r in rows if not r.noteId)
+            print(f"OK: resolve-only; rows that would CREATE={creates}")
+            if ledger:
+                ledger.close()
+            if map_store is not None:
+                map_store.close()
+            return 0
 
-    model_fields_cache: Dict[str, List[str]] = {}
-    created = 0
-    updated = 0
-    for r in rows:
-        if r.noteId:
-            update_note(r, url=args.anki_url)
-            updated += 1
-            print(f"OK: updated noteId {r.noteId} ({r.note_id})")
-            continue
-
-        # No noteId provided → attempt create; if duplicate, adopt existing by NoteID and update.
-        try:
-            nid = create_note(r, url=args.anki_url)
-            created += 1
-            print(f"OK: created noteId {nid} ({r.note_id})")
-            if args.map_out:
-                append_mapping(Path(args.map_out), r.note_id, nid)
-        except RuntimeError as e:
-            msg = str(e).lower()
-            if "duplicate" not in msg:
-                raise
-
-            # Try to find an existing note by the stable CNSF note_id stored in the NoteID field.
-            # Scope to model+deck to reduce false matches.
-            query = f'note:"{r.model}" deck:"{r.deck}" NoteID:"{r.note_id}"'
-            hits = anki_request("findNotes", {"query": query}, url=args.anki_url) or []
-
-            if not hits:
-                # Fall back to field-only search (in case deck/model naming differs).
-                query2 = f'NoteID:"{r.note_id}"'
-                hits = anki_request("findNotes", {"query": query2}, url=args.anki_url) or []
-
-            if not hits:
-                raise RuntimeError(
-                    f"Duplicate on create for {r.note_id}, but could not find an existing note via NoteID search."
-                ) from e
-
-            adopted = int(hits[0])
-            r.noteId = str(adopted)
-            update_note(r, url=args.anki_url)
-            updated += 1
-            print(f"OK: adopted+updated existing noteId {adopted} ({r.note_id})")
-
-            if args.map_out:
-                append_mapping(Path(args.map_out), r.note_id, adopted)
-
-    print(f"Done. updated={updated} created={created}")
-    return 0
+    if journal:
+        journal.open(resume=args.resume)
+    try:
+        rc = run_sync(args, rows, journal, ledger, tag_spec, map_store)
+    except BaseException:
+        if journal:
+            journal.close()
+        if ledger:
+            ledger.close()
+        if map_store is not None:
+            map_store.close()
+        raise
+    if ledger:
+        ledger.close()
+    if map_store is not None:
+        map_store.close()
+    if journal:
+        # Nothing left to resume after a clean run.
+        journal.close(remove=rc == 0)
+        if rc != 0:
+            print(f"Journal kept for --resume: {journal.path}")
+    return rc
 
 
 if __name__ == "__main__":
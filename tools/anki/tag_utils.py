@@ -6,6 +6,11 @@ from typing import Iterable
 
 MANAGED_PREFIXES = ("src:", "topic:", "wf:")
 
+# Namespaces of the CNSF tag grammar (docs/anki/contracts/CNSF_Spec_v0.md). They
+# belong to the repo whether or not the TSV being synced still uses them, so a
+# tag whose namespace was dropped from a note is removed on the next sync.
+REPO_NAMESPACES = ("domain:", "model:", "subtopic:", "source:", "status:")
+
 # Split on semicolons; allow users to type commas too, but semicolon is canonical.
 _SPLIT_RE = re.compile(r"[;]+")
 
@@ -16,7 +21,7 @@ _SPACE_RE = re.compile(r"\s+")
 
 @dataclass(frozen=True)
 class TagSpec:
-    managed_prefixes: tuple[str, ...] = MANAGED_PREFIXES
+    managed_prefixes: tuple[str, ...] = MANAGED_PREFIXES + REPO_NAMESPACES
     default_topic_prefix: str = "topic:"
     source_prefix: str = "src:"
 
@@ -96,11 +101,77 @@ def canonical_to_managed_anki_tags(tokens: Iterable[str], spec: TagSpec = TagSpe
 
 def strip_managed_tags(existing: Iterable[str], spec: TagSpec = TagSpec()) -> list[str]:
     """
-    Remove tags under managed prefixes (src:/topic:/wf:), leaving manual tags.
+    Remove tags under managed prefixes (src:/topic:/wf: and REPO_NAMESPACES),
+    leaving manual tags.
+    Prefixes match case-insensitively, like Anki tags.
     """
+    prefixes = tuple(p.casefold() for p in spec.managed_prefixes)
     kept: list[str] = []
     for t in existing:
-        if any(t.startswith(p) for p in spec.managed_prefixes):
+        if t.casefold().startswith(prefixes):
             continue
         kept.append(t)
     return kept
+
+
+def tag_namespaces(tags: Iterable[str]) -> tuple[str, ...]:
+    """
+    Namespace prefixes used by `tags`, casefolded (see tag_delta), in
+    first-seen order:
+    - hierarchical tags: the parent (`b737::limits::wind` -> "b737::limits::")
+    - `key:value` tags: the key ("domain:", "status:", ...)
+    """
+    seen: dict[str, None] = {}
+    for t in tags:
+        t = t.casefold()
+        parent, sep, leaf = t.rpartition("::")
+        if sep:
+            if parent and leaf:
+                seen.setdefault(parent + sep, None)
+            continue
+        key, sep, value = t.partition(":")
+        if key and sep and value:
+            seen.setdefault(key + sep, None)
+    return tuple(seen)
+
+
+def tag_delta(existing: Iterable[str], desired: Iterable[str], spec: TagSpec = TagSpec()) -> tuple[list[str], list[str]]:
+    """
+    (add, remove) that turn a note's `existing` tags into `desired` plus its
+    manual tags (those not under a managed prefix, see strip_managed_tags).
+    Anki tags are case-insensitive, so comparisons are too.
+    """
+    existing = list(existing)
+    desired = list(desired)
+    have = {t.casefold() for t in existing}
+    keep = {t.casefold() for t in desired} | {t.casefold() for t in strip_managed_tags(existing, spec)}
+    add: list[str] = []
+    for t in desired:
+        if t.casefold() not in have:
+            have.add(t.casefold())
+            add.append(t)
+    remove = [t for t in existing if t.casefold() not in keep]
+    return add, remove
+
+
+def group_tag_deltas(
+    deltas: dict[int, tuple[list[str], list[str]]],
+) -> tuple[list[tuple[str, list[int]]], list[tuple[str, list[int]]]]:
+    """
+    Invert per-note (add, remove) deltas into (adds, removes), each a list of
+    (space-separated tags, note ids): tags that go to exactly the same notes
+    share one entry, so a deck-wide retag becomes one addTags and one
+    removeTags call instead of two per note.
+    """
+
+    def invert(side: int) -> list[tuple[str, list[int]]]:
+        by_tag: dict[str, tuple[str, list[int]]] = {}
+        for nid, delta in deltas.items():
+            for t in delta[side]:
+                by_tag.setdefault(t.casefold(), (t, []))[1].append(nid)
+        by_notes: dict[tuple[int, ...], list[str]] = {}
+        for tag, nids in by_tag.values():
+            by_notes.setdefault(tuple(nids), []).append(tag)
+        return [(" ".join(tags), list(nids)) for nids, tags in by_notes.items()]
+
+    return invert(0), invert(1)
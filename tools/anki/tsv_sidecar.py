@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+SQLite sidecar for TSV files (L3 import TSVs, merged import_html TSVs).
+
+Next to `<name>.tsv` the producer can write `<name>.tsv.sqlite` holding the
+same rows with the cell values already decoded (no CSV parsing on load):
+
+    meta(key, value)        header (JSON list), TSV size + mtime_ns, format
+    rows(c0, c1, ...)       one column per header entry, in header order;
+                            rowid = row order in the TSV
+    rows_note_id            index on the note_id column (if present)
+
+Readers call load_rows()/lookup(); they return None when there is no sidecar
+or it no longer matches the TSV (size or mtime changed, e.g. the TSV was
+edited by hand), in which case the caller falls back to parsing the TSV.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+try:
+    from tools.anki.render_cache import staging_path
+except ModuleNotFoundError:  # imported by a script run from tools/anki (e.g. merge_base_and_after.py)
+    from render_cache import staging_path  # type: ignore[no-redef]
+
+SIDECAR_FORMAT = 1
+
+_INSERT_BATCH = 1000
+
+
+def sidecar_path(tsv_path: Path) -> Path:
+    return tsv_path.with_name(f"{tsv_path.name}.sqlite")
+
+
+def _tsv_stamp(tsv_path: Path) -> Dict[str, int]:
+    st = tsv_path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class SidecarWriter:
+    """
+    Build the sidecar for `tsv_path` row by row. The database is staged in a
+    temp file; commit() must be called after the TSV itself is in place,
+    since it records the TSV's size and mtime.
+    """
+
+    def __init__(self, tsv_path: Path, header: Sequence[str]) -> None:
+        self.tsv_path = tsv_path
+        self.header = list(header)
+        self.path = sidecar_path(tsv_path)
+        self.tmp = staging_path(self.path)
+        self._conn = sqlite3.connect(str(self.tmp))
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        # All TEXT, noteId included: readers get back exactly the strings the TSV parser
+        # returns ('' for rows still to be created), with no per-column conversion.
+        cols = ", ".join(f"c{i} TEXT" for i in range(len(self.header)))
+        self._conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(f"CREATE TABLE rows ({cols})")
+        self._insert = f"INSERT INTO rows VALUES ({', '.join('?' * len(self.header))})"
+        self._pending: List[Tuple[str, ...]] = []
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self._pending.append(tuple(str(row.get(h, "") or "") for h in self.header))
+        if len(self._pending) >= _INSERT_BATCH:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            self._conn.executemany(self._insert, self._pending)
+            self._pending = []
+
+    def commit(self) -> Path:
+        try:
+            self._flush()
+            if "note_id" in self.header:
+                self._conn.execute(f"CREATE INDEX rows_note_id ON rows (c{self.header.index('note_id')})")
+            meta = {"format": SIDECAR_FORMAT, "header": self.header, **_tsv_stamp(self.tsv_path)}
+            self._conn.executemany(
+                "INSERT INTO meta VALUES (?, ?)", [(k, json.dumps(v)) for k, v in meta.items()]
+            )
+            self._conn.commit()
+        finally:
+            self._conn.close()
+        os.replace(self.tmp, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        self._conn.close()
+        try:
+            self.tmp.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def write_sidecar(tsv_path: Path, header: Sequence[str], rows: Iterable[Dict[str, Any]]) -> Path:
+    w = SidecarWriter(tsv_path, header)
+    try:
+        for r in rows:
+            w.add(r)
+    except BaseException:
+        w.abort()
+        raise
+    return w.commit()
+
+
+def _open(tsv_path: Path) -> Tuple[sqlite3.Connection, List[str]] | None:
+    """Open the sidecar if it exists and still matches the TSV."""
+    p = sidecar_path(tsv_path)
+    if not p.exists() or not tsv_path.exists():
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{p}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        meta = {k: json.loads(v) for k, v in conn.execute("SELECT key, value FROM meta")}
+        stamp = _tsv_stamp(tsv_path)
+    except (sqlite3.Error, ValueError):
+        conn.close()
+        return None
+    except BaseException:
+        conn.close()
+        raise
+    if (
+        meta.get("format") != SIDECAR_FORMAT
+        or meta.get("size") != stamp["size"]
+        or meta.get("mtime_ns") != stamp["mtime_ns"]
+    ):
+        conn.close()
+        return None
+    return conn, list(meta.get("header") or [])
+
+
+def load_tuples(tsv_path: Path) -> Tuple[List[str], List[Tuple[str, ...]]] | None:
+    """(header, row tuples in TSV order), or None if there is no usable sidecar."""
+    opened = _open(tsv_path)
+    if opened is None:
+        return None
+    conn, header = opened
+    try:
+        rows = conn.execute("SELECT * FROM rows ORDER BY rowid").fetchall()
+    finally:
+        conn.close()
+    return header, rows
+
+
+def load_rows(tsv_path: Path) -> Tuple[List[str], List[Dict[str, str]]] | None:
+    """(header, row dicts in TSV order), or None if there is no usable sidecar."""
+    loaded = load_tuples(tsv_path)
+    if loaded is None:
+        return None
+    header, rows = loaded
+    return header, [dict(zip(header, r)) for r in rows]
+
+
+def lookup(tsv_path: Path, note_id: str) -> List[Dict[str, str]] | None:
+    """All rows with this note_id (indexed), or None if there is no usable sidecar."""
+    opened = _open(tsv_path)
+    if opened is None:
+        return None
+    conn, header = opened
+    try:
+        if "note_id" not in header:
+            return None
+        col = header.index("note_id")
+        rows = conn.execute(f"SELECT * FROM rows WHERE c{col} = ? ORDER BY rowid", (note_id,)).fetchall()
+    finally:
+        conn.close()
+    return [dict(zip(header, r)) for r in rows]
@@ -3,12 +3,16 @@ from __future__ import annotations
 
 import argparse
 import csv
-import json
 import sys
 from pathlib import Path
 from typing import Any
 
-import urllib.request
+try:
+    from tools.anki import tsv_sidecar
+    from tools.anki.anki_client import DEFAULT_RETRIES, get_client
+except ModuleNotFoundError:  # run as a script (e.g. by pipeline.py)
+    import tsv_sidecar  # type: ignore[no-redef]
+    from anki_client import DEFAULT_RETRIES, get_client  # type: ignore[no-redef]
 
 
 DEFAULT_ANKI_URL = "http://127.0.0.1:8765"
@@ -30,30 +34,23 @@ CANDIDATE_ANSWER_FIELDS = [
 ]
 
 
-def anki_request(action: str, params: dict[str, Any] | None = None, url: str = DEFAULT_ANKI_URL) -> dict[str, Any]:
-    payload = {"action": action, "version": 6}
-    if params is not None:
-        payload["params"] = params
-
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        raw = resp.read().decode("utf-8")
-    out = json.loads(raw)
-
-    # AnkiConnect convention: {"result": ..., "error": ...}
-    if "error" not in out or "result" not in out:
-        raise RuntimeError(f"Unexpected AnkiConnect response: {out}")
-    if out["error"] is not None:
-        raise RuntimeError(f"AnkiConnect error for action={action}: {out['error']}")
-    return out
-
-
 def read_import_html_tsv(path: Path) -> list[dict[str, str]]:
     rows: list[dict[str, str]] = []
+    required = {"note_id", "noteId", "prompt", "answer_html"}
+
+    # Prefer the SQLite sidecar (merge_base_and_after.py --sqlite) when it matches the TSV.
+    loaded = tsv_sidecar.load_rows(path)
+    if loaded is not None:
+        header, sidecar_rows = loaded
+        missing = required - set(header)
+        if missing:
+            raise ValueError(f"Missing required TSV columns: {sorted(missing)} in {path}")
+        return [r for r in sidecar_rows if any(v.strip() for v in r.values())]
+
+    # Cells are raw, as html_after_to_tsv.py/merge_base_and_after.py write them (tabs and
+    # newlines escaped, no CSV quoting), so a leading '"' is data, as in the sidecar.
     with path.open("r", encoding="utf-8", newline="") as f:
-        rdr = csv.DictReader(f, delimiter="\t")
-        required = {"note_id", "noteId", "prompt", "answer_html"}
+        rdr = csv.DictReader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
         missing = required - set(rdr.fieldnames or [])
         if missing:
             raise ValueError(f"Missing required TSV columns: {sorted(missing)} in {path}")
@@ -92,6 +89,8 @@ def main() -> None:
     ap = argparse.ArgumentParser(description="Update Anki notes from a TSV containing noteId and answer_html.")
     ap.add_argument("--in", dest="inp", required=True, help="Input TSV (e.g. __import_html.tsv)")
     ap.add_argument("--anki-url", default=DEFAULT_ANKI_URL, help=f"AnkiConnect URL (default: {DEFAULT_ANKI_URL})")
+    ap.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for each AnkiConnect request (default: 30)")
+    ap.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help=f"Retries after transport errors; writes only when Anki never got the request (default: {DEFAULT_RETRIES})")
     ap.add_argument("--field", default=None, help="Target Anki field name to update (default: auto-detect)")
     ap.add_argument("--dry-run", action="store_true", help="Do not write changes; just show what would happen")
     ap.add_argument("--limit", type=int, default=0, help="Only process first N rows (0 = all)")
@@ -105,9 +104,11 @@ def main() -> None:
     if args.limit and args.limit > 0:
         rows = rows[: args.limit]
 
+    client = get_client(args.anki_url, timeout=args.timeout, retries=args.retries)
+
     # Ensure AnkiConnect reachable
     try:
-        ver = anki_request("version", url=args.anki_url)["result"]
+        ver = client.version()
     except Exception as e:
         print(f"ERROR: Unable to reach AnkiConnect at {args.anki_url}: {e}", file=sys.stderr)
         sys.exit(2)
@@ -121,7 +122,7 @@ def main() -> None:
         nid = (r.get("noteId") or "").strip()
         if nid:
             note_ids.append(int(nid))
-    info = anki_request("notesInfo", {"notes": note_ids}, url=args.anki_url)["result"]
+    info = client.notes_info(note_ids)
 
     # Map noteId -> info
     info_map: dict[int, dict[str, Any]] = {int(n["noteId"]): n for n in info if n and "noteId" in n}
@@ -179,9 +180,8 @@ def main() -> None:
         return
 
     # Batch update
-    # anki_request("updateNoteFields", {"note": updates}, url=args.anki_url)
     for note in updates:
-        anki_request("updateNoteFields", {"note": note}, url=args.anki_url)
+        client.update_note_fields(note["id"], note["fields"])
     print("✅ updateNoteFields complete (no error).")
 
 
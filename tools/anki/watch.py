@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Watch CNSF notes and keep the L3 import TSV up to date (L1→L2→L3).
+
+Polls the notes tree (default: domains/*/anki/notes) every --interval
+seconds. Only notes whose (mtime, size) changed are re-processed:
+
+- canonicalization check (reported, does not block the export)
+- parse + render (L2)
+- TSV row (L3)
+
+The TSV is then rewritten atomically from the in-memory rows, in the same
+order and format as cnsf_to_import_tsv.py, together with its SQLite
+sidecar (if there is one, or with --sqlite) and its .sources.json, so the
+sync tools and `cnsf_to_import_tsv --incremental` can use it as they would
+an export. Notes are rendered one at a time (the exporter's default
+--batch-size 1), so a watched TSV is identical to a full export of the
+same tree. While any note fails to parse or render the
+TSV is left untouched (same rule as the exporter).
+
+Each change prints its latency: from detection, and from the file's mtime
+(i.e. from the moment the editor saved it).
+
+Example:
+  python -m tools.anki.watch --out domains/b737/anki/exports/b737_cnsf_import.tsv
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from tools.anki import tsv_sidecar
+from tools.anki.cnsf_canonicalize import DEFAULT_CANON_CACHE_PATH, CanonCache, process_file
+from tools.anki.cnsf_manifest import DEFAULT_MANIFEST_PATH, NoteManifest
+from tools.anki.cnsf_parse import iter_note_paths
+from tools.anki.export.cnsf_to_import_tsv import (
+    TSV_BASE_HEADER,
+    CnsfEnvelope,
+    DomainRenderCaches,
+    TsvSink,
+    _render_env,
+    _stable_extra_field_names,
+    build_row,
+    eprint,
+    iter_rendered,
+    load_envelope,
+    write_sources,
+)
+from tools.anki.md_to_html_mmd import ENGINES, renderer_identity
+from tools.anki.noteid_map import read_noteid_map
+from tools.anki.render_cache import DEFAULT_MAX_BYTES
+
+DEFAULT_ROOTS_GLOB = "domains/*/anki/notes"
+
+_CANON_LABELS = {
+    "order_drift": "YAML order drift",
+    "drift": "canonicalization drift",
+    "error": "error",
+}
+
+Stamp = Tuple[int, int]  # (mtime_ns, size)
+
+
+def _stamp(path: Path) -> Stamp | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+@dataclass
+class _Entry:
+    stamp: Stamp
+    env: CnsfEnvelope | None = None
+    rendered: Dict[str, str] | None = None
+    error: str = ""
+
+
+class Watcher:
+    def __init__(
+        self,
+        roots: List[str],
+        out_path: Path,
+        map_path: Path | None = None,
+        engine: str = "multimarkdown",
+        caches: DomainRenderCaches | None = None,
+        manifest: NoteManifest | None = None,
+        canon: CanonCache | None = None,
+        sqlite: bool = False,
+    ) -> None:
+        self.roots = roots
+        self.out_path = out_path
+        self.map_path = map_path
+        self.engine = engine
+        self.caches = caches
+        self.manifest = manifest
+        self.canon = canon
+        self.sqlite = sqlite
+        self.order: List[Path] = []
+        self.entries: Dict[Path, _Entry] = {}
+        self.noteid_map: Dict[str, str] | None = None
+        self._map_stamp: Stamp | None = None
+
+    def _scan(self) -> Dict[Path, Stamp]:
+        out: Dict[Path, Stamp] = {}
+        for p in iter_note_paths(self.roots):
+            s = _stamp(p)
+            if s is not None:
+                out[p] = s
+        return out
+
+    def _reload_map(self) -> bool:
+        """Reload the noteId map if it changed; return True if it did."""
+        if not self.map_path:
+            return False
+        s = _stamp(self.map_path)
+        if s == self._map_stamp and self.noteid_map is not None:
+            return False
+        self._map_stamp = s
+        self.noteid_map = read_noteid_map(self.map_path)
+        return True
+
+    def _apply_map(self) -> None:
+        for ent in self.entries.values():
+            if ent.env is not None:
+                ent.env.noteId = str((self.noteid_map or {}).get(ent.env.note_id, "")).strip()
+
+    def _canon_check(self, path: Path) -> None:
+        known = self.canon.known if self.canon else frozenset()
+        r = process_file(path, write=False, manifest=self.manifest, known=known)
+        if r.status == "ok":
+            if self.canon:
+                self.canon.add([r.digest])
+            return
+        if r.status == "error":
+            eprint(f"FAIL (canon {_CANON_LABELS[r.status]}): {r.message}")
+        else:
+            eprint(f"FAIL ({_CANON_LABELS[r.status]}): {path}")
+
+    def _load(self, path: Path, stamp: Stamp) -> _Entry:
+        try:
+            env = load_envelope(path, self.noteid_map, self.manifest)
+        except Exception as e:
+            return _Entry(stamp, error=str(e))
+        return _Entry(stamp, env=env)
+
+    def build(self, jobs: int = 1, batch_size: int = 1) -> int:
+        """Initial full build. Returns the number of failing notes."""
+        self._reload_map()
+        stamps = self._scan()
+        self.order = list(stamps)
+        self.entries = {p: self._load(p, s) for p, s in stamps.items()}
+        for p in self.order:
+            self._canon_check(p)
+
+        envs = [e.env for e in self.entries.values() if e.env is not None]
+        for env, rendered, err in iter_rendered(envs, self.caches, jobs, batch_size, engine=self.engine):
+            ent = self.entries[env.path]
+            ent.rendered = rendered
+            ent.error = err
+        return self._report_failures()
+
+    def _report_failures(self) -> int:
+        bad = [(p, e.error) for p, e in self.entries.items() if e.rendered is None]
+        for p, err in bad:
+            eprint(f"FAIL: {p}: {err}")
+        return len(bad)
+
+    def _update(self, path: Path, stamp: Stamp) -> None:
+        self._canon_check(path)
+        ent = self._load(path, stamp)
+        if ent.env is not None:
+            try:
+                ent.rendered = _render_env(ent.env, self.caches, self.engine)
+            except Exception as e:
+                ent.error = str(e)
+        self.entries[path] = ent
+
+    def write(self) -> bool:
+        """Rewrite the TSV from the in-memory rows; False if any note is failing."""
+        if any(e.rendered is None for e in self.entries.values()):
+            return False
+        envs = [self.entries[p].env for p in self.order]
+        # Same ordering as the exporter: path order, then a stable sort on note_id.
+        envs.sort(key=lambda x: x.note_id)  # type: ignore[union-attr]
+        extra_field_names = _stable_extra_field_names(envs)  # type: ignore[arg-type]
+
+        # Keep an existing SQLite sidecar in step with the TSV instead of letting it go stale.
+        sqlite = self.sqlite or tsv_sidecar.sidecar_path(self.out_path).exists()
+        sink = TsvSink(self.out_path, TSV_BASE_HEADER + extra_field_names, overwrite=True, sqlite=sqlite)
+        try:
+            for env in envs:
+                sink.write(build_row(env, self.entries[env.path].rendered, extra_field_names))  # type: ignore[arg-type, union-attr]
+        except BaseException:
+            sink.abort()
+            raise
+        sink.commit()
+        # Per-note source hashes, so the next `cnsf_to_import_tsv --incremental` can reuse these rows.
+        try:
+            write_sources(self.out_path, renderer_identity(self.engine), envs)  # type: ignore[arg-type]
+        except RuntimeError:
+            pass  # no renderer to identify; a stale .sources.json no longer matches the TSV anyway
+        return True
+
+    def poll(self) -> List[Tuple[str, Path, float]]:
+        """
+        One polling pass. Returns (kind, path, mtime) per change, where kind is
+        "added", "modified", "deleted" or "map"; the TSV is rewritten if needed.
+        """
+        changes: List[Tuple[str, Path, float]] = []
+        if self._reload_map():
+            self._apply_map()
+            changes.append(("map", self.map_path, self._map_stamp[0] / 1e9 if self._map_stamp else 0.0))  # type: ignore[arg-type]
+
+        stamps = self._scan()
+        for p in self.order:
+            if p not in stamps:
+                changes.append(("deleted", p, time.time()))
+                self.entries.pop(p, None)
+        for p, s in stamps.items():
+            ent = self.entries.get(p)
+            if ent is None or ent.stamp != s:
+                changes.append(("added" if ent is None else "modified", p, s[0] / 1e9))
+                self._update(p, s)
+        self.order = list(stamps)
+        return changes
+
+
+def default_roots() -> List[str]:
+    return sorted(glob.glob(DEFAULT_ROOTS_GLOB))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Watch CNSF notes and incrementally rebuild the L3 import TSV.")
+    ap.add_argument("roots", nargs="*", help=f"Note files/dirs to watch (default: {DEFAULT_ROOTS_GLOB})")
+    ap.add_argument("--out", required=True, help="L3 import TSV to keep up to date")
+    ap.add_argument("--map", default="", help="noteId map TSV (reloaded when it changes)")
+    ap.add_argument("--interval", type=float, default=0.25, help="Polling interval in seconds (default: 0.25)")
+    ap.add_argument("--engine", choices=ENGINES, default="multimarkdown", help="Renderer (default: multimarkdown; builtin = in-process)")
+    ap.add_argument("--jobs", type=int, default=1, help="Render threads for the initial build (default: 1)")
+    ap.add_argument("--batch-size", type=int, default=1, help="Notes per MultiMarkdown run for the initial build (default: 1 = same renders as updates)")
+    ap.add_argument("--no-render-cache", action="store_true", help="Always run MultiMarkdown (skip the L2 render cache)")
+    ap.add_argument("--render-cache-dir", default="", help="Override cache root (default: domains/<domain>/anki/generated/.cache)")
+    ap.add_argument("--render-cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024))
+    ap.add_argument("--manifest", default=str(DEFAULT_MANIFEST_PATH), help="Parsed-note manifest (default: %(default)s)")
+    ap.add_argument("--no-manifest", action="store_true", help="Always parse notes with YAML (ignore the manifest)")
+    ap.add_argument("--canon-cache", default=str(DEFAULT_CANON_CACHE_PATH), help="Known-canonical hash cache (default: %(default)s)")
+    ap.add_argument("--sqlite", action="store_true", help="Also write a SQLite sidecar (<out>.sqlite); an existing one is always kept up to date")
+    args = ap.parse_args()
+
+    roots = args.roots or default_roots()
+    if not roots:
+        eprint(f"No note roots found (looked for {DEFAULT_ROOTS_GLOB}).")
+        return 2
+
+    caches = None
+    if not args.no_render_cache and args.engine != "builtin":
+        caches = DomainRenderCaches(
+            root=Path(args.render_cache_dir) if args.render_cache_dir else None,
+            max_bytes=args.render_cache_max_mb * 1024 * 1024,
+        )
+    manifest = None if args.no_manifest else NoteManifest(args.manifest)
+    canon = CanonCache(args.canon_cache)
+
+    w = Watcher(
+        roots,
+        Path(args.out),
+        map_path=Path(args.map) if args.map else None,
+        engine=args.engine,
+        caches=caches,
+        manifest=manifest,
+        canon=canon,
+        sqlite=args.sqlite,
+    )
+
+    t0 = time.perf_counter()
+    failed = w.build(jobs=args.jobs, batch_size=args.batch_size)
+    if w.write():
+        print(f"Initial build: {len(w.entries)} notes in {(time.perf_counter() - t0) * 1000:.0f} ms -> {args.out}")
+    else:
+        print(f"Initial build: {failed} failing notes; {args.out} not written until they are fixed.")
+    print(f"Watching {', '.join(roots)} (every {args.interval:g}s, Ctrl-C to stop)")
+
+    try:
+        while True:
+            time.sleep(args.interval)
+            t_detect = time.perf_counter()
+            changes = w.poll()
+            if not changes:
+                continue
+            written = w.write()
+            t_done = time.perf_counter()
+            wall = time.time()
+            for kind, p, mtime in changes:
+                print(
+                    f"{kind.upper()}: {p} "
+                    f"(processed {(t_done - t_detect) * 1000:.1f} ms, since save {(wall - mtime) * 1000:.0f} ms)"
+                )
+            if written:
+                print(f"  wrote {args.out} ({len(w.entries)} rows)")
+            else:
+                failing = [p for p, e in w.entries.items() if e.rendered is None]
+                for p in failing:
+                    eprint(f"  FAIL: {p}: {w.entries[p].error}")
+                print(f"  {len(failing)} failing notes; {args.out} not updated")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if manifest:
+            manifest.save()
+        canon.save()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+YAML backend: libyaml (CSafeLoader/CSafeDumper) when PyYAML was built with
+it, pure-Python SafeLoader/SafeDumper otherwise.
+
+Both backends must produce identical canonical output; tested in
+tests/anki/test_yaml_backend.py, and timed/compared on a corpus with:
+    python -m tools.anki.bench yaml --notes domains/b737/anki/notes
+The canonical-hash cache is keyed by the backend in use anyway
+(cnsf_canonicalize.canon_fingerprint).
+
+Set CNSF_YAML_PURE=1 to force the pure-Python backend.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any
+
+try:
+    import yaml  # type: ignore
+except Exception as e:  # pragma: no cover
+    raise SystemExit(
+        "Missing dependency: PyYAML. Install with: pip install pyyaml"
+    ) from e
+
+_C_LOADER = getattr(yaml, "CSafeLoader", None)
+_C_DUMPER = getattr(yaml, "CSafeDumper", None)
+
+HAVE_LIBYAML = _C_LOADER is not None and _C_DUMPER is not None
+
+YAMLError = yaml.YAMLError
+
+
+def _use_c(pure: bool) -> bool:
+    return HAVE_LIBYAML and not pure and not os.environ.get("CNSF_YAML_PURE")
+
+
+def backend_name(pure: bool = False) -> str:
+    return "libyaml" if _use_c(pure) else "pure-python"
+
+
+def safe_load(text: str, pure: bool = False) -> Any:
+    """Drop-in for yaml.safe_load()."""
+    loader = _C_LOADER if _use_c(pure) else yaml.SafeLoader
+    return yaml.load(text, Loader=loader)  # noqa: S506 - safe loaders only
+
+
+def safe_dump(data: Any, pure: bool = False, **kwargs: Any) -> str:
+    """Drop-in for yaml.safe_dump() (always returns str)."""
+    dumper = _C_DUMPER if _use_c(pure) else yaml.SafeDumper
+    return yaml.dump(data, Dumper=dumper, **kwargs)